@@ -252,18 +252,43 @@ typedef struct {
     PyObject *destructor;
 } CDataObject_gcp;
 
+/* converts a Python object to the raw data of an argument; returns -1
+   on error, 0 on success, or N > 0 if the argument is a pointer that
+   requires N bytes of temporary storage (see cdata_call()) */
+typedef Py_ssize_t (*cffi_argconv_t)(char *, CTypeDescrObject *, PyObject *);
+
+/* converts the raw data of the result into a Python object */
+typedef PyObject *(*cffi_resconv_t)(char *, CTypeDescrObject *);
+
 typedef struct {
     ffi_cif cif;
     /* the following information is used when doing the call:
        - a buffer of size 'exchange_size' is malloced
-       - the arguments are converted from Python objects to raw data
+       - the arguments are converted from Python objects to raw data,
+         using the i'th function of 'convert_args'
        - the i'th raw data is stored at 'buffer + exchange_offset_arg[1+i]'
        - the call is done
-       - the result is read back from 'buffer + exchange_offset_arg[0]' */
+       - the result is read back from 'buffer + exchange_offset_arg[0]'
+         and converted with 'convert_result' */
     Py_ssize_t exchange_size;
+    cffi_resconv_t convert_result;
+    cffi_argconv_t *convert_args;
     Py_ssize_t exchange_offset_arg[1];
 } cif_description_t;
 
+/* calls whose 'exchange_size' is not larger than this use a buffer
+   on the C stack instead of a PyObject_Malloc()ed one */
+#define CFFI_STACK_EXCHANGE_SIZE   512
+
+typedef union {
+    char data[CFFI_STACK_EXCHANGE_SIZE];
+    /* the following fields are only there to force the alignment */
+    void *align_p;
+    long long align_ll;
+    double align_d;
+    long double align_ld;
+} cffi_stack_exchange_t;
+
 
 /* whenever running Python code, the errno is saved in this thread-local
    variable */
@@ -889,11 +914,80 @@ write_raw_longdouble_data(char *target, long double source)
     _write_raw_data(long double);
 }
 
+/* Free lists for the small cdata objects that are created and destroyed
+   all the time: the pointers returned by new_simple_cdata(), the results
+   of ffi.cast() to a primitive type, and the result of ffi.new("T *").
+   Their size is rounded up to a multiple of CDATA_FREELIST_STEP, and
+   there is one free list per rounded size.  A freed object is linked
+   into its list through its first word.  cdata_freelist_size() must be
+   able to recompute, at deallocation, the size given at allocation.
+*/
+#define CDATA_FREELIST_STEP          8
+#define CDATA_FREELIST_CLASSES       16   /* up to 128 bytes */
+#define CDATA_FREELIST_DEFAULT_SIZE  256  /* per list */
+
+static void *cdata_freelist[CDATA_FREELIST_CLASSES];
+static Py_ssize_t cdata_freelist_len[CDATA_FREELIST_CLASSES];
+static Py_ssize_t cdata_freelist_maxsize = CDATA_FREELIST_DEFAULT_SIZE;
+static Py_ssize_t cdata_freelist_hits = 0;
+static Py_ssize_t cdata_freelist_misses = 0;
+
+static void *cdata_freelist_alloc(Py_ssize_t size)
+{
+    Py_ssize_t index = (size - 1) / CDATA_FREELIST_STEP;
+    void *result;
+
+    if (index >= CDATA_FREELIST_CLASSES)
+        return PyObject_Malloc(size);
+
+    result = cdata_freelist[index];
+    if (result != NULL) {
+        cdata_freelist[index] = *(void **)result;
+        cdata_freelist_len[index]--;
+        cdata_freelist_hits++;
+        return result;
+    }
+    cdata_freelist_misses++;
+    return PyObject_Malloc((index + 1) * CDATA_FREELIST_STEP);
+}
+
+static void cdata_freelist_free(void *p, Py_ssize_t size)
+{
+    Py_ssize_t index = (size - 1) / CDATA_FREELIST_STEP;
+
+    if (index >= CDATA_FREELIST_CLASSES ||
+            cdata_freelist_len[index] >= cdata_freelist_maxsize) {
+        PyObject_Free(p);
+        return;
+    }
+    *(void **)p = cdata_freelist[index];
+    cdata_freelist[index] = p;
+    cdata_freelist_len[index]++;
+}
+
+static void cdata_freelist_clear(void)
+{
+    int i;
+    for (i = 0; i < CDATA_FREELIST_CLASSES; i++) {
+        while (cdata_freelist[i] != NULL) {
+            void *p = cdata_freelist[i];
+            cdata_freelist[i] = *(void **)p;
+            PyObject_Free(p);
+        }
+        cdata_freelist_len[i] = 0;
+    }
+}
+
 static PyObject *
 new_simple_cdata(char *data, CTypeDescrObject *ct)
 {
-    CDataObject *cd = PyObject_New(CDataObject, &CData_Type);
-    if (cd == NULL)
+    CDataObject *cd;
+    if (ct->ct_flags & (CT_ARRAY | CT_PRIMITIVE_ANY))
+        /* not from the free lists, see cdata_freelist_size() */
+        cd = (CDataObject *)PyObject_Malloc(sizeof(CDataObject));
+    else
+        cd = (CDataObject *)cdata_freelist_alloc(sizeof(CDataObject));
+    if (PyObject_Init((PyObject *)cd, &CData_Type) == NULL)
         return NULL;
     Py_INCREF(ct);
     cd->c_data = data;
@@ -1104,10 +1198,84 @@ convert_from_object(char *data, CTypeDescrObject *ct, PyObject *init);
 static int    /* forward */
 convert_from_object_bitfield(char *data, CFieldObject *cf, PyObject *init);
 
+static int _buffer_format_matches(CTypeDescrObject *ct, const char *format)
+{
+    /* Check that the items of a buffer, described with the 'struct'
+       module syntax, are of the same kind as the primitive or pointer
+       ctype 'ct'.  The item size must be checked separately. */
+    char c;
+
+    if (format == NULL)
+        format = "B";
+    switch (*format) {
+    case '@':
+    case '=':
+#ifdef WORDS_BIGENDIAN
+    case '>':
+    case '!':
+#else
+    case '<':
+#endif
+        format++;
+        break;
+    }
+    c = format[0];
+    if (c == 0 || format[1] != 0)
+        return 0;
+
+    if (ct->ct_flags & (CT_POINTER | CT_FUNCTIONPTR))
+        return c == 'P';
+    if (ct->ct_flags & CT_IS_BOOL)
+        return c == '?';
+    if (ct->ct_flags & CT_PRIMITIVE_CHAR)
+        return strchr("cbBuw", c) != NULL;
+    if (ct->ct_flags & CT_PRIMITIVE_SIGNED)
+        return strchr("bhilqn", c) != NULL;
+    if (ct->ct_flags & CT_PRIMITIVE_UNSIGNED)
+        return strchr("BHILQN", c) != NULL;
+    if (ct->ct_flags & CT_PRIMITIVE_FLOAT)
+        return strchr("fdg", c) != NULL;
+    return 0;
+}
+
+static int _fetch_typed_buffer(CTypeDescrObject *ctitem, PyObject *x,
+                               Py_buffer *view)
+{
+    /* If 'x' exposes a C-contiguous buffer of primitive items of the same
+       kind and size as 'ctitem', fill 'view' and return 1.  Otherwise,
+       return 0 (not -1: the caller falls back to its other cases).
+       Arrays of 'char' or 'wchar_t' are only initialized from strings. */
+    if (!(ctitem->ct_flags & CT_PRIMITIVE_ANY) ||
+            (ctitem->ct_flags & CT_PRIMITIVE_CHAR) || ctitem->ct_size <= 0 ||
+            PyBytes_Check(x) || PyUnicode_Check(x) || !PyObject_CheckBuffer(x))
+        return 0;
+    if (PyObject_GetBuffer(x, view, PyBUF_FORMAT|PyBUF_C_CONTIGUOUS) < 0) {
+        PyErr_Clear();
+        return 0;
+    }
+    /* refuse 0-dimensional buffers, like numpy scalars */
+    if (view->ndim == 0 || view->itemsize != ctitem->ct_size ||
+            !_buffer_format_matches(ctitem, view->format)) {
+        PyBuffer_Release(view);
+        return 0;
+    }
+    return 1;
+}
+
+static int _is_sequence_with_buffer(PyObject *x)
+{
+    /* objects like an array.array, a memoryview or a numpy array, which
+       can be used as initializers for C arrays even if their items are
+       of a different type */
+    return (!PyBytes_Check(x) && !PyUnicode_Check(x) &&
+            PyObject_CheckBuffer(x) && PySequence_Check(x));
+}
+
 static Py_ssize_t
-get_new_array_length(PyObject **pvalue)
+get_new_array_length(CTypeDescrObject *ctitem, PyObject **pvalue)
 {
     PyObject *value = *pvalue;
+    Py_buffer view;
 
     if (PyList_Check(value) || PyTuple_Check(value)) {
         return PySequence_Fast_GET_SIZE(value);
@@ -1120,6 +1288,16 @@ get_new_array_length(PyObject **pvalue)
         /* from a unicode, we add the null terminator */
         return _my_PyUnicode_SizeAsWideChar(value) + 1;
     }
+    else if (_fetch_typed_buffer(ctitem, value, &view)) {
+        /* from a buffer of the same item type */
+        Py_ssize_t length = view.len / view.itemsize;
+        PyBuffer_Release(&view);
+        return length;
+    }
+    else if (_is_sequence_with_buffer(value)) {
+        /* from a buffer of items of another type */
+        return PySequence_Size(value);
+    }
     else {
         Py_ssize_t explicitlength;
         explicitlength = PyNumber_AsSsize_t(value, PyExc_OverflowError);
@@ -1149,7 +1327,8 @@ convert_vfield_from_object(char *data, CFieldObject *cf, PyObject *value,
 {
     /* a special case for var-sized C99 arrays */
     if ((cf->cf_type->ct_flags & CT_ARRAY) && cf->cf_type->ct_size < 0) {
-        Py_ssize_t varsizelength = get_new_array_length(&value);
+        Py_ssize_t varsizelength = get_new_array_length(
+                                             cf->cf_type->ct_itemdescr, &value);
         if (varsizelength < 0)
             return -1;
         if (optvarsize != NULL) {
@@ -1182,6 +1361,54 @@ convert_vfield_from_object(char *data, CFieldObject *cf, PyObject *value,
         return 0;
 }
 
+static int
+_convert_array_from_sequence(char *data, CTypeDescrObject *ct,
+                             PyObject *init)
+{
+    /* 'init' is a list or tuple */
+    CTypeDescrObject *ctitem = ct->ct_itemdescr;
+    PyObject **items;
+    Py_ssize_t i, n;
+    n = PySequence_Fast_GET_SIZE(init);
+    if (ct->ct_length >= 0 && n > ct->ct_length) {
+        PyErr_Format(PyExc_IndexError,
+                     "too many initializers for '%s' (got %zd)",
+                     ct->ct_name, n);
+        return -1;
+    }
+    items = PySequence_Fast_ITEMS(init);
+    for (i=0; i<n; i++) {
+        if (convert_from_object(data, ctitem, items[i]) < 0)
+            return -1;
+        data += ctitem->ct_size;
+    }
+    return 0;
+}
+
+static int
+_convert_array_from_buffer(char *data, CTypeDescrObject *ct, PyObject *init)
+{
+    /* if 'init' is a buffer of items of the same kind and size as the
+       items of 'ct', copy it with a single memcpy() and return 1.
+       Returns 0 if it is not such a buffer, and -1 in case of error. */
+    Py_buffer view;
+    Py_ssize_t n;
+
+    if (!_fetch_typed_buffer(ct->ct_itemdescr, init, &view))
+        return 0;
+    n = view.len / view.itemsize;
+    if (ct->ct_length >= 0 && n > ct->ct_length) {
+        PyErr_Format(PyExc_IndexError,
+                     "too many initializers for '%s' (got %zd)",
+                     ct->ct_name, n);
+        PyBuffer_Release(&view);
+        return -1;
+    }
+    memcpy(data, view.buf, view.len);
+    PyBuffer_Release(&view);
+    return 1;
+}
+
 static int
 convert_array_from_object(char *data, CTypeDescrObject *ct, PyObject *init)
 {
@@ -1190,32 +1417,26 @@ convert_array_from_object(char *data, CTypeDescrObject *ct, PyObject *init)
        and a CT_POINTER in the second case. */
     const char *expected;
     CTypeDescrObject *ctitem = ct->ct_itemdescr;
+    int res;
 
     if (PyList_Check(init) || PyTuple_Check(init)) {
-        PyObject **items;
-        Py_ssize_t i, n;
-        n = PySequence_Fast_GET_SIZE(init);
-        if (ct->ct_length >= 0 && n > ct->ct_length) {
-            PyErr_Format(PyExc_IndexError,
-                         "too many initializers for '%s' (got %zd)",
-                         ct->ct_name, n);
-            return -1;
-        }
-        items = PySequence_Fast_ITEMS(init);
-        for (i=0; i<n; i++) {
-            if (convert_from_object(data, ctitem, items[i]) < 0)
-                return -1;
-            data += ctitem->ct_size;
-        }
-        return 0;
+        return _convert_array_from_sequence(data, ct, init);
     }
-    else if ((ctitem->ct_flags & CT_PRIMITIVE_CHAR) ||
+
+    res = _convert_array_from_buffer(data, ct, init);
+    if (res != 0)
+        return res < 0 ? -1 : 0;
+
+    if ((ctitem->ct_flags & CT_PRIMITIVE_CHAR) ||
              ((ctitem->ct_flags & (CT_PRIMITIVE_SIGNED|CT_PRIMITIVE_UNSIGNED))
               && (ctitem->ct_size == sizeof(char)))) {
         if (ctitem->ct_size == sizeof(char)) {
             char *srcdata;
             Py_ssize_t n;
             if (!PyBytes_Check(init)) {
+                if (!(ctitem->ct_flags & CT_PRIMITIVE_CHAR) &&
+                        _is_sequence_with_buffer(init))
+                    goto convert_items;
                 expected = STR_OR_BYTES" or list or tuple";
                 goto cannot_convert;
             }
@@ -1253,6 +1474,18 @@ convert_array_from_object(char *data, CTypeDescrObject *ct, PyObject *init)
         }
 #endif
     }
+    else if (_is_sequence_with_buffer(init)) {
+        /* a buffer of items of another kind or size, like an
+           array.array('h') for an 'int[]': convert the items one by one */
+        PyObject *seq;
+     convert_items:
+        seq = PySequence_Fast(init, "expected a sequence");
+        if (seq == NULL)
+            return -1;
+        res = _convert_array_from_sequence(data, ct, seq);
+        Py_DECREF(seq);
+        return res;
+    }
     else {
         expected = "list or tuple";
         goto cannot_convert;
@@ -1563,14 +1796,50 @@ get_alignment(CTypeDescrObject *ct)
     return align;
 }
 
+static Py_ssize_t cdata_freelist_size(CDataObject *cd)
+{
+    /* Return the size that was given to cdata_freelist_alloc() for 'cd',
+       or -1 if it is not one of the objects that go to the free lists */
+    CTypeDescrObject *ct = cd->c_type;
+
+    if (Py_TYPE(cd) == &CData_Type) {
+        if (ct->ct_flags & CT_ARRAY)
+            return -1;           /* new_simple_cdata(), or a slice */
+        if (ct->ct_flags & CT_PRIMITIVE_ANY) {    /* _new_casted_primitive() */
+            int dataoffset = offsetof(CDataObject_casted_primitive, alignment);
+            if (cd->c_data != ((char *)cd) + dataoffset)
+                return -1;
+            return dataoffset + ct->ct_size;
+        }
+        return sizeof(CDataObject);                /* new_simple_cdata() */
+    }
+    if (Py_TYPE(cd) == &CDataOwning_Type) {
+        if (ct->ct_flags & CT_IS_PTR_TO_OWNED)
+            return sizeof(CDataObject_own_structptr);
+        if (ct->ct_flags & CT_POINTER) {           /* ffi.new("T *") */
+            Py_ssize_t datasize = ct->ct_itemdescr->ct_size;
+            if (ct->ct_itemdescr->ct_flags & CT_PRIMITIVE_CHAR)
+                datasize *= 2;
+            return offsetof(CDataObject_own_nolength, alignment) + datasize;
+        }
+    }
+    return -1;
+}
+
 static void cdata_dealloc(CDataObject *cd)
 {
+    Py_ssize_t size;
+
     if (cd->c_weakreflist != NULL)
         PyObject_ClearWeakRefs((PyObject *) cd);
 
+    size = cdata_freelist_size(cd);
     Py_DECREF(cd->c_type);
 #ifndef CFFI_MEM_LEAK     /* never release anything, tests only */
-    Py_TYPE(cd)->tp_free((PyObject *)cd);
+    if (size >= 0)
+        cdata_freelist_free(cd, size);
+    else
+        Py_TYPE(cd)->tp_free((PyObject *)cd);
 #endif
 }
 
@@ -1614,7 +1883,7 @@ static void cdataowninggc_dealloc(CDataObject *cd)
         Py_XDECREF(args);
         cffi_closure_free(closure);
     }
-    else if (cd->c_type->ct_flags & CT_IS_UNSIZED_CHAR_A) {  /* from_buffer */
+    else if (cd->c_type->ct_flags & CT_ARRAY) {         /* from_buffer */
         Py_buffer *view = ((CDataObject_owngc_frombuf *)cd)->bufferview;
         PyBuffer_Release(view);
         PyObject_Free(view);
@@ -1633,7 +1902,7 @@ static int cdataowninggc_traverse(CDataObject *cd, visitproc visit, void *arg)
         PyObject *args = (PyObject *)(closure->user_data);
         Py_VISIT(args);
     }
-    else if (cd->c_type->ct_flags & CT_IS_UNSIZED_CHAR_A) {  /* from_buffer */
+    else if (cd->c_type->ct_flags & CT_ARRAY) {         /* from_buffer */
         Py_buffer *view = ((CDataObject_owngc_frombuf *)cd)->bufferview;
         Py_VISIT(view->obj);
     }
@@ -1655,7 +1924,7 @@ static int cdataowninggc_clear(CDataObject *cd)
         closure->user_data = NULL;
         Py_XDECREF(args);
     }
-    else if (cd->c_type->ct_flags & CT_IS_UNSIZED_CHAR_A) {  /* from_buffer */
+    else if (cd->c_type->ct_flags & CT_ARRAY) {         /* from_buffer */
         Py_buffer *view = ((CDataObject_owngc_frombuf *)cd)->bufferview;
         PyBuffer_Release(view);
     }
@@ -1841,10 +2110,12 @@ static PyObject *cdataowninggc_repr(CDataObject *cd)
         PyObject *args = (PyObject *)((ffi_closure *)cd->c_data)->user_data;
         if (args == NULL)
             return cdata_repr(cd);
+        else if (PyTuple_GET_SIZE(args) == 3)      /* compare_callback() */
+            return _cdata_repr2(cd, "comparing", PyTuple_GET_ITEM(args, 1));
         else
             return _cdata_repr2(cd, "calling", PyTuple_GET_ITEM(args, 1));
     }
-    else if (cd->c_type->ct_flags & CT_IS_UNSIZED_CHAR_A) {  /* from_buffer */
+    else if (cd->c_type->ct_flags & CT_ARRAY) {         /* from_buffer */
         Py_buffer *view = ((CDataObject_owngc_frombuf *)cd)->bufferview;
         Py_ssize_t buflen = get_array_length(cd);
         return PyText_FromFormat(
@@ -2137,6 +2408,7 @@ cdata_ass_slice(CDataObject *cd, PySliceObject *slice, PyObject *v)
     PyObject *(*iternext)(PyObject *);
     char *cdata;
     int err;
+    Py_buffer view;
     CTypeDescrObject *ct = _cdata_getslicearg(cd, slice, bounds);
     if (ct == NULL)
         return -1;
@@ -2154,6 +2426,21 @@ cdata_ass_slice(CDataObject *cd, PySliceObject *slice, PyObject *v)
             return 0;
         }
     }
+    else if (_fetch_typed_buffer(ct, v, &view)) {
+        /* fast path: copying from a buffer of items of the same kind
+           and size, like an array.array or a numpy array */
+        Py_ssize_t srclen = view.len / itemsize;
+        if (srclen != length) {
+            PyErr_Format(PyExc_ValueError,
+                         "need %zd values to unpack, got %zd",
+                         length, srclen);
+            PyBuffer_Release(&view);
+            return -1;
+        }
+        memmove(cdata, view.buf, view.len);
+        PyBuffer_Release(&view);
+        return 0;
+    }
 
     /* A fast path for <char[]>[0:N] = b"somestring" or bytearray, which
        also adds support for Python 3: otherwise, you get integers while
@@ -2452,6 +2739,152 @@ static CTypeDescrObject *_get_ct_int(void)
     return ct_int;
 }
 
+/* Cache of the cif_description_t built for calls to variadic functions,
+   keyed by the function type and the types of the arguments passed in
+   the '...' part.  The entries are kept in most-recently-used order and
+   the last one is dropped when the cache is full.  The cif_descr is owned
+   by a capsule, so that a call in progress keeps it alive even if the
+   entry is dropped in the meantime.
+*/
+struct varargs_cif_s {
+    CTypeDescrObject *fct;      /* the variadic function type */
+    PyObject *fvarargs;         /* tuple of the types of all arguments */
+    PyObject *owner;            /* capsule owning 'cif_descr' */
+    cif_description_t *cif_descr;
+};
+
+#define VARARGS_CACHE_DEFAULT_SIZE   32
+
+static struct varargs_cif_s *varargs_cache = NULL;
+static Py_ssize_t varargs_cache_len = 0;
+static Py_ssize_t varargs_cache_maxsize = VARARGS_CACHE_DEFAULT_SIZE;
+static Py_ssize_t varargs_cache_hits = 0;
+static Py_ssize_t varargs_cache_misses = 0;
+
+#if PY_MAJOR_VERSION < 3
+static void _free_varargs_cif(void *cif_descr)
+{
+    PyObject_Free(cif_descr);
+}
+#else
+static void _free_varargs_cif(PyObject *capsule)
+{
+    PyObject_Free(PyCapsule_GetPointer(capsule, "cffi_varargs_cif"));
+}
+#endif
+
+static void varargs_cache_release(struct varargs_cif_s *entries, Py_ssize_t n)
+{
+    /* the entries must already be removed from 'varargs_cache', in
+       case a Py_DECREF() causes more variadic calls */
+    Py_ssize_t i;
+    for (i = 0; i < n; i++) {
+        Py_DECREF(entries[i].fct);
+        Py_DECREF(entries[i].fvarargs);
+        Py_DECREF(entries[i].owner);
+    }
+}
+
+static cif_description_t *
+varargs_cache_get(CTypeDescrObject *fct, CTypeDescrObject **vartypes,
+                  Py_ssize_t nvarargs, PyObject **p_fvarargs,
+                  PyObject **p_owner)
+{
+    /* Return the cif_descr for a call to the variadic function 'fct'
+       with extra arguments of the types 'vartypes'.  Returns new
+       references to the tuple of all argument types in '*p_fvarargs',
+       and to the owner of the cif_descr in '*p_owner'. */
+    PyObject *signature = fct->ct_stuff;
+    Py_ssize_t nargs_declared = PyTuple_GET_SIZE(signature) - 2;
+    Py_ssize_t i, j;
+    struct varargs_cif_s entry, dropped;
+    int drop = 0;
+
+    for (i = 0; i < varargs_cache_len; i++) {
+        struct varargs_cif_s *e = &varargs_cache[i];
+        if (e->fct != fct ||
+                PyTuple_GET_SIZE(e->fvarargs) != nargs_declared + nvarargs)
+            continue;
+        for (j = 0; j < nvarargs; j++) {
+            if (PyTuple_GET_ITEM(e->fvarargs, nargs_declared + j) !=
+                    (PyObject *)vartypes[j])
+                break;
+        }
+        if (j == nvarargs) {
+            /* found: move it to the front */
+            entry = *e;
+            memmove(varargs_cache + 1, varargs_cache,
+                    i * sizeof(struct varargs_cif_s));
+            varargs_cache[0] = entry;
+            varargs_cache_hits++;
+            Py_INCREF(entry.fvarargs);
+            Py_INCREF(entry.owner);
+            *p_fvarargs = entry.fvarargs;
+            *p_owner = entry.owner;
+            return entry.cif_descr;
+        }
+    }
+    varargs_cache_misses++;
+
+    entry.fvarargs = PyTuple_New(nargs_declared + nvarargs);
+    if (entry.fvarargs == NULL)
+        return NULL;
+    for (i = 0; i < nargs_declared; i++) {
+        PyObject *o = PyTuple_GET_ITEM(signature, 2 + i);
+        Py_INCREF(o);
+        PyTuple_SET_ITEM(entry.fvarargs, i, o);
+    }
+    for (i = 0; i < nvarargs; i++) {
+        Py_INCREF(vartypes[i]);
+        PyTuple_SET_ITEM(entry.fvarargs, nargs_declared + i,
+                         (PyObject *)vartypes[i]);
+    }
+    entry.cif_descr = fb_prepare_cif(entry.fvarargs,
+                         (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1),
+#if PY_MAJOR_VERSION < 3
+                         PyInt_AS_LONG(PyTuple_GET_ITEM(signature, 0)));
+#else
+                         PyLong_AS_LONG(PyTuple_GET_ITEM(signature, 0)));
+#endif
+    if (entry.cif_descr == NULL) {
+        Py_DECREF(entry.fvarargs);
+        return NULL;
+    }
+    entry.owner = PyCapsule_New(entry.cif_descr, "cffi_varargs_cif",
+                                _free_varargs_cif);
+    if (entry.owner == NULL) {
+        PyObject_Free(entry.cif_descr);
+        Py_DECREF(entry.fvarargs);
+        return NULL;
+    }
+    *p_fvarargs = entry.fvarargs;
+    *p_owner = entry.owner;
+
+    if (varargs_cache_maxsize > 0) {
+        if (varargs_cache == NULL) {
+            varargs_cache = PyMem_Malloc(varargs_cache_maxsize *
+                                         sizeof(struct varargs_cif_s));
+            if (varargs_cache == NULL)
+                return entry.cif_descr;    /* uncached */
+        }
+        if (varargs_cache_len == varargs_cache_maxsize) {
+            dropped = varargs_cache[--varargs_cache_len];
+            drop = 1;
+        }
+        memmove(varargs_cache + 1, varargs_cache,
+                varargs_cache_len * sizeof(struct varargs_cif_s));
+        Py_INCREF(fct);
+        Py_INCREF(entry.fvarargs);
+        Py_INCREF(entry.owner);
+        entry.fct = fct;
+        varargs_cache[0] = entry;
+        varargs_cache_len++;
+        if (drop)
+            varargs_cache_release(&dropped, 1);
+    }
+    return entry.cif_descr;
+}
+
 static Py_ssize_t
 _prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
                                char **output_data)
@@ -2526,11 +2959,12 @@ _prepare_pointer_call_argument(CTypeDescrObject *ctptr, PyObject *init,
 static PyObject*
 cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
 {
+    cffi_stack_exchange_t stack_exchange;
     char *buffer;
     void** buffer_array;
     cif_description_t *cif_descr;
     Py_ssize_t i, nargs, nargs_declared;
-    PyObject *signature, *res = NULL, *fvarargs;
+    PyObject *signature, *res = NULL, *fvarargs, *cif_owner;
     CTypeDescrObject *fresult;
     char *resultdata;
     char *errormsg;
@@ -2568,19 +3002,13 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
     }
     else {
         /* call of a variadic function */
-        ffi_abi fabi;
+        CTypeDescrObject **vartypes;
         if (nargs < nargs_declared) {
             errormsg = "'%s' expects at least %zd arguments, got %zd";
             goto bad_number_of_arguments;
         }
-        fvarargs = PyTuple_New(nargs);
-        if (fvarargs == NULL)
-            goto error;
-        for (i = 0; i < nargs_declared; i++) {
-            PyObject *o = PyTuple_GET_ITEM(signature, 2 + i);
-            Py_INCREF(o);
-            PyTuple_SET_ITEM(fvarargs, i, o);
-        }
+        vartypes = alloca((nargs - nargs_declared) *
+                          sizeof(CTypeDescrObject *));
         for (i = nargs_declared; i < nargs; i++) {
             PyObject *obj = PyTuple_GET_ITEM(args, i);
             CTypeDescrObject *ct;
@@ -2598,7 +3026,6 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                 else if (ct->ct_flags & CT_ARRAY) {
                     ct = (CTypeDescrObject *)ct->ct_stuff;
                 }
-                Py_INCREF(ct);
             }
             else {
                 PyErr_Format(PyExc_TypeError,
@@ -2607,22 +3034,24 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
                              i + 1, Py_TYPE(obj)->tp_name);
                 goto error;
             }
-            PyTuple_SET_ITEM(fvarargs, i, (PyObject *)ct);
+            vartypes[i - nargs_declared] = ct;
         }
-#if PY_MAJOR_VERSION < 3
-        fabi = PyInt_AS_LONG(PyTuple_GET_ITEM(signature, 0));
-#else
-        fabi = PyLong_AS_LONG(PyTuple_GET_ITEM(signature, 0));
-#endif
-        cif_descr = fb_prepare_cif(fvarargs, fresult, fabi);
+        cif_descr = varargs_cache_get(cd->c_type, vartypes,
+                                      nargs - nargs_declared,
+                                      &fvarargs, &cif_owner);
         if (cif_descr == NULL)
             goto error;
     }
 
-    buffer = PyObject_Malloc(cif_descr->exchange_size);
-    if (buffer == NULL) {
-        PyErr_NoMemory();
-        goto error;
+    if (cif_descr->exchange_size <= CFFI_STACK_EXCHANGE_SIZE) {
+        buffer = stack_exchange.data;
+    }
+    else {
+        buffer = PyObject_Malloc(cif_descr->exchange_size);
+        if (buffer == NULL) {
+            PyErr_NoMemory();
+            goto error;
+        }
     }
 
     buffer_array = (void **)buffer;
@@ -2631,6 +3060,7 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
         CTypeDescrObject *argtype;
         char *data = buffer + cif_descr->exchange_offset_arg[1 + i];
         PyObject *obj = PyTuple_GET_ITEM(args, i);
+        Py_ssize_t datasize;
 
         buffer_array[i] = data;
 
@@ -2639,24 +3069,19 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
         else
             argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(fvarargs, i);
 
-        if (argtype->ct_flags & CT_POINTER) {
-            char *tmpbuf;
-            Py_ssize_t datasize = _prepare_pointer_call_argument(
-                                            argtype, obj, (char **)data);
-            if (datasize == 0)
-                ;    /* successfully filled '*data' */
-            else if (datasize < 0)
+        datasize = cif_descr->convert_args[i](data, argtype, obj);
+        if (datasize == 0)
+            ;    /* successfully filled '*data' */
+        else if (datasize < 0)
+            goto error;
+        else {
+            /* a pointer argument initialized from a list or a string */
+            char *tmpbuf = alloca(datasize);
+            memset(tmpbuf, 0, datasize);
+            *(char **)data = tmpbuf;
+            if (convert_array_from_object(tmpbuf, argtype, obj) < 0)
                 goto error;
-            else {
-                tmpbuf = alloca(datasize);
-                memset(tmpbuf, 0, datasize);
-                *(char **)data = tmpbuf;
-                if (convert_array_from_object(tmpbuf, argtype, obj) < 0)
-                    goto error;
-            }
         }
-        else if (convert_from_object(data, argtype, obj) < 0)
-            goto error;
     }
 
     resultdata = buffer + cif_descr->exchange_offset_arg[0];
@@ -2669,36 +3094,25 @@ cdata_call(CDataObject *cd, PyObject *args, PyObject *kwds)
     save_errno();
     Py_END_ALLOW_THREADS
 
+#ifdef WORDS_BIGENDIAN
     if (fresult->ct_flags & (CT_PRIMITIVE_CHAR | CT_PRIMITIVE_SIGNED |
                              CT_PRIMITIVE_UNSIGNED)) {
-#ifdef WORDS_BIGENDIAN
         /* For results of precisely these types, libffi has a strange
            rule that they will be returned as a whole 'ffi_arg' if they
            are smaller.  The difference only matters on big-endian. */
         if (fresult->ct_size < sizeof(ffi_arg))
             resultdata += (sizeof(ffi_arg) - fresult->ct_size);
-#endif
-        res = convert_to_object(resultdata, fresult);
-    }
-    else if (fresult->ct_flags & CT_VOID) {
-        res = Py_None;
-        Py_INCREF(res);
-    }
-    else if (fresult->ct_flags & CT_STRUCT) {
-        res = convert_struct_to_owning_object(resultdata, fresult);
-    }
-    else {
-        res = convert_to_object(resultdata, fresult);
     }
+#endif
+    res = cif_descr->convert_result(resultdata, fresult);
     /* fall-through */
 
  error:
-    if (buffer)
+    if (buffer && buffer != stack_exchange.data)
         PyObject_Free(buffer);
-    if (fvarargs != NULL) {
+    if (fvarargs != NULL) {   /* only if variadic */
         Py_DECREF(fvarargs);
-        if (cif_descr != NULL)  /* but only if fvarargs != NULL, if variadic */
-            PyObject_Free(cif_descr);
+        Py_DECREF(cif_owner);
     }
     return res;
 }
@@ -3021,7 +3435,7 @@ static CDataObject *allocate_owning_object(Py_ssize_t size,
                                            CTypeDescrObject *ct)
 {
     CDataObject *cd;
-    cd = (CDataObject *)PyObject_Malloc(size);
+    cd = (CDataObject *)cdata_freelist_alloc(size);
     if (PyObject_Init((PyObject *)cd, &CDataOwning_Type) == NULL)
         return NULL;
 
@@ -3157,10 +3571,10 @@ static PyObject *direct_newp(CTypeDescrObject *ct, PyObject *init,
         dataoffset = offsetof(CDataObject_own_nolength, alignment);
         datasize = ct->ct_size;
         if (datasize < 0) {
-            explicitlength = get_new_array_length(&init);
+            ctitem = ct->ct_itemdescr;
+            explicitlength = get_new_array_length(ctitem, &init);
             if (explicitlength < 0)
                 return NULL;
-            ctitem = ct->ct_itemdescr;
             dataoffset = offsetof(CDataObject_own_length, alignment);
             datasize = explicitlength * ctitem->ct_size;
             if (explicitlength > 0 &&
@@ -3291,7 +3705,8 @@ _my_PyObject_AsBool(PyObject *ob)
 static CDataObject *_new_casted_primitive(CTypeDescrObject *ct)
 {
     int dataoffset = offsetof(CDataObject_casted_primitive, alignment);
-    CDataObject *cd = (CDataObject *)PyObject_Malloc(dataoffset + ct->ct_size);
+    CDataObject *cd = (CDataObject *)cdata_freelist_alloc(dataoffset +
+                                                          ct->ct_size);
     if (PyObject_Init((PyObject *)cd, &CData_Type) == NULL)
         return NULL;
     Py_INCREF(ct);
@@ -3592,10 +4007,48 @@ static PyObject *dl_write_variable(DynLibObject *dlobj, PyObject *args)
     return Py_None;
 }
 
+static PyObject *make_global_var(PyObject *name, CTypeDescrObject *type,
+                                 char *addr, void *(*fetch_addr)(void));
+/* forward, implemented in cglob.c */
+
+static PyObject *dl_load_variable_descr(DynLibObject *dlobj, PyObject *args)
+{
+    /* returns a descriptor, to be stored in a class, that reads and
+       writes the variable at the address found now */
+    CTypeDescrObject *ct;
+    PyObject *name;
+    char *varname;
+    char *data;
+
+    if (!PyArg_ParseTuple(args, "O!O:load_variable_descr",
+                          &CTypeDescr_Type, &ct, &name))
+        return NULL;
+    varname = PyText_AsUTF8(name);
+    if (varname == NULL)
+        return NULL;
+
+    dlerror();   /* clear error condition */
+    data = dlsym(dlobj->dl_handle, varname);
+    if (data == NULL) {
+        const char *error = dlerror();
+        if (error != NULL)
+            PyErr_Format(PyExc_KeyError,
+                         "variable '%s' not found in library '%s': %s",
+                         varname, dlobj->dl_name, error);
+        else
+            PyErr_Format(FFIError, "global variable '%s' is at address NULL",
+                         varname);
+        return NULL;
+    }
+    return make_global_var(name, ct, data, NULL);
+}
+
 static PyMethodDef dl_methods[] = {
     {"load_function",   (PyCFunction)dl_load_function,  METH_VARARGS},
     {"read_variable",   (PyCFunction)dl_read_variable,  METH_VARARGS},
     {"write_variable",  (PyCFunction)dl_write_variable, METH_VARARGS},
+    {"load_variable_descr", (PyCFunction)dl_load_variable_descr,
+                                                        METH_VARARGS},
     {NULL,              NULL}           /* sentinel */
 };
 
@@ -4641,6 +5094,161 @@ static ffi_type *fb_fill_type(struct funcbuilder_s *fb, CTypeDescrObject *ct,
     }
 }
 
+/* Specialized converters for the arguments and the result of function
+   calls.  They are chosen once per function type by fb_build(), so that
+   cdata_call() doesn't need to dispatch on 'ct_flags' for every call. */
+
+static Py_ssize_t _argconv_generic(char *data, CTypeDescrObject *ct,
+                                   PyObject *obj)
+{
+    return convert_from_object(data, ct, obj);
+}
+
+static Py_ssize_t _argconv_pointer(char *data, CTypeDescrObject *ct,
+                                   PyObject *obj)
+{
+    if (CData_Check(obj) && ((CDataObject *)obj)->c_type == ct) {
+        *(char **)data = ((CDataObject *)obj)->c_data;
+        return 0;
+    }
+    return _prepare_pointer_call_argument(ct, obj, (char **)data);
+}
+
+#define _ARGCONV_SIGNED(TYPE)                                           \
+static Py_ssize_t _argconv_##TYPE(char *data, CTypeDescrObject *ct,     \
+                                  PyObject *obj)                        \
+{                                                                       \
+    PY_LONG_LONG value = _my_PyLong_AsLongLong(obj);                    \
+    if (value == -1 && PyErr_Occurred())                                \
+        return -1;                                                      \
+    if (value != (TYPE)value)                                           \
+        return _convert_overflow(obj, ct->ct_name);                     \
+    *(TYPE *)data = (TYPE)value;                                        \
+    return 0;                                                           \
+}
+#define _ARGCONV_UNSIGNED(TYPE)                                         \
+static Py_ssize_t _argconv_##TYPE(char *data, CTypeDescrObject *ct,     \
+                                  PyObject *obj)                        \
+{                                                                       \
+    unsigned PY_LONG_LONG value = _my_PyLong_AsUnsignedLongLong(obj, 1);\
+    if (value == (unsigned PY_LONG_LONG)-1 && PyErr_Occurred())         \
+        return -1;                                                      \
+    if (value != (TYPE)value)                                           \
+        return _convert_overflow(obj, ct->ct_name);                     \
+    *(TYPE *)data = (TYPE)value;                                        \
+    return 0;                                                           \
+}
+_ARGCONV_SIGNED(int8_t)
+_ARGCONV_SIGNED(int16_t)
+_ARGCONV_SIGNED(int32_t)
+_ARGCONV_SIGNED(int64_t)
+_ARGCONV_UNSIGNED(uint8_t)
+_ARGCONV_UNSIGNED(uint16_t)
+_ARGCONV_UNSIGNED(uint32_t)
+_ARGCONV_UNSIGNED(uint64_t)
+#undef _ARGCONV_SIGNED
+#undef _ARGCONV_UNSIGNED
+
+static Py_ssize_t _argconv_double(char *data, CTypeDescrObject *ct,
+                                  PyObject *obj)
+{
+    double value = PyFloat_AsDouble(obj);
+    if (value == -1.0 && PyErr_Occurred())
+        return -1;
+    *(double *)data = value;
+    return 0;
+}
+
+static Py_ssize_t _argconv_float(char *data, CTypeDescrObject *ct,
+                                 PyObject *obj)
+{
+    double value = PyFloat_AsDouble(obj);
+    if (value == -1.0 && PyErr_Occurred())
+        return -1;
+    *(float *)data = (float)value;
+    return 0;
+}
+
+static cffi_argconv_t fb_pick_argconv(CTypeDescrObject *ct)
+{
+    if (ct->ct_flags & CT_POINTER)
+        return _argconv_pointer;
+    if (ct->ct_flags & CT_PRIMITIVE_SIGNED) {
+        switch (ct->ct_size) {
+        case 1: return _argconv_int8_t;
+        case 2: return _argconv_int16_t;
+        case 4: return _argconv_int32_t;
+        case 8: return _argconv_int64_t;
+        }
+    }
+    if ((ct->ct_flags & CT_PRIMITIVE_UNSIGNED) &&
+            !(ct->ct_flags & CT_IS_BOOL)) {
+        switch (ct->ct_size) {
+        case 1: return _argconv_uint8_t;
+        case 2: return _argconv_uint16_t;
+        case 4: return _argconv_uint32_t;
+        case 8: return _argconv_uint64_t;
+        }
+    }
+    if ((ct->ct_flags & CT_PRIMITIVE_FLOAT) &&
+            !(ct->ct_flags & CT_IS_LONGDOUBLE)) {
+        if (ct->ct_size == sizeof(double))
+            return _argconv_double;
+        if (ct->ct_size == sizeof(float))
+            return _argconv_float;
+    }
+    return _argconv_generic;
+}
+
+static PyObject *_resconv_generic(char *data, CTypeDescrObject *ct)
+{
+    return convert_to_object(data, ct);
+}
+
+static PyObject *_resconv_void(char *data, CTypeDescrObject *ct)
+{
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *_resconv_struct(char *data, CTypeDescrObject *ct)
+{
+    return convert_struct_to_owning_object(data, ct);
+}
+
+static PyObject *_resconv_int(char *data, CTypeDescrObject *ct)
+{
+    return PyInt_FromLong(*(int *)data);
+}
+
+static PyObject *_resconv_long(char *data, CTypeDescrObject *ct)
+{
+    return PyInt_FromLong(*(long *)data);
+}
+
+static PyObject *_resconv_double(char *data, CTypeDescrObject *ct)
+{
+    return PyFloat_FromDouble(*(double *)data);
+}
+
+static cffi_resconv_t fb_pick_resconv(CTypeDescrObject *ct)
+{
+    if (ct->ct_flags & CT_VOID)
+        return _resconv_void;
+    if (ct->ct_flags & CT_STRUCT)
+        return _resconv_struct;
+    if (ct->ct_flags & CT_PRIMITIVE_SIGNED) {
+        if (ct->ct_size == sizeof(int))
+            return _resconv_int;
+        if (ct->ct_size == sizeof(long))
+            return _resconv_long;
+    }
+    if ((ct->ct_flags & CT_PRIMITIVE_FLOAT) && ct->ct_size == sizeof(double)
+            && !(ct->ct_flags & CT_IS_LONGDOUBLE))
+        return _resconv_double;
+    return _resconv_generic;
+}
+
 #define ALIGN_ARG(n)  ((n) + 7) & ~7
 
 static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
@@ -4649,11 +5257,15 @@ static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
     Py_ssize_t i, nargs = PyTuple_GET_SIZE(fargs);
     Py_ssize_t exchange_offset;
     cif_description_t *cif_descr;
+    cffi_argconv_t *convert_args;
 
     /* ffi buffer: start with a cif_description */
     cif_descr = fb_alloc(fb, sizeof(cif_description_t) +
                              nargs * sizeof(Py_ssize_t));
 
+    /* ffi buffer: next comes an array of converters, one per argument */
+    convert_args = fb_alloc(fb, nargs * sizeof(cffi_argconv_t));
+
     /* ffi buffer: next comes an array of 'ffi_type*', one per argument */
     fb->atypes = fb_alloc(fb, nargs * sizeof(ffi_type*));
     fb->nargs = nargs;
@@ -4674,6 +5286,8 @@ static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
         if (i < (Py_ssize_t)sizeof(ffi_arg))
             i = sizeof(ffi_arg);
         exchange_offset += i;
+        cif_descr->convert_result = fb_pick_resconv(fresult);
+        cif_descr->convert_args = convert_args;
     }
     else
         exchange_offset = 0;   /* not used */
@@ -4700,6 +5314,7 @@ static int fb_build(struct funcbuilder_s *fb, PyObject *fargs,
             exchange_offset = ALIGN_ARG(exchange_offset);
             cif_descr->exchange_offset_arg[1 + i] = exchange_offset;
             exchange_offset += atype->size;
+            convert_args[i] = fb_pick_argconv(farg);
         }
     }
 
@@ -4985,21 +5600,23 @@ static int convert_from_object_fficallback(char *result,
             goto skip;
         if (ctype->ct_flags & CT_PRIMITIVE_SIGNED) {
             PY_LONG_LONG value;
+            char buf[sizeof(PY_LONG_LONG)];
             /* It's probably fine to always zero-extend, but you never
                know: maybe some code somewhere expects a negative
                'short' result to be returned into EAX as a 32-bit
                negative number.  Better safe than sorry.  This code
                is about that case.  Let's ignore this for enums.
             */
-            /* do a first conversion only to detect overflows.  This
-               conversion produces stuff that is otherwise ignored. */
-            if (convert_from_object(result, ctype, pyobj) < 0)
-                return -1;
             /* manual inlining and tweaking of convert_from_object()
                in order to write a whole 'ffi_arg'. */
             value = _my_PyLong_AsLongLong(pyobj);
             if (value == -1 && PyErr_Occurred())
                 return -1;
+            write_raw_integer_data(buf, value, ctype->ct_size);
+            if (value != read_raw_signed_data(buf, ctype->ct_size)) {
+                /* overflow: let convert_from_object() raise the error */
+                return convert_from_object(result, ctype, pyobj);
+            }
             write_raw_integer_data(result, value, sizeof(ffi_arg));
             return 0;
         }
@@ -5048,10 +5665,38 @@ static void _my_PyErr_WriteUnraisable(char *objdescr, PyObject *obj,
     Py_XDECREF(tb);
 }
 
-static void general_invoke_callback(int decode_args_from_libffi,
-                                    void *result, char *args, void *userdata)
+static int _unpack_casenum(CTypeDescrObject *ctitem, char *src,
+                           Py_ssize_t stride);                      /*forward*/
+static PyObject *_unpack_item(int casenum, char *src,
+                              CTypeDescrObject *ctitem);            /*forward*/
+
+#if PY_VERSION_HEX >= 0x03090000
+/* Callbacks with up to this number of arguments are invoked with
+   PyObject_Vectorcall(), without building a tuple of arguments */
+# define CALLBACK_VECTORCALL_MAX_ARGS  16
+#endif
+
+static PyObject *_callback_arg(int decode_args_from_libffi, char *args,
+                               Py_ssize_t i, CTypeDescrObject *a_ct,
+                               int casenum)
 {
-    PyObject *cb_args = (PyObject *)userdata;
+    char *a_src;
+
+    if (decode_args_from_libffi) {
+        a_src = ((void **)args)[i];
+    }
+    else {
+        a_src = args + i * 8;
+        if (a_ct->ct_flags & (CT_IS_LONGDOUBLE | CT_STRUCT | CT_UNION))
+            a_src = *(char **)a_src;
+    }
+    return _unpack_item(casenum, a_src, a_ct);
+}
+
+static void general_invoke_callback(int decode_args_from_libffi,
+                                    void *result, char *args, void *userdata)
+{
+    PyObject *cb_args = (PyObject *)userdata;
     CTypeDescrObject *ct = (CTypeDescrObject *)PyTuple_GET_ITEM(cb_args, 0);
     PyObject *signature = ct->ct_stuff;
     PyObject *py_ob = PyTuple_GET_ITEM(cb_args, 1);
@@ -5061,36 +5706,53 @@ static void general_invoke_callback(int decode_args_from_libffi,
     PyObject *onerror_cb;
     Py_ssize_t i, n;
     char *extra_error_line = NULL;
+    /* one casenum per argument, see _unpack_casenum() */
+    signed char *casenums = (signed char *)PyBytes_AS_STRING(
+                                                PyTuple_GET_ITEM(cb_args, 4));
 
 #define SIGNATURE(i)  ((CTypeDescrObject *)PyTuple_GET_ITEM(signature, i))
 
     Py_INCREF(cb_args);
 
     n = PyTuple_GET_SIZE(signature) - 2;
-    py_args = PyTuple_New(n);
-    if (py_args == NULL)
-        goto error;
-
-    for (i=0; i<n; i++) {
-        char *a_src;
-        PyObject *a;
-        CTypeDescrObject *a_ct = SIGNATURE(2 + i);
+#ifdef CALLBACK_VECTORCALL_MAX_ARGS
+    if (n <= CALLBACK_VECTORCALL_MAX_ARGS) {
+        /* the item 0 is free for PY_VECTORCALL_ARGUMENTS_OFFSET */
+        PyObject *small_args[1 + CALLBACK_VECTORCALL_MAX_ARGS] = {NULL};
 
-        if (decode_args_from_libffi) {
-            a_src = ((void **)args)[i];
-        }
-        else {
-            a_src = args + i * 8;
-            if (a_ct->ct_flags & (CT_IS_LONGDOUBLE | CT_STRUCT | CT_UNION))
-                a_src = *(char **)a_src;
+        for (i=0; i<n; i++) {
+            PyObject *a = _callback_arg(decode_args_from_libffi, args, i,
+                                        SIGNATURE(2 + i), casenums[i]);
+            if (a == NULL) {
+                while (--i >= 0)
+                    Py_DECREF(small_args[1 + i]);
+                goto error;
+            }
+            small_args[1 + i] = a;
         }
-        a = convert_to_object(a_src, a_ct);
-        if (a == NULL)
-            goto error;
-        PyTuple_SET_ITEM(py_args, i, a);
+        py_res = PyObject_Vectorcall(py_ob, small_args + 1,
+                                     n | PY_VECTORCALL_ARGUMENTS_OFFSET,
+                                     NULL);
+        for (i=0; i<n; i++)
+            Py_DECREF(small_args[1 + i]);
     }
+    else
+#endif
+    {
+        py_args = PyTuple_New(n);
+        if (py_args == NULL)
+            goto error;
+
+        for (i=0; i<n; i++) {
+            PyObject *a = _callback_arg(decode_args_from_libffi, args, i,
+                                        SIGNATURE(2 + i), casenums[i]);
+            if (a == NULL)
+                goto error;
+            PyTuple_SET_ITEM(py_args, i, a);
+        }
 
-    py_res = PyObject_Call(py_ob, py_args, NULL);
+        py_res = PyObject_Call(py_ob, py_args, NULL);
+    }
     if (py_res == NULL)
         goto error;
     if (convert_from_object_fficallback(result, SIGNATURE(1), py_res,
@@ -5171,8 +5833,8 @@ static PyObject *prepare_callback_info_tuple(CTypeDescrObject *ct,
                                              int decode_args_from_libffi)
 {
     CTypeDescrObject *ctresult;
-    PyObject *py_rawerr, *infotuple;
-    Py_ssize_t size;
+    PyObject *py_rawerr, *casenums, *infotuple;
+    Py_ssize_t i, size;
 
     if (!(ct->ct_flags & CT_FUNCTIONPTR)) {
         PyErr_Format(PyExc_TypeError, "expected a function ctype, got '%s'",
@@ -5208,8 +5870,24 @@ static PyObject *prepare_callback_info_tuple(CTypeDescrObject *ct,
             return NULL;
         }
     }
-    infotuple = Py_BuildValue("OOOO", ct, ob, py_rawerr, onerror_ob);
+    /* precompute how to convert each argument: the fast paths of
+       _unpack_item() can be used because the arguments are aligned */
+    size = PyTuple_GET_SIZE(ct->ct_stuff) - 2;
+    casenums = PyBytes_FromStringAndSize(NULL, size);
+    if (casenums == NULL) {
+        Py_DECREF(py_rawerr);
+        return NULL;
+    }
+    for (i = 0; i < size; i++) {
+        CTypeDescrObject *a_ct;
+        a_ct = (CTypeDescrObject *)PyTuple_GET_ITEM(ct->ct_stuff, 2 + i);
+        PyBytes_AS_STRING(casenums)[i] = (char)_unpack_casenum(a_ct, NULL, 0);
+    }
+
+    infotuple = Py_BuildValue("OOOOO", ct, ob, py_rawerr, onerror_ob,
+                              casenums);
     Py_DECREF(py_rawerr);
+    Py_DECREF(casenums);
 
 #ifdef WITH_THREAD
     /* We must setup the GIL here, in case the callback is invoked in
@@ -5220,23 +5898,16 @@ static PyObject *prepare_callback_info_tuple(CTypeDescrObject *ct,
     return infotuple;
 }
 
-static PyObject *b_callback(PyObject *self, PyObject *args)
+static PyObject *_new_closure(CTypeDescrObject *ct, PyObject *infotuple,
+                              void (*fun)(ffi_cif *, void *, void **, void *))
 {
-    CTypeDescrObject *ct;
+    /* Return a new cdata of the function pointer type 'ct', which
+       invokes 'fun' with 'infotuple' as its last argument.  Steals a
+       reference to 'infotuple', whose item 1 is shown by repr(). */
     CDataObject *cd;
-    PyObject *ob, *error_ob = Py_None, *onerror_ob = Py_None;
-    PyObject *infotuple;
     cif_description_t *cif_descr;
     ffi_closure *closure;
 
-    if (!PyArg_ParseTuple(args, "O!O|OO:callback", &CTypeDescr_Type, &ct, &ob,
-                          &error_ob, &onerror_ob))
-        return NULL;
-
-    infotuple = prepare_callback_info_tuple(ct, ob, error_ob, onerror_ob, 1);
-    if (infotuple == NULL)
-        return NULL;
-
     closure = cffi_closure_alloc();
 
     cd = PyObject_GC_New(CDataObject, &CDataOwningGC_Type);
@@ -5256,7 +5927,7 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
         goto error;
     }
     if (ffi_prep_closure(closure, &cif_descr->cif,
-                         invoke_callback, infotuple) != FFI_OK) {
+                         fun, infotuple) != FFI_OK) {
         PyErr_SetString(PyExc_SystemError,
                         "libffi failed to build this callback");
         goto error;
@@ -5287,6 +5958,192 @@ static PyObject *b_callback(PyObject *self, PyObject *args)
     return NULL;
 }
 
+static PyObject *b_callback(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct;
+    PyObject *ob, *error_ob = Py_None, *onerror_ob = Py_None;
+    PyObject *infotuple;
+
+    if (!PyArg_ParseTuple(args, "O!O|OO:callback", &CTypeDescr_Type, &ct, &ob,
+                          &error_ob, &onerror_ob))
+        return NULL;
+
+    infotuple = prepare_callback_info_tuple(ct, ob, error_ob, onerror_ob, 1);
+    if (infotuple == NULL)
+        return NULL;
+
+    return _new_closure(ct, infotuple, invoke_callback);
+}
+
+/* Native comparison functions, like the ones passed to qsort(): they
+   compare the primitive values found at the same offset inside the
+   two items, without calling Python at all. */
+
+enum {
+    NCMP_INT8, NCMP_INT16, NCMP_INT32, NCMP_INT64,
+    NCMP_UINT8, NCMP_UINT16, NCMP_UINT32, NCMP_UINT64,
+    NCMP_FLOAT, NCMP_DOUBLE
+};
+
+struct native_compare_s {
+    Py_ssize_t offset;      /* of the value inside the items */
+    int kind;               /* NCMP_xxx */
+    int reverse;            /* 0 for ascending order, 1 for descending */
+};
+
+static void invoke_native_compare(ffi_cif *cif, void *result, void **args,
+                                  void *userdata)
+{
+    /* No Python code here, and so no need to hold the GIL: the
+       info tuple and the bytes object inside it are immutable. */
+    PyObject *infotuple = (PyObject *)userdata;
+    struct native_compare_s *nc = (struct native_compare_s *)
+        PyBytes_AS_STRING(PyTuple_GET_ITEM(infotuple, 2));
+    char *a = *(char **)args[0] + nc->offset;
+    char *b = *(char **)args[1] + nc->offset;
+    int res;
+
+    switch (nc->kind) {
+
+#define NCMP_CASE(kind, type)                                   \
+    case kind: {                                                \
+        type x, y;                                              \
+        memcpy(&x, a, sizeof(type));     /* may be unaligned */ \
+        memcpy(&y, b, sizeof(type));                            \
+        res = (x > y) - (x < y);                                \
+        break;                                                  \
+    }
+    NCMP_CASE(NCMP_INT8, int8_t)
+    NCMP_CASE(NCMP_INT16, int16_t)
+    NCMP_CASE(NCMP_INT32, int32_t)
+    NCMP_CASE(NCMP_INT64, int64_t)
+    NCMP_CASE(NCMP_UINT8, uint8_t)
+    NCMP_CASE(NCMP_UINT16, uint16_t)
+    NCMP_CASE(NCMP_UINT32, uint32_t)
+    NCMP_CASE(NCMP_UINT64, uint64_t)
+    NCMP_CASE(NCMP_FLOAT, float)
+    NCMP_CASE(NCMP_DOUBLE, double)
+#undef NCMP_CASE
+
+    default:
+        res = 0;
+    }
+    if (nc->reverse)
+        res = -res;
+    *(ffi_sarg *)result = res;
+}
+
+static PyObject *b_compare_callback(PyObject *self, PyObject *args)
+{
+    CTypeDescrObject *ct, *ctitem, *ctkey;
+    PyObject *fieldname = Py_None, *fargs, *descr, *spec, *infotuple;
+    struct native_compare_s nc;
+    int reverse = 0;
+
+    if (!PyArg_ParseTuple(args, "O!O!|Oi:compare_callback",
+                          &CTypeDescr_Type, &ct, &CTypeDescr_Type, &ctitem,
+                          &fieldname, &reverse))
+        return NULL;
+
+    /* 'ct' must be 'int(*)(T1 *, T2 *)' */
+    if (!(ct->ct_flags & CT_FUNCTIONPTR) ||
+            PyTuple_GET_SIZE(ct->ct_stuff) != 4 ||
+            ct->ct_extra == NULL) {
+        goto bad_function_type;
+    }
+    fargs = ct->ct_stuff;
+    if (!(((CTypeDescrObject *)PyTuple_GET_ITEM(fargs, 1))->ct_flags &
+              CT_PRIMITIVE_SIGNED) ||
+        ((CTypeDescrObject *)PyTuple_GET_ITEM(fargs, 1))->ct_size !=
+              sizeof(int) ||
+        !(((CTypeDescrObject *)PyTuple_GET_ITEM(fargs, 2))->ct_flags &
+              CT_POINTER) ||
+        !(((CTypeDescrObject *)PyTuple_GET_ITEM(fargs, 3))->ct_flags &
+              CT_POINTER))
+        goto bad_function_type;
+
+    ctkey = ctitem;
+    nc.offset = 0;
+    if (fieldname != Py_None) {
+        CFieldObject *cf;
+        if (!(ctitem->ct_flags & (CT_STRUCT | CT_UNION))) {
+            PyErr_Format(PyExc_TypeError,
+                         "expected a struct or union ctype, got '%s'",
+                         ctitem->ct_name);
+            return NULL;
+        }
+        if (force_lazy_struct(ctitem) <= 0) {
+            if (!PyErr_Occurred())
+                PyErr_Format(PyExc_TypeError, "'%s' is opaque",
+                             ctitem->ct_name);
+            return NULL;
+        }
+        cf = (CFieldObject *)PyDict_GetItem(ctitem->ct_stuff, fieldname);
+        if (cf == NULL) {
+            PyErr_SetObject(PyExc_KeyError, fieldname);
+            return NULL;
+        }
+        if (cf->cf_bitshift != BS_REGULAR) {
+            PyErr_Format(PyExc_TypeError, "field '%s' of '%s' is a bitfield "
+                         "or an array of unknown length",
+                         PyText_AS_UTF8(fieldname), ctitem->ct_name);
+            return NULL;
+        }
+        ctkey = cf->cf_type;
+        nc.offset = cf->cf_offset;
+    }
+
+    if (ctkey->ct_flags & (CT_PRIMITIVE_SIGNED | CT_PRIMITIVE_UNSIGNED |
+                           CT_PRIMITIVE_CHAR)) {
+        int is_signed = (ctkey->ct_flags & CT_PRIMITIVE_SIGNED) != 0;
+        switch (ctkey->ct_size) {
+        case 1: nc.kind = is_signed ? NCMP_INT8  : NCMP_UINT8;  break;
+        case 2: nc.kind = is_signed ? NCMP_INT16 : NCMP_UINT16; break;
+        case 4: nc.kind = is_signed ? NCMP_INT32 : NCMP_UINT32; break;
+        case 8: nc.kind = is_signed ? NCMP_INT64 : NCMP_UINT64; break;
+        default: goto bad_key_type;
+        }
+    }
+    else if ((ctkey->ct_flags & CT_PRIMITIVE_FLOAT) &&
+             !(ctkey->ct_flags & CT_IS_LONGDOUBLE)) {
+        nc.kind = ctkey->ct_size == sizeof(float) ? NCMP_FLOAT : NCMP_DOUBLE;
+    }
+    else
+        goto bad_key_type;
+    nc.reverse = reverse != 0;
+
+    if (fieldname != Py_None)
+        descr = PyText_FromFormat("%s.%s%s", ctitem->ct_name,
+                                  PyText_AS_UTF8(fieldname),
+                                  reverse ? ", reversed" : "");
+    else
+        descr = PyText_FromFormat("%s%s", ctitem->ct_name,
+                                  reverse ? ", reversed" : "");
+    if (descr == NULL)
+        return NULL;
+    spec = PyBytes_FromStringAndSize((char *)&nc, sizeof(nc));
+    if (spec == NULL) {
+        Py_DECREF(descr);
+        return NULL;
+    }
+    infotuple = Py_BuildValue("OOO", ct, descr, spec);
+    Py_DECREF(descr);
+    Py_DECREF(spec);
+    if (infotuple == NULL)
+        return NULL;
+    return _new_closure(ct, infotuple, invoke_native_compare);
+
+ bad_function_type:
+    PyErr_Format(PyExc_TypeError, "a comparison function must have the "
+                 "type 'int(*)(T1 *, T2 *)', not '%s'", ct->ct_name);
+    return NULL;
+
+ bad_key_type:
+    PyErr_Format(PyExc_TypeError, "cannot compare values of type '%s'",
+                 ctkey->ct_name);
+    return NULL;
+}
+
 static PyObject *b_new_enum_type(PyObject *self, PyObject *args)
 {
     char *ename;
@@ -5658,18 +6515,200 @@ static PyObject *b_string(PyObject *self, PyObject *args, PyObject *kwds)
     return NULL;
 }
 
+static char _primitive_format_code(CTypeDescrObject *ct)
+{
+    /* Return the 'struct' format code for the primitive type 'ct', which
+       is also the 'array' typecode except for '?'; or 0 if there is none.
+       'char' and 'wchar_t' are not included. */
+    static const char signed_codes[] = "bhilq";
+    static const char unsigned_codes[] = "BHILQ";
+    static const Py_ssize_t sizes[] = {sizeof(signed char), sizeof(short),
+                                       sizeof(int), sizeof(long),
+                                       sizeof(PY_LONG_LONG)};
+    const char *codes;
+    int i;
+
+    if (ct->ct_flags & CT_IS_BOOL)
+        return '?';
+    if (ct->ct_flags & CT_PRIMITIVE_SIGNED)
+        codes = signed_codes;
+    else if (ct->ct_flags & CT_PRIMITIVE_UNSIGNED)
+        codes = unsigned_codes;
+    else if (ct->ct_flags & CT_PRIMITIVE_FLOAT) {
+        if (ct->ct_flags & CT_IS_LONGDOUBLE)
+            return 0;
+        return ct->ct_size == sizeof(float) ? 'f' : 'd';
+    }
+    else
+        return 0;
+    for (i = 0; i < 5; i++) {
+        if (sizes[i] == ct->ct_size)
+            return codes[i];
+    }
+    return 0;
+}
+
+static PyObject *_unpack_to_buffer(CDataObject *cd, Py_ssize_t length,
+                                   const char *kind)
+{
+    /* ffi.unpack() returning an 'array.array' or a 'memoryview' of a
+       copy of the data, done with a single memcpy() */
+    CTypeDescrObject *ctitem = cd->c_type->ct_itemdescr;
+    PyObject *mod, *x, *res;
+    Py_ssize_t size;
+    char format[2];
+    int as_array = strcmp(kind, "array") == 0;
+
+    if (!as_array && strcmp(kind, "memoryview") != 0) {
+        PyErr_Format(PyExc_ValueError,
+                     "'kind' must be 'list', 'array' or 'memoryview', "
+                     "not '%s'", kind);
+        return NULL;
+    }
+    format[0] = _primitive_format_code(ctitem);
+    format[1] = 0;
+    if (format[0] == 0 || (format[0] == '?' && as_array)) {
+        PyErr_Format(PyExc_TypeError,
+                     "cannot unpack items of type '%s' with kind='%s'",
+                     ctitem->ct_name, kind);
+        return NULL;
+    }
+    size = length * ctitem->ct_size;
+    if (length > 0 && size / length != ctitem->ct_size) {
+        PyErr_SetString(PyExc_OverflowError,
+                        "array size would overflow a Py_ssize_t");
+        return NULL;
+    }
+
+    if (as_array) {
+        mod = PyImport_ImportModule("array");
+        if (mod == NULL)
+            return NULL;
+        res = PyObject_CallMethod(mod, "array", "s", format);
+        Py_DECREF(mod);
+        if (res == NULL)
+            return NULL;
+        x = minibuffer_new(cd->c_data, size, (PyObject *)cd);
+        if (x == NULL)
+            goto error;
+#if PY_MAJOR_VERSION >= 3
+        mod = PyObject_CallMethod(res, "frombytes", "O", x);
+#else
+        mod = PyObject_CallMethod(res, "fromstring", "O", x);
+#endif
+        Py_DECREF(x);
+        if (mod == NULL)
+            goto error;
+        Py_DECREF(mod);
+        return res;
+    }
+    else {
+#if PY_MAJOR_VERSION >= 3
+        x = PyByteArray_FromStringAndSize(cd->c_data, size);
+        if (x == NULL)
+            return NULL;
+        mod = PyMemoryView_FromObject(x);
+        Py_DECREF(x);
+        if (mod == NULL)
+            return NULL;
+        res = PyObject_CallMethod(mod, "cast", "s", format);
+        Py_DECREF(mod);
+        return res;
+#else
+        PyErr_SetString(PyExc_NotImplementedError,
+                        "unpack(kind='memoryview') requires Python 3");
+        return NULL;
+#endif
+    }
+
+ error:
+    Py_DECREF(res);
+    return NULL;
+}
+
+static int _unpack_casenum(CTypeDescrObject *ctitem, char *src,
+                           Py_ssize_t stride)
+{
+    /* Determine if one of the common fast-paths of _unpack_item() can
+       be used to read the items of type 'ctitem' at 'src', 'src + stride',
+       'src + 2 * stride', etc.  The case -1 is the fall-back, which
+       always gives the right answer. */
+    Py_ssize_t itemsize = ctitem->ct_size;
+    int casenum = -1;
+
+#define ALIGNMENT_CHECK(align)                                          \
+        (((align) & ((align) - 1)) == 0 &&                              \
+         ((((uintptr_t)src) | (uintptr_t)stride) & ((align) - 1)) == 0)
+
+    if ((ctitem->ct_flags & CT_PRIMITIVE_ANY) &&
+            ALIGNMENT_CHECK(ctitem->ct_length)) {
+        /* Source data is fully aligned; we can directly read without
+           memcpy().  The unaligned case is expected to be rare; in
+           this situation it is ok to fall back to the general
+           convert_to_object() in the loop.  For now we also use this
+           fall-back for types that are too large.
+        */
+        if (ctitem->ct_flags & CT_PRIMITIVE_SIGNED) {
+            if (itemsize == sizeof(long))             casenum = 3;
+            else if (itemsize == sizeof(int))         casenum = 2;
+            else if (itemsize == sizeof(short))       casenum = 1;
+            else if (itemsize == sizeof(signed char)) casenum = 0;
+        }
+        else if (ctitem->ct_flags & CT_PRIMITIVE_UNSIGNED) {
+            /* Note: we never pick case 6 if sizeof(int) == sizeof(long),
+               so that case 6 below can assume that the 'unsigned int' result
+               would always fit in a 'signed long'. */
+            if      (itemsize == sizeof(unsigned long))  casenum = 7;
+            else if (itemsize == sizeof(unsigned int))   casenum = 6;
+            else if (itemsize == sizeof(unsigned short)) casenum = 5;
+            else if (itemsize == sizeof(unsigned char))  casenum = 4;
+        }
+        else if (ctitem->ct_flags & CT_PRIMITIVE_FLOAT) {
+            if      (itemsize == sizeof(double)) casenum = 9;
+            else if (itemsize == sizeof(float))  casenum = 8;
+        }
+    }
+    else if (ctitem->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) {
+        casenum = 10;    /* any pointer */
+    }
+#undef ALIGNMENT_CHECK
+    return casenum;
+}
+
+static PyObject *_unpack_item(int casenum, char *src,
+                              CTypeDescrObject *ctitem)
+{
+    switch (casenum) {
+        /* general case */
+    default: return convert_to_object(src, ctitem);
+
+        /* special cases for performance only */
+    case 0: return PyInt_FromLong(*(signed char *)src);
+    case 1: return PyInt_FromLong(*(short *)src);
+    case 2: return PyInt_FromLong(*(int *)src);
+    case 3: return PyInt_FromLong(*(long *)src);
+    case 4: return PyInt_FromLong(*(unsigned char *)src);
+    case 5: return PyInt_FromLong(*(unsigned short *)src);
+    case 6: return PyInt_FromLong((long)*(unsigned int *)src);
+    case 7: return PyLong_FromUnsignedLong(*(unsigned long *)src);
+    case 8: return PyFloat_FromDouble(*(float *)src);
+    case 9: return PyFloat_FromDouble(*(double *)src);
+    case 10: return new_simple_cdata(*(char **)src, ctitem);
+    }
+}
+
 static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
 {
     CDataObject *cd;
     CTypeDescrObject *ctitem;
     Py_ssize_t i, length, itemsize;
     PyObject *result;
-    char *src;
+    char *src, *kind = NULL;
     int casenum;
-    static char *keywords[] = {"cdata", "length", NULL};
+    static char *keywords[] = {"cdata", "length", "kind", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!n:unpack", keywords,
-                                     &CData_Type, &cd, &length))
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!n|z:unpack", keywords,
+                                     &CData_Type, &cd, &length, &kind))
         return NULL;
 
     if (!(cd->c_type->ct_flags & (CT_ARRAY|CT_POINTER))) {
@@ -5693,6 +6732,9 @@ static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
         return NULL;
     }
 
+    if (kind != NULL && strcmp(kind, "list") != 0)
+        return _unpack_to_buffer(cd, length, kind);
+
     /* byte- and unicode strings */
     ctitem = cd->c_type->ct_itemdescr;
     if (ctitem->ct_flags & CT_PRIMITIVE_CHAR) {
@@ -5704,127 +6746,575 @@ static PyObject *b_unpack(PyObject *self, PyObject *args, PyObject *kwds)
 #endif
     }
 
-    /* else, the result is a list.  This implementation should be
-       equivalent to but much faster than '[p[i] for i in range(length)]'.
-       (Note that on PyPy, 'list(p[0:length])' should be equally fast,
-       but arguably, finding out that there *is* such an unexpected way
-       to write things down is the real problem.)
-    */
-    result = PyList_New(length);
-    if (result == NULL)
+    /* else, the result is a list.  This implementation should be
+       equivalent to but much faster than '[p[i] for i in range(length)]'.
+       (Note that on PyPy, 'list(p[0:length])' should be equally fast,
+       but arguably, finding out that there *is* such an unexpected way
+       to write things down is the real problem.)
+    */
+    result = PyList_New(length);
+    if (result == NULL)
+        return NULL;
+
+    src = cd->c_data;
+    itemsize = ctitem->ct_size;
+    if (itemsize < 0) {
+        PyErr_Format(PyExc_ValueError, "'%s' points to items of unknown size",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+
+    casenum = _unpack_casenum(ctitem, src, itemsize);
+
+    for (i = 0; i < length; i++) {
+        PyObject *x = _unpack_item(casenum, src, ctitem);
+        if (x == NULL) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyList_SET_ITEM(result, i, x);
+        src += itemsize;
+    }
+    return result;
+}
+
+static PyObject *b_buffer(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CDataObject *cd;
+    Py_ssize_t size = -1;
+    static char *keywords[] = {"cdata", "size", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|n:buffer", keywords,
+                                     &CData_Type, &cd, &size))
+        return NULL;
+
+    if (cd->c_type->ct_flags & CT_POINTER) {
+        if (size < 0)
+            size = cd->c_type->ct_itemdescr->ct_size;
+    }
+    else if (cd->c_type->ct_flags & CT_ARRAY) {
+        if (size < 0)
+            size = get_array_length(cd) * cd->c_type->ct_itemdescr->ct_size;
+    }
+    else {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array cdata, got '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    if (size < 0) {
+        PyErr_Format(PyExc_TypeError,
+                     "don't know the size pointed to by '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    /*WRITE(cd->c_data, size)*/
+    return minibuffer_new(cd->c_data, size, (PyObject *)cd);
+}
+
+static PyObject *b_field_view(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ctitem;
+    CFieldObject *cf;
+    char *fieldname;
+    Py_ssize_t length = -1;
+    char format;
+    static char *keywords[] = {"cdata", "fieldname", "length", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!s|n:field_view", keywords,
+                                     &CData_Type, &cd, &fieldname, &length))
+        return NULL;
+
+    if (!(cd->c_type->ct_flags & (CT_POINTER | CT_ARRAY)) ||
+        !(cd->c_type->ct_itemdescr->ct_flags & (CT_STRUCT | CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a pointer or array of structs or unions, "
+                     "got '%s'", cd->c_type->ct_name);
+        return NULL;
+    }
+    ctitem = cd->c_type->ct_itemdescr;
+    if (length < 0) {
+        if (!(cd->c_type->ct_flags & CT_ARRAY)) {
+            PyErr_SetString(PyExc_TypeError,
+                            "'length' is required for a pointer cdata");
+            return NULL;
+        }
+        length = get_array_length(cd);
+    }
+    else if ((cd->c_type->ct_flags & CT_ARRAY) &&
+             length > get_array_length(cd)) {
+        PyErr_Format(PyExc_IndexError,
+                     "length too large for cdata '%s' (expected %zd <= %zd)",
+                     cd->c_type->ct_name, length, get_array_length(cd));
+        return NULL;
+    }
+    if (force_lazy_struct(ctitem) <= 0) {
+        if (!PyErr_Occurred())
+            PyErr_Format(PyExc_TypeError, "'%s' is opaque", ctitem->ct_name);
+        return NULL;
+    }
+    cf = (CFieldObject *)PyDict_GetItemString(ctitem->ct_stuff, fieldname);
+    if (cf == NULL) {
+        PyErr_SetString(PyExc_KeyError, fieldname);
+        return NULL;
+    }
+    if (cf->cf_bitshift != BS_REGULAR) {
+        PyErr_Format(PyExc_TypeError, "field '%s' of '%s' is a bitfield or "
+                     "an array of unknown length", fieldname,
+                     ctitem->ct_name);
+        return NULL;
+    }
+    if ((cf->cf_type->ct_flags & CT_PRIMITIVE_CHAR) &&
+            cf->cf_type->ct_size == sizeof(char))
+        format = 'c';
+    else
+        format = _primitive_format_code(cf->cf_type);
+    if (format == 0) {
+        PyErr_Format(PyExc_TypeError,
+                     "cannot make a view of field '%s' of type '%s'",
+                     fieldname, cf->cf_type->ct_name);
+        return NULL;
+    }
+    /*WRITE(cd->c_data, length * ctitem->ct_size)*/
+    return fieldview_new(cd->c_data + cf->cf_offset, length, ctitem->ct_size,
+                         cf->cf_type->ct_size, format, (PyObject *)cd);
+}
+
+/* The "field plan" of a struct or union: one entry per field, in the
+   order of declaration, computed once per call to unpack_struct(),
+   unpack_records() or pack_records(). */
+struct field_plan_s {
+    CFieldObject *cf;
+    PyObject *name;            /* borrowed from ct_stuff */
+    int casenum;               /* see _unpack_casenum() */
+};
+
+#define RECORD_TUPLE   ((PyObject *)&PyTuple_Type)
+#define RECORD_DICT    ((PyObject *)&PyDict_Type)
+
+static CTypeDescrObject *_record_type(CDataObject *cd, int array_ok,
+                                      const char *funcname)
+{
+    CTypeDescrObject *ct = cd->c_type;
+
+    if (ct->ct_flags & (CT_POINTER | (array_ok ? CT_ARRAY : 0)))
+        ct = ct->ct_itemdescr;
+    if (!(ct->ct_flags & (CT_STRUCT | CT_UNION))) {
+        PyErr_Format(PyExc_TypeError,
+                     array_ok ? "expected a pointer or array of structs or "
+                                "unions, got '%s'"
+                              : "expected a struct or union, or a pointer "
+                                "to one, got '%s'",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+    if (force_lazy_struct(ct) <= 0) {
+        if (!PyErr_Occurred())
+            PyErr_Format(PyExc_TypeError, "'%s' is opaque", ct->ct_name);
+        return NULL;
+    }
+    if (cd->c_data == NULL) {
+        PyObject *s = cdata_repr(cd);
+        if (s != NULL) {
+            PyErr_Format(PyExc_RuntimeError, "cannot use %s() on %s",
+                         funcname, PyText_AS_UTF8(s));
+            Py_DECREF(s);
+        }
+        return NULL;
+    }
+    return ct;
+}
+
+static Py_ssize_t _record_length(CDataObject *cd, Py_ssize_t length)
+{
+    if (length < 0) {
+        if (!(cd->c_type->ct_flags & CT_ARRAY)) {
+            PyErr_SetString(PyExc_TypeError,
+                            "'length' is required for a pointer cdata");
+            return -1;
+        }
+        length = get_array_length(cd);
+    }
+    else if ((cd->c_type->ct_flags & CT_ARRAY) &&
+             length > get_array_length(cd)) {
+        PyErr_Format(PyExc_IndexError,
+                     "length too large for cdata '%s' (expected %zd <= %zd)",
+                     cd->c_type->ct_name, length, get_array_length(cd));
+        return -1;
+    }
+    return length;
+}
+
+static PyObject *_record_kind(PyObject *kind)
+{
+    /* check the 'kind' argument: returns RECORD_TUPLE, RECORD_DICT or
+       a subclass of tuple, like a namedtuple class, as a borrowed
+       reference */
+    if (kind == NULL)
+        return RECORD_TUPLE;
+    if (PyText_Check(kind)) {
+        char *s = PyText_AsUTF8(kind);
+        if (s == NULL)
+            return NULL;
+        if (strcmp(s, "tuple") == 0)
+            return RECORD_TUPLE;
+        if (strcmp(s, "dict") == 0)
+            return RECORD_DICT;
+    }
+    else if (PyType_Check(kind) &&
+             PyType_IsSubtype((PyTypeObject *)kind, &PyTuple_Type)) {
+        return kind;
+    }
+    PyErr_SetString(PyExc_TypeError,
+                    "'kind' must be 'tuple', 'dict' or a subclass of tuple");
+    return NULL;
+}
+
+static struct field_plan_s *_make_field_plan(CTypeDescrObject *ct,
+                                             char *data, Py_ssize_t stride,
+                                             Py_ssize_t *pnum)
+{
+    struct field_plan_s *plan;
+    CFieldObject *cf;
+    PyObject *d_key, *d_value;
+    Py_ssize_t i, n = 0, pos = 0;
+
+    for (cf = (CFieldObject *)ct->ct_extra; cf != NULL; cf = cf->cf_next)
+        n++;
+    plan = PyMem_Malloc(n * sizeof(struct field_plan_s));
+    if (plan == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    cf = (CFieldObject *)ct->ct_extra;
+    for (i = 0; i < n; i++) {
+        plan[i].cf = cf;
+        /* the dict 'ct_stuff' normally contains the fields in the same
+           order; if not, fall back to the slower get_field_name() */
+        if (PyDict_Next(ct->ct_stuff, &pos, &d_key, &d_value) &&
+                d_value == (PyObject *)cf)
+            plan[i].name = d_key;
+        else
+            plan[i].name = get_field_name(ct, cf);
+        if (cf->cf_bitshift == BS_REGULAR)
+            plan[i].casenum = _unpack_casenum(cf->cf_type,
+                                              data + cf->cf_offset, stride);
+        else
+            plan[i].casenum = -1;
+        cf = cf->cf_next;
+    }
+    *pnum = n;
+    return plan;
+}
+
+static int _check_record_kind(PyObject *kind, CTypeDescrObject *ct,
+                              Py_ssize_t n)
+{
+    /* if 'kind' is a namedtuple class, check its number of fields */
+    PyObject *fields;
+    Py_ssize_t nfields;
+
+    if (kind == RECORD_TUPLE || kind == RECORD_DICT)
+        return 0;
+    fields = PyObject_GetAttrString(kind, "_fields");
+    if (fields == NULL) {
+        PyErr_Clear();
+        return 0;
+    }
+    nfields = PyObject_Size(fields);
+    Py_DECREF(fields);
+    if (nfields < 0)
+        return -1;
+    if (nfields != n) {
+        PyErr_Format(PyExc_ValueError,
+                     "'%s' has %zd fields, but '%s' has %zd",
+                     ((PyTypeObject *)kind)->tp_name, nfields,
+                     ct->ct_name, n);
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *_unpack_record(char *data, struct field_plan_s *plan,
+                                Py_ssize_t n, PyObject *kind)
+{
+    PyObject *result, *x;
+    Py_ssize_t i;
+
+    if (kind == RECORD_TUPLE)
+        result = PyTuple_New(n);
+    else if (kind == RECORD_DICT)
+        result = PyDict_New();
+    else   /* like 'kind._make()', without calling 'kind.__new__()' */
+        result = ((PyTypeObject *)kind)->tp_alloc((PyTypeObject *)kind, n);
+    if (result == NULL)
+        return NULL;
+
+    for (i = 0; i < n; i++) {
+        /* read the field 'cf', like cdata_getattro() */
+        CFieldObject *cf = plan[i].cf;
+        char *src = data + cf->cf_offset;
+        if (cf->cf_bitshift == BS_REGULAR)
+            x = _unpack_item(plan[i].casenum, src, cf->cf_type);
+        else if (cf->cf_bitshift == BS_EMPTY_ARRAY)
+            x = new_simple_cdata(src,
+                                 (CTypeDescrObject *)cf->cf_type->ct_stuff);
+        else
+            x = convert_to_object_bitfield(src, cf);
+        if (x == NULL)
+            goto error;
+        if (kind == RECORD_DICT) {
+            int err = PyDict_SetItem(result, plan[i].name, x);
+            Py_DECREF(x);
+            if (err < 0)
+                goto error;
+        }
+        else
+            PyTuple_SET_ITEM(result, i, x);
+    }
+    return result;
+
+ error:
+    Py_DECREF(result);
+    return NULL;
+}
+
+static PyObject *b_unpack_struct(PyObject *self, PyObject *args,
+                                 PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ct;
+    PyObject *kind = NULL, *result;
+    struct field_plan_s *plan;
+    Py_ssize_t n;
+    static char *keywords[] = {"cdata", "kind", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|O:unpack_struct",
+                                     keywords, &CData_Type, &cd, &kind))
+        return NULL;
+
+    ct = _record_type(cd, 0, "unpack_struct");
+    if (ct == NULL)
+        return NULL;
+    kind = _record_kind(kind);
+    if (kind == NULL)
+        return NULL;
+    plan = _make_field_plan(ct, cd->c_data, 0, &n);
+    if (plan == NULL)
+        return NULL;
+    if (_check_record_kind(kind, ct, n) < 0)
+        result = NULL;
+    else
+        result = _unpack_record(cd->c_data, plan, n, kind);
+    PyMem_Free(plan);
+    return result;
+}
+
+static PyObject *b_unpack_records(PyObject *self, PyObject *args,
+                                  PyObject *kwds)
+{
+    CDataObject *cd;
+    CTypeDescrObject *ct;
+    PyObject *kind = NULL, *result = NULL;
+    struct field_plan_s *plan;
+    Py_ssize_t i, n, length = -1;
+    char *data;
+    static char *keywords[] = {"cdata", "length", "kind", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|nO:unpack_records",
+                                     keywords, &CData_Type, &cd, &length,
+                                     &kind))
         return NULL;
 
-    src = cd->c_data;
-    itemsize = ctitem->ct_size;
-    if (itemsize < 0) {
-        PyErr_Format(PyExc_ValueError, "'%s' points to items of unknown size",
-                     cd->c_type->ct_name);
+    ct = _record_type(cd, 1, "unpack_records");
+    if (ct == NULL)
         return NULL;
-    }
+    length = _record_length(cd, length);
+    if (length < 0)
+        return NULL;
+    kind = _record_kind(kind);
+    if (kind == NULL)
+        return NULL;
+    data = cd->c_data;
+    plan = _make_field_plan(ct, data, ct->ct_size, &n);
+    if (plan == NULL)
+        return NULL;
+    if (_check_record_kind(kind, ct, n) < 0)
+        goto done;
 
-    /* Determine some common fast-paths for the loop below.  The case -1
-       is the fall-back, which always gives the right answer. */
+    result = PyList_New(length);
+    if (result == NULL)
+        goto done;
+    for (i = 0; i < length; i++) {
+        PyObject *x = _unpack_record(data, plan, n, kind);
+        if (x == NULL) {
+            Py_CLEAR(result);
+            goto done;
+        }
+        PyList_SET_ITEM(result, i, x);
+        data += ct->ct_size;
+    }
+ done:
+    PyMem_Free(plan);
+    return result;
+}
 
-#define ALIGNMENT_CHECK(align)                          \
-        (((align) & ((align) - 1)) == 0 &&              \
-         (((uintptr_t)src) & ((align) - 1)) == 0)
+static int _pack_record(char *data, CTypeDescrObject *ct,
+                        struct field_plan_s *plan, Py_ssize_t n,
+                        PyObject *record)
+{
+    /* equivalent to convert_struct_from_object(), with a field plan */
+    Py_ssize_t i;
 
-    casenum = -1;
+    if (PyTuple_Check(record) || PyList_Check(record)) {
+        PyObject **items = PySequence_Fast_ITEMS(record);
+        Py_ssize_t nitems = PySequence_Fast_GET_SIZE(record);
 
-    if ((ctitem->ct_flags & CT_PRIMITIVE_ANY) &&
-            ALIGNMENT_CHECK(ctitem->ct_length)) {
-        /* Source data is fully aligned; we can directly read without
-           memcpy().  The unaligned case is expected to be rare; in
-           this situation it is ok to fall back to the general
-           convert_to_object() in the loop.  For now we also use this
-           fall-back for types that are too large.
-        */
-        if (ctitem->ct_flags & CT_PRIMITIVE_SIGNED) {
-            if (itemsize == sizeof(long))             casenum = 3;
-            else if (itemsize == sizeof(int))         casenum = 2;
-            else if (itemsize == sizeof(short))       casenum = 1;
-            else if (itemsize == sizeof(signed char)) casenum = 0;
-        }
-        else if (ctitem->ct_flags & CT_PRIMITIVE_UNSIGNED) {
-            /* Note: we never pick case 6 if sizeof(int) == sizeof(long),
-               so that case 6 below can assume that the 'unsigned int' result
-               would always fit in a 'signed long'. */
-            if      (itemsize == sizeof(unsigned long))  casenum = 7;
-            else if (itemsize == sizeof(unsigned int))   casenum = 6;
-            else if (itemsize == sizeof(unsigned short)) casenum = 5;
-            else if (itemsize == sizeof(unsigned char))  casenum = 4;
-        }
-        else if (ctitem->ct_flags & CT_PRIMITIVE_FLOAT) {
-            if      (itemsize == sizeof(double)) casenum = 9;
-            else if (itemsize == sizeof(float))  casenum = 8;
+        if (nitems > n || ((ct->ct_flags & CT_UNION) && nitems > 1))
+            goto general_case;    /* for the error message */
+        for (i = 0; i < nitems; i++) {
+            if (convert_vfield_from_object(data, plan[i].cf, items[i],
+                                           NULL) < 0)
+                return -1;
         }
+        return 0;
     }
-    else if (ctitem->ct_flags & (CT_POINTER | CT_FUNCTIONPTR)) {
-        casenum = 10;    /* any pointer */
-    }
-#undef ALIGNMENT_CHECK
+    if (PyDict_CheckExact(record) && !(ct->ct_flags & CT_UNION)) {
+        Py_ssize_t found = 0, nitems = PyDict_Size(record);
 
-    for (i = 0; i < length; i++) {
-        PyObject *x;
-        switch (casenum) {
-            /* general case */
-        default: x = convert_to_object(src, ctitem); break;
-
-            /* special cases for performance only */
-        case 0: x = PyInt_FromLong(*(signed char *)src); break;
-        case 1: x = PyInt_FromLong(*(short *)src); break;
-        case 2: x = PyInt_FromLong(*(int *)src); break;
-        case 3: x = PyInt_FromLong(*(long *)src); break;
-        case 4: x = PyInt_FromLong(*(unsigned char *)src); break;
-        case 5: x = PyInt_FromLong(*(unsigned short *)src); break;
-        case 6: x = PyInt_FromLong((long)*(unsigned int *)src); break;
-        case 7: x = PyLong_FromUnsignedLong(*(unsigned long *)src); break;
-        case 8: x = PyFloat_FromDouble(*(float *)src); break;
-        case 9: x = PyFloat_FromDouble(*(double *)src); break;
-        case 10: x = new_simple_cdata(*(char **)src, ctitem); break;
-        }
-        if (x == NULL) {
-            Py_DECREF(result);
-            return NULL;
+        for (i = 0; i < n && found < nitems; i++) {
+            PyObject *value = PyDict_GetItem(record, plan[i].name);
+            if (value != NULL) {
+                if (convert_vfield_from_object(data, plan[i].cf, value,
+                                               NULL) < 0)
+                    return -1;
+                found++;
+            }
         }
-        PyList_SET_ITEM(result, i, x);
-        src += itemsize;
+        if (found == nitems)
+            return 0;
+        /* there are unknown keys: the general case raises KeyError */
     }
-    return result;
+ general_case:
+    return convert_from_object(data, ct, record);
 }
 
-static PyObject *b_buffer(PyObject *self, PyObject *args, PyObject *kwds)
+static PyObject *b_pack_records(PyObject *self, PyObject *args,
+                                PyObject *kwds)
 {
     CDataObject *cd;
-    Py_ssize_t size = -1;
-    static char *keywords[] = {"cdata", "size", NULL};
+    CTypeDescrObject *ct;
+    PyObject *records, *seq, *result = NULL;
+    struct field_plan_s *plan;
+    Py_ssize_t i, n, length;
+    char *data;
+    static char *keywords[] = {"cdata", "records", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!|n:buffer", keywords,
-                                     &CData_Type, &cd, &size))
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O!O:pack_records",
+                                     keywords, &CData_Type, &cd, &records))
         return NULL;
 
-    if (cd->c_type->ct_flags & CT_POINTER) {
-        if (size < 0)
-            size = cd->c_type->ct_itemdescr->ct_size;
+    ct = _record_type(cd, 1, "pack_records");
+    if (ct == NULL)
+        return NULL;
+    seq = PySequence_Fast(records, "'records' must be a sequence");
+    if (seq == NULL)
+        return NULL;
+    length = PySequence_Fast_GET_SIZE(seq);
+    if ((cd->c_type->ct_flags & CT_ARRAY) && length > get_array_length(cd)) {
+        PyErr_Format(PyExc_IndexError,
+                     "%zd records given, but '%s' has only %zd items",
+                     length, cd->c_type->ct_name, get_array_length(cd));
+        goto done;
     }
-    else if (cd->c_type->ct_flags & CT_ARRAY) {
-        if (size < 0)
-            size = get_array_length(cd) * cd->c_type->ct_itemdescr->ct_size;
+    data = cd->c_data;
+    plan = _make_field_plan(ct, data, ct->ct_size, &n);
+    if (plan == NULL)
+        goto done;
+
+    /*WRITE(cd->c_data, length * ct->ct_size)*/
+    for (i = 0; i < length; i++) {
+        if (_pack_record(data, ct, plan, n,
+                         PySequence_Fast_GET_ITEM(seq, i)) < 0)
+            break;
+        data += ct->ct_size;
     }
-    else {
-        PyErr_Format(PyExc_TypeError,
-                     "expected a pointer or array cdata, got '%s'",
-                     cd->c_type->ct_name);
+    PyMem_Free(plan);
+    if (i == length) {
+        Py_INCREF(Py_None);
+        result = Py_None;
+    }
+ done:
+    Py_DECREF(seq);
+    return result;
+}
+
+static PyObject *b_varargs_cache_info(PyObject *self, PyObject *noarg)
+{
+    return Py_BuildValue("{s:n,s:n,s:n,s:n}",
+                         "hits", varargs_cache_hits,
+                         "misses", varargs_cache_misses,
+                         "maxsize", varargs_cache_maxsize,
+                         "currsize", varargs_cache_len);
+}
+
+static PyObject *b_set_varargs_cache_size(PyObject *self, PyObject *arg)
+{
+    struct varargs_cif_s *old_cache = varargs_cache;
+    Py_ssize_t old_len = varargs_cache_len;
+    Py_ssize_t maxsize = PyNumber_AsSsize_t(arg, PyExc_OverflowError);
+    if (maxsize == -1 && PyErr_Occurred())
+        return NULL;
+    if (maxsize < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "the size of the cache cannot be negative");
         return NULL;
     }
-    if (size < 0) {
-        PyErr_Format(PyExc_TypeError,
-                     "don't know the size pointed to by '%s'",
-                     cd->c_type->ct_name);
+    /* empty the cache, and reset the statistics */
+    varargs_cache = NULL;
+    varargs_cache_len = 0;
+    varargs_cache_maxsize = maxsize;
+    varargs_cache_hits = 0;
+    varargs_cache_misses = 0;
+    if (old_cache != NULL) {
+        varargs_cache_release(old_cache, old_len);
+        PyMem_Free(old_cache);
+    }
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+static PyObject *b_cdata_freelist_info(PyObject *self, PyObject *noarg)
+{
+    Py_ssize_t currsize = 0;
+    int i;
+    for (i = 0; i < CDATA_FREELIST_CLASSES; i++)
+        currsize += cdata_freelist_len[i];
+    return Py_BuildValue("{s:n,s:n,s:n,s:n}",
+                         "hits", cdata_freelist_hits,
+                         "misses", cdata_freelist_misses,
+                         "maxsize", cdata_freelist_maxsize,
+                         "currsize", currsize);
+}
+
+static PyObject *b_set_cdata_freelist_size(PyObject *self, PyObject *arg)
+{
+    Py_ssize_t maxsize = PyNumber_AsSsize_t(arg, PyExc_OverflowError);
+    if (maxsize == -1 && PyErr_Occurred())
+        return NULL;
+    if (maxsize < 0) {
+        PyErr_SetString(PyExc_ValueError,
+                        "the size of the free lists cannot be negative");
         return NULL;
     }
-    /*WRITE(cd->c_data, size)*/
-    return minibuffer_new(cd->c_data, size, (PyObject *)cd);
+    /* empty the free lists, and reset the statistics */
+    cdata_freelist_clear();
+    cdata_freelist_maxsize = maxsize;
+    cdata_freelist_hits = 0;
+    cdata_freelist_misses = 0;
+    Py_INCREF(Py_None);
+    return Py_None;
 }
 
 static PyObject *b_get_errno(PyObject *self, PyObject *noarg)
@@ -6010,6 +7500,7 @@ static PyObject *direct_from_buffer(CTypeDescrObject *ct, PyObject *x)
 {
     CDataObject *cd;
     Py_buffer *view;
+    Py_ssize_t arraylength;
 
     if (invalid_input_buffer_type(x)) {
         PyErr_SetString(PyExc_TypeError,
@@ -6026,6 +7517,50 @@ static PyObject *direct_from_buffer(CTypeDescrObject *ct, PyObject *x)
     if (_my_PyObject_GetContiguousBuffer(x, view, 0) < 0)
         goto error1;
 
+    if (ct->ct_flags & CT_IS_UNSIZED_CHAR_A) {
+        arraylength = view->len;     /* the common case */
+    }
+    else {
+        CTypeDescrObject *ctitem = ct->ct_itemdescr;
+        int align = get_alignment(ctitem);
+        if (align < 0)
+            goto error2;
+        if (((Py_intptr_t)view->buf) % align != 0) {
+            PyErr_Format(PyExc_ValueError,
+                         "buffer is not aligned for '%s' (the address "
+                         "must be a multiple of %d)", ct->ct_name, align);
+            goto error2;
+        }
+        if (ct->ct_length >= 0) {
+            /* an array of fixed length: the buffer must be large enough */
+            arraylength = ct->ct_length;
+            if (view->len < ct->ct_size) {
+                PyErr_Format(PyExc_ValueError,
+                             "buffer is too small (%zd bytes) for '%s' "
+                             "(%zd bytes)", view->len, ct->ct_name,
+                             ct->ct_size);
+                goto error2;
+            }
+        }
+        else if (ctitem->ct_size > 0) {
+            /* an open array: as many items as fit in the buffer */
+            arraylength = view->len / ctitem->ct_size;
+            if (arraylength * ctitem->ct_size != view->len) {
+                PyErr_Format(PyExc_ValueError,
+                             "buffer size (%zd bytes) is not a multiple of "
+                             "the size of '%s' (%zd bytes)", view->len,
+                             ctitem->ct_name, ctitem->ct_size);
+                goto error2;
+            }
+        }
+        else {
+            PyErr_Format(PyExc_ValueError,
+                         "cannot compute the length of '%s' from a buffer",
+                         ct->ct_name);
+            goto error2;
+        }
+    }
+
     cd = (CDataObject *)PyObject_GC_New(CDataObject_owngc_frombuf,
                                         &CDataOwningGC_Type);
     if (cd == NULL)
@@ -6035,7 +7570,7 @@ static PyObject *direct_from_buffer(CTypeDescrObject *ct, PyObject *x)
     cd->c_type = ct;
     cd->c_data = view->buf;
     cd->c_weakreflist = NULL;
-    ((CDataObject_owngc_frombuf *)cd)->length = view->len;
+    ((CDataObject_owngc_frombuf *)cd)->length = arraylength;
     ((CDataObject_owngc_frombuf *)cd)->bufferview = view;
     PyObject_GC_Track(cd);
     return (PyObject *)cd;
@@ -6055,8 +7590,9 @@ static PyObject *b_from_buffer(PyObject *self, PyObject *args)
     if (!PyArg_ParseTuple(args, "O!O", &CTypeDescr_Type, &ct, &x))
         return NULL;
 
-    if (!(ct->ct_flags & CT_IS_UNSIZED_CHAR_A)) {
-        PyErr_Format(PyExc_TypeError, "needs 'char[]', got '%s'", ct->ct_name);
+    if (!(ct->ct_flags & CT_ARRAY)) {
+        PyErr_Format(PyExc_TypeError, "expected an array ctype, got '%s'",
+                     ct->ct_name);
         return NULL;
     }
     return direct_from_buffer(ct, x);
@@ -6112,6 +7648,217 @@ static PyObject *b_memmove(PyObject *self, PyObject *args, PyObject *kwds)
     return Py_None;
 }
 
+struct call_many_column_s {
+    char *data;
+    Py_ssize_t itemsize;
+    Py_buffer view;      /* only if 'view.obj' is not NULL */
+};
+
+static Py_ssize_t _call_many_column(struct call_many_column_s *col,
+                                    CTypeDescrObject *argtype, PyObject *x,
+                                    Py_ssize_t argnum)
+{
+    /* Fill 'col' from 'x', which must be either a cdata array of items
+       of type 'argtype', or a buffer of primitive items of the same
+       kind and size.  Returns the number of items, or -1. */
+    Py_ssize_t length;
+
+    col->itemsize = argtype->ct_size;
+    col->view.obj = NULL;
+
+    if (CData_Check(x)) {
+        CDataObject *cd = (CDataObject *)x;
+        if (!(cd->c_type->ct_flags & CT_ARRAY) ||
+                cd->c_type->ct_itemdescr != argtype) {
+            PyErr_Format(PyExc_TypeError,
+                         "argument %zd: expected an array of '%s', got "
+                         "cdata '%s'", argnum, argtype->ct_name,
+                         cd->c_type->ct_name);
+            return -1;
+        }
+        col->data = cd->c_data;
+        return get_array_length(cd);
+    }
+
+    if (!(argtype->ct_flags & (CT_PRIMITIVE_ANY | CT_POINTER)) ||
+            invalid_input_buffer_type(x)) {
+        PyErr_Format(PyExc_TypeError,
+                     "argument %zd: expected an array of '%s', got '%.200s'",
+                     argnum, argtype->ct_name, Py_TYPE(x)->tp_name);
+        return -1;
+    }
+    if (PyObject_GetBuffer(x, &col->view, PyBUF_FORMAT|PyBUF_C_CONTIGUOUS) < 0)
+        return -1;
+    if (col->view.itemsize != argtype->ct_size ||
+            !_buffer_format_matches(argtype, col->view.format)) {
+        PyErr_Format(PyExc_TypeError,
+                     "argument %zd: buffer of items of format '%s' and size "
+                     "%zd does not match '%s'", argnum,
+                     col->view.format ? col->view.format : "B",
+                     col->view.itemsize, argtype->ct_name);
+        PyBuffer_Release(&col->view);
+        col->view.obj = NULL;
+        return -1;
+    }
+    col->data = col->view.buf;
+    length = col->view.len / col->view.itemsize;
+    return length;
+}
+
+static PyObject *b_call_many(PyObject *self, PyObject *args)
+{
+    CDataObject *cd;
+    CTypeDescrObject *fresult, *ctarray;
+    cif_description_t *cif_descr;
+    struct call_many_column_s *columns;
+    cffi_stack_exchange_t stack_exchange;
+    char *buffer = NULL, *resultdata, *output;
+    void **buffer_array;
+    PyObject *signature, *res = NULL, *x;
+    Py_ssize_t i, j, ncols, nargs_declared, length = -1, rsize;
+
+    ncols = PyTuple_GET_SIZE(args) - 1;
+    if (ncols < 0) {
+        PyErr_SetString(PyExc_TypeError,
+                        "call_many() takes at least 1 argument (0 given)");
+        return NULL;
+    }
+    x = PyTuple_GET_ITEM(args, 0);
+    if (!CData_Check(x) ||
+            !(((CDataObject *)x)->c_type->ct_flags & CT_FUNCTIONPTR)) {
+        PyErr_Format(PyExc_TypeError,
+                     "expected a cdata function pointer, got '%.200s'",
+                     Py_TYPE(x)->tp_name);
+        return NULL;
+    }
+    cd = (CDataObject *)x;
+
+    cif_descr = (cif_description_t *)cd->c_type->ct_extra;
+    if (cif_descr == NULL) {
+        PyErr_Format(PyExc_NotImplementedError,
+                     "%s: call_many() with unsupported argument or "
+                     "return type or with '...'", cd->c_type->ct_name);
+        return NULL;
+    }
+    signature = cd->c_type->ct_stuff;
+    nargs_declared = PyTuple_GET_SIZE(signature) - 2;
+    fresult = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 1);
+    if (ncols != nargs_declared) {
+        PyErr_Format(PyExc_TypeError, "'%s' expects %zd arguments, got %zd",
+                     cd->c_type->ct_name, nargs_declared, ncols);
+        return NULL;
+    }
+    if (ncols == 0) {
+        PyErr_Format(PyExc_TypeError, "call_many() cannot be used with "
+                     "the function '%s' taking no arguments",
+                     cd->c_type->ct_name);
+        return NULL;
+    }
+
+    columns = alloca(ncols * sizeof(struct call_many_column_s));
+    for (j = 0; j < ncols; j++)
+        columns[j].view.obj = NULL;
+
+    for (j = 0; j < ncols; j++) {
+        CTypeDescrObject *argtype;
+        Py_ssize_t n;
+
+        argtype = (CTypeDescrObject *)PyTuple_GET_ITEM(signature, 2 + j);
+        n = _call_many_column(&columns[j], argtype,
+                              PyTuple_GET_ITEM(args, 1 + j), j + 1);
+        if (n < 0)
+            goto error;
+        if (length >= 0 && n != length) {
+            PyErr_Format(PyExc_ValueError,
+                         "argument %zd has length %zd, but the previous "
+                         "ones have length %zd", j + 1, n, length);
+            goto error;
+        }
+        length = n;
+    }
+
+    /* allocate the result array, 'RESULT[length]' */
+    if (fresult->ct_flags & CT_VOID) {
+        res = Py_None;
+        Py_INCREF(res);
+        output = NULL;
+        rsize = 0;
+    }
+    else {
+        x = new_pointer_type(fresult);
+        if (x == NULL)
+            goto error;
+        ctarray = (CTypeDescrObject *)new_array_type((CTypeDescrObject *)x,
+                                                     -1);
+        Py_DECREF(x);
+        if (ctarray == NULL)
+            goto error;
+        x = PyInt_FromSsize_t(length);
+        if (x == NULL) {
+            Py_DECREF(ctarray);
+            goto error;
+        }
+        res = direct_newp(ctarray, x, &default_allocator);
+        Py_DECREF(x);
+        Py_DECREF(ctarray);
+        if (res == NULL)
+            goto error;
+        output = ((CDataObject *)res)->c_data;
+        rsize = fresult->ct_size;
+    }
+
+    if (cif_descr->exchange_size <= CFFI_STACK_EXCHANGE_SIZE) {
+        buffer = stack_exchange.data;
+    }
+    else {
+        buffer = PyObject_Malloc(cif_descr->exchange_size);
+        if (buffer == NULL) {
+            PyErr_NoMemory();
+            goto error;
+        }
+    }
+    buffer_array = (void **)buffer;
+    resultdata = buffer + cif_descr->exchange_offset_arg[0];
+#ifdef WORDS_BIGENDIAN
+    /* see cdata_call() */
+    if ((fresult->ct_flags & (CT_PRIMITIVE_CHAR | CT_PRIMITIVE_SIGNED |
+                              CT_PRIMITIVE_UNSIGNED)) &&
+            fresult->ct_size < sizeof(ffi_arg))
+        resultdata += (sizeof(ffi_arg) - fresult->ct_size);
+#endif
+
+    /* the arguments are read directly from the columns, without any
+       conversion; the loop runs without the GIL */
+    Py_BEGIN_ALLOW_THREADS
+    restore_errno();
+    for (i = 0; i < length; i++) {
+        for (j = 0; j < ncols; j++)
+            buffer_array[j] = columns[j].data + i * columns[j].itemsize;
+        ffi_call(&cif_descr->cif, (void (*)(void))(cd->c_data),
+                 buffer + cif_descr->exchange_offset_arg[0], buffer_array);
+        if (output != NULL)
+            memcpy(output + i * rsize, resultdata, rsize);
+    }
+    save_errno();
+    Py_END_ALLOW_THREADS
+
+    if (buffer != stack_exchange.data)
+        PyObject_Free(buffer);
+    for (j = 0; j < ncols; j++) {
+        if (columns[j].view.obj != NULL)
+            PyBuffer_Release(&columns[j].view);
+    }
+    return res;
+
+ error:
+    Py_XDECREF(res);
+    for (j = 0; j < ncols; j++) {
+        if (columns[j].view.obj != NULL)
+            PyBuffer_Release(&columns[j].view);
+    }
+    return NULL;
+}
+
 static PyObject *b__get_types(PyObject *self, PyObject *noarg)
 {
     return PyTuple_Pack(2, (PyObject *)&CData_Type,
@@ -6321,6 +8068,15 @@ static int _testfunc23(char *p)
     return -42;
 }
 
+struct _testfunc24_s { int a[200]; };
+static int _testfunc24(struct _testfunc24_s inlined, int count)
+{
+    int i, total = 0;
+    for (i=0; i<count; i++)
+        total += inlined.a[i];
+    return total;
+}
+
 static PyObject *b__testfunc(PyObject *self, PyObject *args)
 {
     /* for testing only */
@@ -6353,6 +8109,7 @@ static PyObject *b__testfunc(PyObject *self, PyObject *args)
     case 21: f = &_testfunc21; break;
     case 22: f = &_testfunc22; break;
     case 23: f = &_testfunc23; break;
+    case 24: f = &_testfunc24; break;
     default:
         PyErr_SetNone(PyExc_ValueError);
         return NULL;
@@ -6439,6 +8196,7 @@ static PyMethodDef FFIBackendMethods[] = {
     {"newp", b_newp, METH_VARARGS},
     {"cast", b_cast, METH_VARARGS},
     {"callback", b_callback, METH_VARARGS},
+    {"compare_callback", b_compare_callback, METH_VARARGS},
     {"alignof", b_alignof, METH_O},
     {"sizeof", b_sizeof, METH_O},
     {"typeof", b_typeof, METH_O},
@@ -6448,12 +8206,24 @@ static PyMethodDef FFIBackendMethods[] = {
     {"string", (PyCFunction)b_string, METH_VARARGS | METH_KEYWORDS},
     {"unpack", (PyCFunction)b_unpack, METH_VARARGS | METH_KEYWORDS},
     {"buffer", (PyCFunction)b_buffer, METH_VARARGS | METH_KEYWORDS},
+    {"field_view", (PyCFunction)b_field_view, METH_VARARGS | METH_KEYWORDS},
+    {"unpack_struct", (PyCFunction)b_unpack_struct,
+                                       METH_VARARGS | METH_KEYWORDS},
+    {"unpack_records", (PyCFunction)b_unpack_records,
+                                       METH_VARARGS | METH_KEYWORDS},
+    {"pack_records", (PyCFunction)b_pack_records,
+                                       METH_VARARGS | METH_KEYWORDS},
     {"get_errno", b_get_errno, METH_NOARGS},
+    {"varargs_cache_info", b_varargs_cache_info, METH_NOARGS},
+    {"set_varargs_cache_size", b_set_varargs_cache_size, METH_O},
+    {"cdata_freelist_info", b_cdata_freelist_info, METH_NOARGS},
+    {"set_cdata_freelist_size", b_set_cdata_freelist_size, METH_O},
     {"set_errno", b_set_errno, METH_O},
     {"newp_handle", b_newp_handle, METH_VARARGS},
     {"from_handle", b_from_handle, METH_O},
     {"from_buffer", b_from_buffer, METH_VARARGS},
     {"memmove", (PyCFunction)b_memmove, METH_VARARGS | METH_KEYWORDS},
+    {"call_many", b_call_many, METH_VARARGS},
     {"gcp", (PyCFunction)b_gcp, METH_VARARGS | METH_KEYWORDS},
 #ifdef MS_WIN32
     {"getwinerror", (PyCFunction)b_getwinerror, METH_VARARGS | METH_KEYWORDS},
@@ -6706,6 +8476,8 @@ init_cffi_backend(void)
         INITERROR;
     if (PyType_Ready(&MiniBuffer_Type) < 0)
         INITERROR;
+    if (PyType_Ready(&FieldView_Type) < 0)
+        INITERROR;
 
     if (!init_done) {
         v = PyText_FromString("_cffi_backend");
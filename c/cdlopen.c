@@ -37,22 +37,48 @@ static int cdlopen_close(PyObject *libname, void *libhandle)
     return 0;
 }
 
-static PyObject *ffi_dlopen(PyObject *self, PyObject *args)
+static PyObject *_dlopen_preload(LibObject *lib, char *printable_filename)
+{
+    /* resolve all the symbols now, and report all the missing ones */
+    PyObject *report, *missing, *sep, *names;
+
+    report = _lib_preload(lib, 0);
+    if (report == NULL)
+        return NULL;
+    missing = PyDict_GetItemString(report, "missing");
+    if (missing == NULL || PyList_GET_SIZE(missing) == 0) {
+        Py_DECREF(report);
+        return (PyObject *)lib;
+    }
+    sep = PyText_FromString(", ");
+    names = sep ? PyObject_CallMethod(sep, "join", "O", missing) : NULL;
+    if (names != NULL)
+        PyErr_Format(PyExc_OSError,
+                     "cannot preload library '%s': symbols not found: %s",
+                     printable_filename, PyText_AS_UTF8(names));
+    Py_XDECREF(names);
+    Py_XDECREF(sep);
+    Py_DECREF(report);
+    return NULL;
+}
+
+static PyObject *ffi_dlopen(PyObject *self, PyObject *args, PyObject *kwds)
 {
     char *filename_or_null, *printable_filename;
     void *handle;
-    int flags = 0;
+    int flags = 0, preload = 0;
+    LibObject *lib;
+    PyObject *result, *name = Py_None;
+    static char *keywords[] = {"name", "flags", "preload", NULL};
 
-    if (PyTuple_GET_SIZE(args) == 0 || PyTuple_GET_ITEM(args, 0) == Py_None) {
-        PyObject *dummy;
-        if (!PyArg_ParseTuple(args, "|Oi:load_library",
-                              &dummy, &flags))
-            return NULL;
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|Oii:load_library",
+                                     keywords, &name, &flags, &preload))
+        return NULL;
+
+    if (name == Py_None)
         filename_or_null = NULL;
-    }
-    else if (!PyArg_ParseTuple(args, "et|i:load_library",
-                          Py_FileSystemDefaultEncoding, &filename_or_null,
-                          &flags))
+    else if (!PyArg_Parse(name, "et:load_library",
+                          Py_FileSystemDefaultEncoding, &filename_or_null))
         return NULL;
 
     if ((flags & (RTLD_NOW | RTLD_LAZY)) == 0)
@@ -66,8 +92,14 @@ static PyObject *ffi_dlopen(PyObject *self, PyObject *args)
                      printable_filename, error);
         return NULL;
     }
-    return (PyObject *)lib_internal_new((FFIObject *)self,
-                                        printable_filename, handle);
+    lib = lib_internal_new((FFIObject *)self, printable_filename, handle);
+    if (lib == NULL || !preload)
+        return (PyObject *)lib;
+
+    result = _dlopen_preload(lib, printable_filename);
+    if (result == NULL)
+        Py_DECREF(lib);
+    return result;
 }
 
 static PyObject *ffi_dlclose(PyObject *self, PyObject *args)
@@ -133,26 +165,271 @@ static int _cdl_realize_global_int(struct _cffi_getconst_s *gc)
     return ic->neg;
 }
 
+static char *cdl_take(char **pp, char *end, Py_ssize_t size)
+{
+    /* return the current position in the '_tables' string and skip
+       'size' bytes, or return NULL if the string is too short */
+    char *result = *pp;
+    if (size < 0 || end - result < size)
+        return NULL;
+    *pp = result + size;
+    return result;
+}
+
+static char *cdl_take_name(char **pp, char *end)
+{
+    /* return the current position in the '_tables' string and skip
+       past the next '\0', or return NULL if there is none */
+    char *result = *pp;
+    char *nul = memchr(result, 0, end - result);
+    if (nul == NULL)
+        return NULL;
+    *pp = nul + 1;
+    return result;
+}
+
+static char *cdl_take_count(char **pp, char *end, Py_ssize_t *count)
+{
+    /* read the number of entries at the start of a section.  Every
+       entry takes at least 4 bytes, which bounds the result. */
+    char *s = cdl_take(pp, end, 4);
+    if (s == NULL)
+        return NULL;
+    *count = cdl_4bytes(s);
+    if (*count < 0 || *count > (end - *pp) / 4)
+        return NULL;
+    return s;
+}
+
+static int cdl_unpack_tables(FFIObject *ffi, char *ffiname,
+                             char *p, Py_ssize_t length)
+{
+    /* unpack the '_tables' string written by set_source(...,
+       compact_tables=True).  It contains the same information as the
+       '_types', '_globals', '_struct_unions', '_enums' and '_typenames'
+       arguments, but as a single string in which the names are
+       '\0'-terminated.  Each array is stored into 'ctx' as soon as it
+       is allocated, so that free_builder_c() frees it in case of error.
+    */
+    struct _cffi_type_context_s *ctx = &ffi->types_builder.ctx;
+    char *end = p + length, *s, *p1;
+    Py_ssize_t i, j, n, nf, nf1;
+
+    /* the types */
+    if (cdl_take_count(&p, end, &n) == NULL)
+        goto corrupted;
+    s = cdl_take(&p, end, n * 4);
+    if (s == NULL)
+        goto corrupted;
+    {
+        _cffi_opcode_t *ntypes;
+
+        ntypes = PyMem_Malloc(n * sizeof(_cffi_opcode_t));
+        if (ntypes == NULL)
+            goto no_memory;
+        for (i = 0; i < n; i++) {
+            ntypes[i] = cdl_opcode(s);
+            s += 4;
+        }
+        ctx->types = ntypes;
+        ctx->num_types = n;
+    }
+
+    /* the globals */
+    if (cdl_take_count(&p, end, &n) == NULL)
+        goto corrupted;
+    {
+        struct _cffi_global_s *nglobs;
+        cdl_intconst_t *nintconsts;
+
+        i = n * (sizeof(struct _cffi_global_s) + sizeof(cdl_intconst_t));
+        nglobs = PyMem_Malloc(i);
+        if (nglobs == NULL)
+            goto no_memory;
+        memset(nglobs, 0, i);
+        ctx->globals = nglobs;
+        ctx->num_globals = n;
+        nintconsts = (cdl_intconst_t *)(nglobs + n);
+
+        for (i = 0; i < n; i++) {
+            if ((s = cdl_take(&p, end, 4)) == NULL)
+                goto corrupted;
+            nglobs[i].type_op = cdl_opcode(s);
+            if ((nglobs[i].name = cdl_take_name(&p, end)) == NULL)
+                goto corrupted;
+            if (_CFFI_GETOP(nglobs[i].type_op) == _CFFI_OP_CONSTANT_INT ||
+                _CFFI_GETOP(nglobs[i].type_op) == _CFFI_OP_ENUM) {
+                if ((s = cdl_take(&p, end, 9)) == NULL)
+                    goto corrupted;
+                nglobs[i].address = &_cdl_realize_global_int;
+                nintconsts[i].neg = s[0] != 0;
+                nintconsts[i].value =
+                    ((unsigned long long)(cdl_4bytes(s + 1) & 0xFFFFFFFF) << 32) |
+                    (unsigned long long)(cdl_4bytes(s + 5) & 0xFFFFFFFF);
+            }
+        }
+    }
+
+    /* the struct/unions and their fields.  The total number of fields
+       is not known in advance, so we first scan the section. */
+    if (cdl_take_count(&p, end, &n) == NULL)
+        goto corrupted;
+    p1 = p;
+    nf = 0;
+    for (i = 0; i < n; i++) {
+        if (cdl_take(&p1, end, 8) == NULL ||
+            cdl_take_name(&p1, end) == NULL ||
+            cdl_take_count(&p1, end, &nf1) == NULL)
+            goto corrupted;
+        for (j = 0; j < nf1; j++) {
+            if ((s = cdl_take(&p1, end, 4)) == NULL)
+                goto corrupted;
+            if (_CFFI_GETOP(cdl_opcode(s)) != _CFFI_OP_NOOP &&
+                    cdl_take(&p1, end, 4) == NULL)
+                goto corrupted;
+            if (cdl_take_name(&p1, end) == NULL)
+                goto corrupted;
+        }
+        nf += nf1;
+    }
+    {
+        struct _cffi_struct_union_s *nstructs;
+        struct _cffi_field_s *nfields;
+
+        i = (n * sizeof(struct _cffi_struct_union_s) +
+             nf * sizeof(struct _cffi_field_s));
+        nstructs = PyMem_Malloc(i);
+        if (nstructs == NULL)
+            goto no_memory;
+        memset(nstructs, 0, i);
+        nfields = (struct _cffi_field_s *)(nstructs + n);
+        ctx->struct_unions = nstructs;
+        ctx->fields = nfields;
+        ctx->num_struct_unions = n;
+        nf = 0;
+
+        /* second pass: the bounds were already checked above */
+        for (i = 0; i < n; i++) {
+            s = cdl_take(&p, end, 8);
+            nstructs[i].type_index = cdl_4bytes(s);
+            nstructs[i].flags = cdl_4bytes(s + 4);
+            nstructs[i].name = cdl_take_name(&p, end);
+            nf1 = cdl_4bytes(cdl_take(&p, end, 4));
+            if (nstructs[i].flags & (_CFFI_F_OPAQUE | _CFFI_F_EXTERNAL)) {
+                if (nf1 != 0)
+                    goto corrupted;
+                nstructs[i].size = (size_t)-1;
+                nstructs[i].alignment = -1;
+                nstructs[i].first_field_index = -1;
+                nstructs[i].num_fields = 0;
+            }
+            else {
+                nstructs[i].size = (size_t)-2;
+                nstructs[i].alignment = -2;
+                nstructs[i].first_field_index = nf;
+                nstructs[i].num_fields = nf1;
+            }
+            for (j = 0; j < nf1; j++) {
+                s = cdl_take(&p, end, 4);
+                nfields[nf].field_type_op = cdl_opcode(s);
+                nfields[nf].field_offset = (size_t)-1;
+                if (_CFFI_GETOP(nfields[nf].field_type_op) != _CFFI_OP_NOOP) {
+                    s = cdl_take(&p, end, 4);
+                    nfields[nf].field_size = cdl_4bytes(s);
+                }
+                else {
+                    nfields[nf].field_size = (size_t)-1;
+                }
+                nfields[nf].name = cdl_take_name(&p, end);
+                nf++;
+            }
+        }
+    }
+
+    /* the enums */
+    if (cdl_take_count(&p, end, &n) == NULL)
+        goto corrupted;
+    {
+        struct _cffi_enum_s *nenums;
+
+        i = n * sizeof(struct _cffi_enum_s);
+        nenums = PyMem_Malloc(i);
+        if (nenums == NULL)
+            goto no_memory;
+        memset(nenums, 0, i);
+        ctx->enums = nenums;
+        ctx->num_enums = n;
+
+        for (i = 0; i < n; i++) {
+            if ((s = cdl_take(&p, end, 8)) == NULL)
+                goto corrupted;
+            nenums[i].type_index = cdl_4bytes(s);
+            nenums[i].type_prim = cdl_4bytes(s + 4);
+            if ((nenums[i].name = cdl_take_name(&p, end)) == NULL ||
+                (nenums[i].enumerators = cdl_take_name(&p, end)) == NULL)
+                goto corrupted;
+        }
+    }
+
+    /* the typenames */
+    if (cdl_take_count(&p, end, &n) == NULL)
+        goto corrupted;
+    {
+        struct _cffi_typename_s *ntypenames;
+
+        i = n * sizeof(struct _cffi_typename_s);
+        ntypenames = PyMem_Malloc(i);
+        if (ntypenames == NULL)
+            goto no_memory;
+        memset(ntypenames, 0, i);
+        ctx->typenames = ntypenames;
+        ctx->num_typenames = n;
+
+        for (i = 0; i < n; i++) {
+            if ((s = cdl_take(&p, end, 4)) == NULL)
+                goto corrupted;
+            ntypenames[i].type_index = cdl_4bytes(s);
+            if ((ntypenames[i].name = cdl_take_name(&p, end)) == NULL)
+                goto corrupted;
+        }
+    }
+
+    if (p != end)
+        goto corrupted;
+    return 0;
+
+ corrupted:
+    PyErr_Format(PyExc_ImportError,
+                 "cffi out-of-line Python module '%s' has corrupted "
+                 "'_tables'", ffiname);
+    return -1;
+
+ no_memory:
+    PyErr_NoMemory();
+    return -1;
+}
+
 static int ffiobj_init(PyObject *self, PyObject *args, PyObject *kwds)
 {
     FFIObject *ffi;
     static char *keywords[] = {"module_name", "_version", "_types",
                                "_globals", "_struct_unions", "_enums",
-                               "_typenames", "_includes", NULL};
-    char *ffiname = "?", *types = NULL, *building = NULL;
+                               "_typenames", "_includes", "_tables", NULL};
+    char *ffiname = "?", *types = NULL, *building = NULL, *tables = NULL;
     Py_ssize_t version = -1;
-    Py_ssize_t types_len = 0;
+    Py_ssize_t types_len = 0, tables_len = 0;
     PyObject *globals = NULL, *struct_unions = NULL, *enums = NULL;
     PyObject *typenames = NULL, *includes = NULL;
 
     if (!PyArg_ParseTupleAndKeywords(args, kwds,
-                                     "|sns#O!O!O!O!O!:FFI", keywords,
+                                     "|sns#O!O!O!O!O!s#:FFI", keywords,
                                      &ffiname, &version, &types, &types_len,
                                      &PyTuple_Type, &globals,
                                      &PyTuple_Type, &struct_unions,
                                      &PyTuple_Type, &enums,
                                      &PyTuple_Type, &typenames,
-                                     &PyTuple_Type, &includes))
+                                     &PyTuple_Type, &includes,
+                                     &tables, &tables_len))
         return -1;
 
     ffi = (FFIObject *)self;
@@ -163,7 +440,7 @@ static int ffiobj_init(PyObject *self, PyObject *args, PyObject *kwds)
     }
     ffi->ctx_is_nonempty = 1;
 
-    if (version == -1 && types_len == 0)
+    if (version == -1 && types_len == 0 && tables == NULL)
         return 0;
     if (version < CFFI_VERSION_MIN || version > CFFI_VERSION_MAX) {
         PyErr_Format(PyExc_ImportError,
@@ -172,6 +449,19 @@ static int ffiobj_init(PyObject *self, PyObject *args, PyObject *kwds)
         return -1;
     }
 
+    if (tables != NULL) {
+        if (types != NULL || globals != NULL || struct_unions != NULL ||
+                enums != NULL || typenames != NULL) {
+            PyErr_SetString(PyExc_TypeError,
+                            "'_tables' cannot be combined with '_types', "
+                            "'_globals', '_struct_unions', '_enums' or "
+                            "'_typenames'");
+            return -1;
+        }
+        if (cdl_unpack_tables(ffi, ffiname, tables, tables_len) < 0)
+            return -1;
+    }
+
     if (types_len > 0) {
         /* unpack a string of 4-byte entries into an array of _cffi_opcode_t */
         _cffi_opcode_t *ntypes;
@@ -3,7 +3,7 @@
 #include "realize_c_type.c"
 
 #define CFFI_VERSION_MIN    0x2601
-#define CFFI_VERSION_MAX    0x27FF
+#define CFFI_VERSION_MAX    0x28FF
 
 typedef struct FFIObject_s FFIObject;
 typedef struct LibObject_s LibObject;
@@ -29,6 +29,8 @@ static int init_ffi_lib(PyObject *m)
         return -1;
     if (PyType_Ready(&Lib_Type) < 0)
         return -1;
+    if (PyType_Ready(&GlobSupport_Type) < 0)
+        return -1;
 
     if (!init_done) {
         if (init_global_types_dict(FFI_Type.tp_dict) < 0)
@@ -221,5 +223,16 @@ static PyObject *b_init_cffi_1_0_external_module(PyObject *self, PyObject *arg)
         return NULL;
 #endif
 
+    if (ctx->flags & 2) {   /* set_source(..., preload=True or 'thread') */
+        PyObject *x;
+        if (ctx->flags & 4)
+            x = _lib_preload_start_thread(lib);
+        else
+            x = _lib_preload(lib, 0);
+        if (x == NULL)
+            return NULL;
+        Py_DECREF(x);
+    }
+
     return m;
 }
@@ -18,6 +18,11 @@ static void glob_support_dealloc(GlobSupportObject *gs)
     PyObject_Del(gs);
 }
 
+static PyObject *glob_support_descr_get(PyObject *gs, PyObject *obj,
+                                        PyObject *type);   /* forward */
+static int glob_support_descr_set(PyObject *gs, PyObject *obj,
+                                  PyObject *value);        /* forward */
+
 static PyTypeObject GlobSupport_Type = {
     PyVarObject_HEAD_INIT(NULL, 0)
     "FFIGlobSupport",
@@ -39,6 +44,20 @@ static PyTypeObject GlobSupport_Type = {
     0,                                          /* tp_setattro */
     0,                                          /* tp_as_buffer */
     Py_TPFLAGS_DEFAULT,                         /* tp_flags */
+    0,                                          /* tp_doc */
+    0,                                          /* tp_traverse */
+    0,                                          /* tp_clear */
+    0,                                          /* tp_richcompare */
+    0,                                          /* tp_weaklistoffset */
+    0,                                          /* tp_iter */
+    0,                                          /* tp_iternext */
+    0,                                          /* tp_methods */
+    0,                                          /* tp_members */
+    0,                                          /* tp_getset */
+    0,                                          /* tp_base */
+    0,                                          /* tp_dict */
+    glob_support_descr_get,                     /* tp_descr_get */
+    glob_support_descr_set,                     /* tp_descr_set */
 };
 
 #define GlobSupport_Check(ob)  (Py_TYPE(ob) == &GlobSupport_Type)
@@ -96,6 +115,32 @@ static int write_global_var(GlobSupportObject *gs, PyObject *obj)
     return convert_from_object(data, gs->gs_type, obj);
 }
 
+/* A GlobSupport object is also a descriptor: when stored in a class,
+   reading or writing the attribute of an instance reads or writes the
+   global variable.  This is used by the library objects of the in-line
+   ABI mode, see load_variable_descr(). */
+
+static PyObject *glob_support_descr_get(PyObject *gs, PyObject *obj,
+                                        PyObject *type)
+{
+    if (obj == NULL) {
+        Py_INCREF(gs);
+        return gs;
+    }
+    return read_global_var((GlobSupportObject *)gs);
+}
+
+static int glob_support_descr_set(PyObject *gs, PyObject *obj,
+                                  PyObject *value)
+{
+    if (value == NULL) {
+        PyErr_SetString(PyExc_AttributeError,
+                        "C attribute cannot be deleted");
+        return -1;
+    }
+    return write_global_var((GlobSupportObject *)gs, value);
+}
+
 static PyObject *cg_addressof_global_var(GlobSupportObject *gs)
 {
     void *data;
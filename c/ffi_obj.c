@@ -472,7 +472,11 @@ PyDoc_STRVAR(ffi_unpack_doc,
 "\n"
 "If 'cdata' is a pointer to anything else, returns a list of\n"
 "'length' items.  This is a faster equivalent to:\n"
-"[cdata[i] for i in range(length)]");
+"[cdata[i] for i in range(length)]\n"
+"\n"
+"For integers, floats and doubles, 'kind' can be 'array' or\n"
+"'memoryview' to return instead an array.array or a memoryview of the\n"
+"proper format, containing a copy of the data made with one memcpy().");
 
 #define ffi_unpack  b_unpack     /* ffi_unpack() => b_unpack()
                                     from _cffi_backend.c */
@@ -491,6 +495,42 @@ PyDoc_STRVAR(ffi_buffer_doc,
 #define ffi_buffer  b_buffer     /* ffi_buffer() => b_buffer()
                                     from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_field_view_doc,
+"Return a memoryview over one field of every item of an array of\n"
+"structs, without copying: view[i] reads or writes cdata[i].fieldname.\n"
+"The field must be a primitive type (not a bitfield).  'length' is the\n"
+"number of structs, which is needed if 'cdata' is a pointer.");
+
+#define ffi_field_view  b_field_view  /* ffi_field_view() => b_field_view()
+                                         from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_unpack_struct_doc,
+"Return the values of all the fields of a struct or union, or of the\n"
+"struct or union that 'cdata' points to, as a tuple in the order of\n"
+"declaration.  Each value is what 'cdata.fieldname' would return.\n"
+"'kind' can be 'tuple', 'dict', or a subclass of tuple like a\n"
+"namedtuple class, which is filled without calling its __new__().");
+
+#define ffi_unpack_struct  b_unpack_struct  /* ffi_unpack_struct() =>
+                                      b_unpack_struct() from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_unpack_records_doc,
+"Return a list with the values of all the fields of every item of an\n"
+"array of structs or unions, like ffi.unpack_struct(cdata[i], kind)\n"
+"for each i, but in a single loop.  'length' is the number of items,\n"
+"which is needed if 'cdata' is a pointer.");
+
+#define ffi_unpack_records  b_unpack_records  /* ffi_unpack_records() =>
+                                     b_unpack_records() from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_pack_records_doc,
+"Write the sequence 'records' into the array of structs or unions\n"
+"'cdata': this is equivalent to 'cdata[i] = records[i]' for each i,\n"
+"but in a single loop.  Each record is typically a tuple or a dict.");
+
+#define ffi_pack_records  b_pack_records  /* ffi_pack_records() =>
+                                       b_pack_records() from _cffi_backend.c */
+
 PyDoc_STRVAR(ffi_offsetof_doc,
 "Return the offset of the named field inside the given structure or\n"
 "array, which must be given as a C type name.  You can give several\n"
@@ -705,16 +745,41 @@ PyDoc_STRVAR(ffi_from_handle_doc,
                                             from _cffi_backend.c */
 
 PyDoc_STRVAR(ffi_from_buffer_doc,
-"Return a <cdata 'char[]'> that points to the data of the given Python\n"
-"object, which must support the buffer interface.  Note that this is\n"
+"ffi.from_buffer([cdecl,] python_buffer)\n"
+"\n"
+"Return a cdata array that points to the data of the given Python\n"
+"object, which must support the buffer interface.  The array type is\n"
+"'cdecl', by default 'char[]'.  For an open array type like 'int[]',\n"
+"the length is computed from the size of the buffer; for a type like\n"
+"'int[5]', the buffer must be at least as large.  Note that this is\n"
 "not meant to be used on the built-in types str or unicode\n"
 "(you can build 'char[]' arrays explicitly) but only on objects\n"
 "containing large quantities of raw data in some other format, like\n"
 "'array.array' or numpy arrays.");
 
-static PyObject *ffi_from_buffer(PyObject *self, PyObject *arg)
+static PyObject *ffi_from_buffer(FFIObject *self, PyObject *args)
 {
-    return direct_from_buffer(g_ct_chararray, arg);
+    CTypeDescrObject *ct;
+    PyObject *arg, *python_buffer = NULL;
+
+    if (!PyArg_ParseTuple(args, "O|O:from_buffer", &arg, &python_buffer))
+        return NULL;
+
+    if (python_buffer == NULL) {
+        python_buffer = arg;
+        ct = g_ct_chararray;
+    }
+    else {
+        ct = _ffi_type(self, arg, ACCEPT_STRING|ACCEPT_CTYPE);
+        if (ct == NULL)
+            return NULL;
+        if (!(ct->ct_flags & CT_ARRAY)) {
+            PyErr_Format(PyExc_TypeError, "expected an array ctype, got '%s'",
+                         ct->ct_name);
+            return NULL;
+        }
+    }
+    return direct_from_buffer(ct, python_buffer);
 }
 
 PyDoc_STRVAR(ffi_gc_doc,
@@ -765,7 +830,12 @@ PyDoc_STRVAR(ffi_callback_doc,
 "'cdecl' must name a C function pointer type.  The callback invokes the\n"
 "specified 'python_callable' (which may be provided either directly or\n"
 "via a decorator).  Important: the callback object must be manually\n"
-"kept alive for as long as the callback may be invoked from the C code.");
+"kept alive for as long as the callback may be invoked from the C code.\n"
+"\n"
+"Alternatively, with 'compare=ctype', return a native comparison function\n"
+"of type 'int(*)(T1 *, T2 *)' like the ones expected by qsort().  It\n"
+"compares the two items of type 'ctype', or their 'field', without\n"
+"calling Python.  'reverse=True' sorts in descending order.");
 
 static PyObject *_ffi_callback_decorator(PyObject *outer_args, PyObject *fn)
 {
@@ -781,13 +851,14 @@ static PyObject *_ffi_callback_decorator(PyObject *outer_args, PyObject *fn)
 static PyObject *ffi_callback(FFIObject *self, PyObject *args, PyObject *kwds)
 {
     PyObject *c_decl, *python_callable = Py_None, *error = Py_None;
-    PyObject *res, *onerror = Py_None;
+    PyObject *res, *onerror = Py_None, *compare = Py_None, *field = Py_None;
+    int reverse = 0;
     static char *keywords[] = {"cdecl", "python_callable", "error",
-                               "onerror", NULL};
+                               "onerror", "compare", "field", "reverse", NULL};
 
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OOO", keywords,
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O|OOOOOi", keywords,
                                      &c_decl, &python_callable, &error,
-                                     &onerror))
+                                     &onerror, &compare, &field, &reverse))
         return NULL;
 
     c_decl = (PyObject *)_ffi_type(self, c_decl, ACCEPT_STRING | ACCEPT_CTYPE |
@@ -795,6 +866,30 @@ static PyObject *ffi_callback(FFIObject *self, PyObject *args, PyObject *kwds)
     if (c_decl == NULL)
         return NULL;
 
+    if (compare != Py_None) {
+        if (python_callable != Py_None || error != Py_None ||
+                onerror != Py_None) {
+            PyErr_SetString(PyExc_TypeError, "'compare' cannot be combined "
+                            "with 'python_callable', 'error' or 'onerror'");
+            return NULL;
+        }
+        compare = (PyObject *)_ffi_type(self, compare, ACCEPT_STRING |
+                                                       ACCEPT_CTYPE);
+        if (compare == NULL)
+            return NULL;
+        args = Py_BuildValue("(OOOi)", c_decl, compare, field, reverse);
+        if (args == NULL)
+            return NULL;
+        res = b_compare_callback(NULL, args);
+        Py_DECREF(args);
+        return res;
+    }
+    if (field != Py_None || reverse) {
+        PyErr_SetString(PyExc_TypeError,
+                        "'field' and 'reverse' require 'compare'");
+        return NULL;
+    }
+
     args = Py_BuildValue("(OOOO)", c_decl, python_callable, error, onerror);
     if (args == NULL)
         return NULL;
@@ -845,14 +940,18 @@ PyDoc_STRVAR(ffi_dlopen_doc,
 "Note that functions and types declared with 'ffi.cdef()' are not\n"
 "linked to a particular library, just like C headers.  In the library\n"
 "we only look for the actual (untyped) symbols at the time of their\n"
-"first access.");
+"first access.\n"
+"\n"
+"With 'preload=True', all the symbols are looked up immediately, and\n"
+"OSError is raised if any of them is missing; see lib.__preload__().");
 
 PyDoc_STRVAR(ffi_dlclose_doc,
 "Close a library obtained with ffi.dlopen().  After this call, access to\n"
 "functions or variables from the library will fail (possibly with a\n"
 "segmentation fault).");
 
-static PyObject *ffi_dlopen(PyObject *self, PyObject *args);  /* forward */
+static PyObject *ffi_dlopen(PyObject *self, PyObject *args,
+                            PyObject *kwds);                   /* forward */
 static PyObject *ffi_dlclose(PyObject *self, PyObject *args);  /* forward */
 
 PyDoc_STRVAR(ffi_int_const_doc,
@@ -951,6 +1050,85 @@ PyDoc_STRVAR(ffi_memmove_doc,
 #define ffi_memmove  b_memmove     /* ffi_memmove() => b_memmove()
                                       from _cffi_backend.c */
 
+PyDoc_STRVAR(ffi_call_many_doc,
+"ffi.call_many(fn, *columns) calls the C function 'fn' once for every\n"
+"row of arguments, and returns a new array with all the results (or\n"
+"None if 'fn' returns void).\n"
+"\n"
+"There must be one column per argument of 'fn'; each column is a cdata\n"
+"array of items of exactly the argument type, or a Python buffer object\n"
+"(like an array.array) whose items have the same kind and size as the\n"
+"argument type, which must then be a primitive type.  All columns must\n"
+"have the same length.  The arguments are not converted to Python\n"
+"objects, and the GIL is released only once around the whole loop.\n"
+"\n"
+"'fn' can be a cdata function pointer or a function from 'lib'.");
+
+PyDoc_STRVAR(ffi_varargs_cache_info_doc,
+"Return a dict with statistics about the cache of the libffi\n"
+"descriptions built for calls to variadic functions: 'hits', 'misses',\n"
+"'maxsize' and 'currsize'.  The cache is shared by all FFI instances.");
+
+#define ffi_varargs_cache_info  b_varargs_cache_info  /* ffi_varargs_cache_info()
+                                        => b_varargs_cache_info()
+                                        from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_set_varargs_cache_size_doc,
+"Empty the cache of the libffi descriptions built for calls to variadic\n"
+"functions, and set its maximum size (0 disables it).  This also resets\n"
+"the statistics returned by ffi.varargs_cache_info().");
+
+#define ffi_set_varargs_cache_size  b_set_varargs_cache_size
+                                      /* ffi_set_varargs_cache_size()
+                                         => b_set_varargs_cache_size()
+                                         from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_cdata_freelist_info_doc,
+"Return a dict with statistics about the free lists used to allocate\n"
+"small cdata objects, like the results of ffi.new(\"int *\") and\n"
+"ffi.cast(\"int\", x): 'hits', 'misses', 'maxsize' (per size of object)\n"
+"and 'currsize' (the total number of objects kept).");
+
+#define ffi_cdata_freelist_info  b_cdata_freelist_info
+                                      /* ffi_cdata_freelist_info()
+                                         => b_cdata_freelist_info()
+                                         from _cffi_backend.c */
+
+PyDoc_STRVAR(ffi_set_cdata_freelist_size_doc,
+"Release the memory kept in the free lists used to allocate small cdata\n"
+"objects, and set how many objects each of them can keep (0 disables\n"
+"them).  This also resets the statistics returned by\n"
+"ffi.cdata_freelist_info().");
+
+#define ffi_set_cdata_freelist_size  b_set_cdata_freelist_size
+                                      /* ffi_set_cdata_freelist_size()
+                                         => b_set_cdata_freelist_size()
+                                         from _cffi_backend.c */
+
+static PyObject *_cpyextfunc_as_cdata(PyObject *x);  /* forward */
+
+static PyObject *ffi_call_many(FFIObject *self, PyObject *args)
+{
+    PyObject *fn, *res;
+
+    if (PyTuple_GET_SIZE(args) == 0)
+        return b_call_many(NULL, args);
+
+    fn = _cpyextfunc_as_cdata(PyTuple_GET_ITEM(args, 0));
+    if (fn == NULL)
+        return NULL;
+    args = PyTuple_GetSlice(args, 0, PyTuple_GET_SIZE(args));
+    if (args == NULL) {
+        Py_DECREF(fn);
+        return NULL;
+    }
+    Py_DECREF(PyTuple_GET_ITEM(args, 0));
+    PyTuple_SET_ITEM(args, 0, fn);
+    res = b_call_many(NULL, args);
+    Py_DECREF(args);
+    return res;
+}
+
 #ifdef WITH_THREAD
 # include "pythread.h"
 #else
@@ -1090,10 +1268,14 @@ static PyMethodDef ffi_methods[] = {
  {"buffer",     (PyCFunction)ffi_buffer,     METH_VKW,     ffi_buffer_doc},
  {"def_extern", (PyCFunction)ffi_def_extern, METH_VKW,     ffi_def_extern_doc},
  {"callback",   (PyCFunction)ffi_callback,   METH_VKW,     ffi_callback_doc},
+ {"call_many",  (PyCFunction)ffi_call_many,  METH_VARARGS, ffi_call_many_doc},
  {"cast",       (PyCFunction)ffi_cast,       METH_VARARGS, ffi_cast_doc},
+ {"cdata_freelist_info",(PyCFunction)ffi_cdata_freelist_info,
+                                       METH_NOARGS, ffi_cdata_freelist_info_doc},
  {"dlclose",    (PyCFunction)ffi_dlclose,    METH_VARARGS, ffi_dlclose_doc},
- {"dlopen",     (PyCFunction)ffi_dlopen,     METH_VARARGS, ffi_dlopen_doc},
- {"from_buffer",(PyCFunction)ffi_from_buffer,METH_O,       ffi_from_buffer_doc},
+ {"dlopen",     (PyCFunction)ffi_dlopen,     METH_VKW,     ffi_dlopen_doc},
+ {"field_view", (PyCFunction)ffi_field_view, METH_VKW,     ffi_field_view_doc},
+ {"from_buffer",(PyCFunction)ffi_from_buffer,METH_VARARGS, ffi_from_buffer_doc},
  {"from_handle",(PyCFunction)ffi_from_handle,METH_O,       ffi_from_handle_doc},
  {"gc",         (PyCFunction)ffi_gc,         METH_VKW,     ffi_gc_doc},
  {"getctype",   (PyCFunction)ffi_getctype,   METH_VKW,     ffi_getctype_doc},
@@ -1108,10 +1290,21 @@ static PyMethodDef ffi_methods[] = {
 {"new_allocator",(PyCFunction)ffi_new_allocator,METH_VKW,ffi_new_allocator_doc},
  {"new_handle", (PyCFunction)ffi_new_handle, METH_O,       ffi_new_handle_doc},
  {"offsetof",   (PyCFunction)ffi_offsetof,   METH_VARARGS, ffi_offsetof_doc},
+ {"pack_records",(PyCFunction)ffi_pack_records,METH_VKW,   ffi_pack_records_doc},
+ {"set_cdata_freelist_size",(PyCFunction)ffi_set_cdata_freelist_size,
+                                         METH_O, ffi_set_cdata_freelist_size_doc},
+ {"set_varargs_cache_size",(PyCFunction)ffi_set_varargs_cache_size,
+                                             METH_O, ffi_set_varargs_cache_size_doc},
  {"sizeof",     (PyCFunction)ffi_sizeof,     METH_O,       ffi_sizeof_doc},
  {"string",     (PyCFunction)ffi_string,     METH_VKW,     ffi_string_doc},
  {"typeof",     (PyCFunction)ffi_typeof,     METH_O,       ffi_typeof_doc},
  {"unpack",     (PyCFunction)ffi_unpack,     METH_VKW,     ffi_unpack_doc},
+ {"unpack_records",(PyCFunction)ffi_unpack_records,
+                                          METH_VKW, ffi_unpack_records_doc},
+ {"unpack_struct",(PyCFunction)ffi_unpack_struct,
+                                          METH_VKW, ffi_unpack_struct_doc},
+ {"varargs_cache_info",(PyCFunction)ffi_varargs_cache_info,
+                                        METH_NOARGS, ffi_varargs_cache_info_doc},
  {NULL}
 };
 
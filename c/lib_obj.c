@@ -280,6 +280,12 @@ static PyObject *lib_build_and_cache_attr(LibObject *lib, PyObject *name,
         x = lib_build_cpython_func(lib, g, s, METH_O);
         break;
 
+#if PY_VERSION_HEX >= 0x03070000 && defined(METH_FASTCALL)
+    case _CFFI_OP_CPYTHON_BLTN_F:
+        x = lib_build_cpython_func(lib, g, s, METH_FASTCALL);
+        break;
+#endif
+
     case _CFFI_OP_CONSTANT_INT:
     case _CFFI_OP_ENUM:
     {
@@ -490,6 +496,272 @@ static PyObject *_lib_dict(LibObject *lib)
     return NULL;
 }
 
+/* lib.__preload__(): build now all the attributes that are normally
+   built lazily by lib_getattr(), and realize all the named types.
+   Errors are ignored, so that the same error is raised again if and
+   when the attribute is really accessed.  Returns a dict mapping each
+   category to (count, seconds), and "missing" to the list of the names
+   that could not be built. */
+
+#define LIB_PRELOAD_FUNCTIONS   0
+#define LIB_PRELOAD_CONSTANTS   1
+#define LIB_PRELOAD_VARIABLES   2
+#define LIB_PRELOAD_TYPES       3
+#define LIB_PRELOAD_YIELD       32   /* release the GIL every 32 items */
+
+static const char *const lib_preload_categories[] = {
+    "functions", "constants", "variables", "types",
+};
+
+static double lib_preload_clock(void)
+{
+#ifdef MS_WIN32
+    LARGE_INTEGER freq, count;
+    QueryPerformanceFrequency(&freq);
+    QueryPerformanceCounter(&count);
+    return (double)count.QuadPart / (double)freq.QuadPart;
+#else
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec * 1e-9;
+#endif
+}
+
+static int _lib_preload_category(int op)
+{
+    switch (op) {
+    case _CFFI_OP_CPYTHON_BLTN_V:
+    case _CFFI_OP_CPYTHON_BLTN_N:
+    case _CFFI_OP_CPYTHON_BLTN_O:
+    case _CFFI_OP_CPYTHON_BLTN_F:
+    case _CFFI_OP_DLOPEN_FUNC:
+    case _CFFI_OP_EXTERN_PYTHON:
+        return LIB_PRELOAD_FUNCTIONS;
+    case _CFFI_OP_GLOBAL_VAR:
+    case _CFFI_OP_GLOBAL_VAR_F:
+        return LIB_PRELOAD_VARIABLES;
+    default:
+        return LIB_PRELOAD_CONSTANTS;
+    }
+}
+
+static void _lib_preload_yield(int *counter, int yield_gil)
+{
+    if (yield_gil && ++*counter % LIB_PRELOAD_YIELD == 0) {
+        Py_BEGIN_ALLOW_THREADS
+        Py_END_ALLOW_THREADS
+    }
+}
+
+static int _lib_preload_type(builder_c_t *builder, int type_index)
+{
+    PyObject *x = realize_c_type_or_func(builder, builder->ctx.types,
+                                         type_index);
+    if (x == NULL)
+        return -1;
+    if (CTypeDescr_Check(x)) {
+        CTypeDescrObject *ct = (CTypeDescrObject *)x;
+        if ((ct->ct_flags & (CT_STRUCT | CT_UNION)) &&
+                !(ct->ct_flags & CT_IS_OPAQUE) &&
+                force_lazy_struct(ct) < 0) {
+            Py_DECREF(x);
+            return -1;
+        }
+    }
+    Py_DECREF(x);
+    return 0;
+}
+
+static int _lib_preload_missing(LibObject *lib,
+                                const struct _cffi_global_s *g)
+{
+    /* called with an exception set after the attribute 'g' could not
+       be built.  Returns 1 if it means that the symbol is not found,
+       and the exception was cleared; or 0 if the exception must be
+       propagated.  Note that a closed library raises FFIError too. */
+    int op = _CFFI_GETOP(g->type_op);
+    if (!PyErr_ExceptionMatches(FFIError) &&
+            !PyErr_ExceptionMatches(PyExc_AttributeError))
+        return 0;
+    if (lib->l_libhandle == NULL &&
+            (op == _CFFI_OP_DLOPEN_FUNC || op == _CFFI_OP_DLOPEN_CONST ||
+             (op == _CFFI_OP_GLOBAL_VAR && g->address == NULL)))
+        return 0;
+    PyErr_Clear();
+    return 1;
+}
+
+static int _lib_preload_type_failed(void)
+{
+    /* the types are preloaded on a best-effort basis, but MemoryError
+       and the exceptions that are not Exceptions (KeyboardInterrupt,
+       SystemExit) must be propagated */
+    if (!PyErr_ExceptionMatches(PyExc_Exception) ||
+            PyErr_ExceptionMatches(PyExc_MemoryError))
+        return -1;
+    PyErr_Clear();
+    return 0;
+}
+
+static PyObject *_lib_preload(LibObject *lib, int yield_gil)
+{
+    builder_c_t *builder = lib->l_types_builder;
+    const struct _cffi_global_s *g = builder->ctx.globals;
+    Py_ssize_t counts[4] = {0, 0, 0, 0};
+    double times[4] = {0.0, 0.0, 0.0, 0.0};
+    PyObject *name, *x, *result, *missing;
+    int category, i, yield_counter = 0;
+    double t0;
+
+    missing = PyList_New(0);
+    if (missing == NULL)
+        return NULL;
+
+    for (category = LIB_PRELOAD_FUNCTIONS; category < LIB_PRELOAD_TYPES;
+         category++) {
+        t0 = lib_preload_clock();
+        for (i = 0; i < builder->ctx.num_globals; i++) {
+            if (_lib_preload_category(_CFFI_GETOP(g[i].type_op)) != category)
+                continue;
+            name = PyText_InternFromString(g[i].name);
+            if (name == NULL)
+                goto error;
+            LIB_GET_OR_CACHE_ADDR(x, lib, name, (void)0);
+            if (x != NULL)
+                counts[category]++;
+            else if (!_lib_preload_missing(lib, &g[i]) ||
+                     PyList_Append(missing, name) < 0) {
+                Py_DECREF(name);
+                goto error;
+            }
+            Py_DECREF(name);
+            _lib_preload_yield(&yield_counter, yield_gil);
+        }
+        times[category] = lib_preload_clock() - t0;
+    }
+
+    t0 = lib_preload_clock();
+    for (i = 0; i < builder->ctx.num_typenames; i++) {
+        if (_lib_preload_type(builder, builder->ctx.typenames[i].type_index)) {
+            if (_lib_preload_type_failed() < 0)
+                goto error;
+        }
+        else
+            counts[LIB_PRELOAD_TYPES]++;
+        _lib_preload_yield(&yield_counter, yield_gil);
+    }
+    for (i = 0; i < builder->ctx.num_struct_unions; i++) {
+        if (_lib_preload_type(builder,
+                              builder->ctx.struct_unions[i].type_index)) {
+            if (_lib_preload_type_failed() < 0)
+                goto error;
+        }
+        else
+            counts[LIB_PRELOAD_TYPES]++;
+        _lib_preload_yield(&yield_counter, yield_gil);
+    }
+    for (i = 0; i < builder->ctx.num_enums; i++) {
+        if (_lib_preload_type(builder, builder->ctx.enums[i].type_index)) {
+            if (_lib_preload_type_failed() < 0)
+                goto error;
+        }
+        else
+            counts[LIB_PRELOAD_TYPES]++;
+        _lib_preload_yield(&yield_counter, yield_gil);
+    }
+    times[LIB_PRELOAD_TYPES] = lib_preload_clock() - t0;
+
+    result = PyDict_New();
+    if (result == NULL)
+        goto error;
+    for (category = 0; category < 4; category++) {
+        x = Py_BuildValue("nd", counts[category], times[category]);
+        if (x == NULL ||
+                PyDict_SetItemString(result, lib_preload_categories[category],
+                                     x) < 0) {
+            Py_XDECREF(x);
+            Py_DECREF(result);
+            goto error;
+        }
+        Py_DECREF(x);
+    }
+    if (PyDict_SetItemString(result, "missing", missing) < 0) {
+        Py_DECREF(result);
+        goto error;
+    }
+    Py_DECREF(missing);
+    return result;
+
+ error:
+    Py_DECREF(missing);
+    return NULL;
+}
+
+static PyObject *lib_preload_in_thread(PyObject *self, PyObject *noarg)
+{
+    return _lib_preload((LibObject *)self, 1);
+}
+
+static PyMethodDef lib_preload_in_thread_def = {
+    "__preload__", lib_preload_in_thread, METH_NOARGS
+};
+
+static PyObject *_lib_preload_start_thread(LibObject *lib)
+{
+    /* threading.Thread(target=..., daemon=True).start() */
+    PyObject *threading, *thread_cls, *target, *args, *kwds, *res;
+    PyObject *thread = NULL;
+
+    threading = PyImport_ImportModule("threading");
+    if (threading == NULL)
+        return NULL;
+    thread_cls = PyObject_GetAttrString(threading, "Thread");
+    Py_DECREF(threading);
+    if (thread_cls == NULL)
+        return NULL;
+    target = PyCFunction_New(&lib_preload_in_thread_def, (PyObject *)lib);
+    args = PyTuple_New(0);
+    kwds = (target == NULL) ? NULL : Py_BuildValue("{sO}", "target", target);
+    if (args != NULL && kwds != NULL)
+        thread = PyObject_Call(thread_cls, args, kwds);
+    Py_XDECREF(kwds);
+    Py_XDECREF(args);
+    Py_XDECREF(target);
+    Py_DECREF(thread_cls);
+    if (thread == NULL)
+        return NULL;
+
+    if (PyObject_SetAttrString(thread, "daemon", Py_True) < 0)
+        goto error;
+    res = PyObject_CallMethod(thread, "start", NULL);
+    if (res == NULL)
+        goto error;
+    Py_DECREF(res);
+    return thread;
+
+ error:
+    Py_DECREF(thread);
+    return NULL;
+}
+
+static PyObject *lib_preload(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    int background = 0;
+    static char *keywords[] = {"background", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "|i:__preload__", keywords,
+                                     &background))
+        return NULL;
+
+    if (background)
+        return _lib_preload_start_thread((LibObject *)self);
+    else
+        return _lib_preload((LibObject *)self, 0);
+}
+
+static PyMethodDef lib_preload_def = {
+    "__preload__", (PyCFunction)lib_preload, METH_VARARGS | METH_KEYWORDS
+};
+
 static PyObject *lib_getattr(LibObject *lib, PyObject *name)
 {
     char *p;
@@ -514,6 +786,10 @@ static PyObject *lib_getattr(LibObject *lib, PyObject *name)
         PyErr_Clear();
         return _lib_dict(lib);
     }
+    if (strcmp(p, "__preload__") == 0) {
+        PyErr_Clear();
+        return PyCFunction_New(&lib_preload_def, (PyObject *)lib);
+    }
     if (strcmp(p, "__class__") == 0) {
         PyErr_Clear();
         x = (PyObject *)&PyModule_Type;
@@ -635,6 +911,26 @@ static LibObject *lib_internal_new(FFIObject *ffi, char *module_name,
     return NULL;
 }
 
+static PyObject *_cpyextfunc_as_cdata(PyObject *x)
+{
+    /* if 'x' is a built-in function from a Lib object, return a new
+       cdata function pointer to the direct C function; if not,
+       return 'x' itself (with a new reference) */
+    struct CPyExtFunc_s *exf = _cpyextfunc_get(x);
+    PyObject *ct;
+
+    if (exf == NULL || exf->direct_fn == NULL) {
+        Py_INCREF(x);
+        return x;
+    }
+    ct = _cpyextfunc_type((LibObject *)PyCFunction_GET_SELF(x), exf);
+    if (ct == NULL)
+        return NULL;
+    x = new_simple_cdata(exf->direct_fn, (CTypeDescrObject *)ct);
+    Py_DECREF(ct);
+    return x;
+}
+
 static PyObject *address_of_global_var(PyObject *args)
 {
     LibObject *lib;
@@ -656,19 +952,11 @@ static PyObject *address_of_global_var(PyObject *args)
         return cg_addressof_global_var((GlobSupportObject *)x);
     }
     else {
-        struct CPyExtFunc_s *exf = _cpyextfunc_get(x);
-        if (exf != NULL) {  /* an OP_CPYTHON_BLTN: '&func' returns a cdata */
-            PyObject *ct;
-            if (exf->direct_fn == NULL) {
-                Py_INCREF(x);    /* backward compatibility */
-                return x;
-            }
-            ct = _cpyextfunc_type(lib, exf);
-            if (ct == NULL)
-                return NULL;
-            x = new_simple_cdata(exf->direct_fn, (CTypeDescrObject *)ct);
-            Py_DECREF(ct);
-            return x;
+        if (_cpyextfunc_get(x) != NULL) {
+            /* an OP_CPYTHON_BLTN: '&func' returns a cdata, or 'func'
+               itself if there is no direct function (backward
+               compatibility) */
+            return _cpyextfunc_as_cdata(x);
         }
         if (CData_Check(x) &&  /* a constant functionptr cdata: 'f == &f' */
                 (((CDataObject *)x)->c_type->ct_flags & CT_FUNCTIONPTR) != 0) {
@@ -288,3 +288,132 @@ static PyObject *minibuffer_new(char *data, Py_ssize_t size,
     }
     return (PyObject *)ob;
 }
+
+
+/* A C object with only the 'memoryview' interface, exposing one field
+ * of all the structs in an array as a strided one-dimensional buffer.
+ * It is only used internally by ffi.field_view(), which returns a
+ * memoryview of it.
+ */
+
+typedef struct {
+    PyObject_HEAD
+    char      *fv_data;         /* address of the field in the first item */
+    Py_ssize_t fv_shape[1];     /* number of items */
+    Py_ssize_t fv_strides[1];   /* size of the structs */
+    Py_ssize_t fv_itemsize;     /* size of the field */
+    char       fv_format[2];    /* 'struct' format code of the field */
+    PyObject  *fv_keepalive;
+} FieldViewObj;
+
+static int fv_getbuf(FieldViewObj *self, Py_buffer *view, int flags)
+{
+    if ((flags & PyBUF_STRIDES) != PyBUF_STRIDES) {
+        PyErr_SetString(PyExc_BufferError,
+                        "the view of a struct field is not contiguous");
+        view->obj = NULL;
+        return -1;
+    }
+    view->buf = self->fv_data;
+    view->obj = (PyObject *)self;
+    Py_INCREF(self);
+    view->len = self->fv_shape[0] * self->fv_itemsize;
+    view->readonly = 0;
+    view->itemsize = self->fv_itemsize;
+    view->format = (flags & PyBUF_FORMAT) ? self->fv_format : NULL;
+    view->ndim = 1;
+    view->shape = self->fv_shape;
+    view->strides = self->fv_strides;
+    view->suboffsets = NULL;
+    view->internal = NULL;
+    return 0;
+}
+
+static PyBufferProcs fv_as_buffer = {
+#if PY_MAJOR_VERSION < 3
+    (readbufferproc)0,
+    (writebufferproc)0,
+    (segcountproc)0,
+    (charbufferproc)0,
+#endif
+    (getbufferproc)fv_getbuf,
+    (releasebufferproc)0,
+};
+
+static void
+fv_dealloc(FieldViewObj *ob)
+{
+    PyObject_GC_UnTrack(ob);
+    Py_XDECREF(ob->fv_keepalive);
+    Py_TYPE(ob)->tp_free((PyObject *)ob);
+}
+
+static int
+fv_traverse(FieldViewObj *ob, visitproc visit, void *arg)
+{
+    Py_VISIT(ob->fv_keepalive);
+    return 0;
+}
+
+static int
+fv_clear(FieldViewObj *ob)
+{
+    Py_CLEAR(ob->fv_keepalive);
+    return 0;
+}
+
+#if PY_MAJOR_VERSION >= 3
+# define FIELDVIEW_TPFLAGS 0
+#else
+# define FIELDVIEW_TPFLAGS Py_TPFLAGS_HAVE_NEWBUFFER
+#endif
+
+static PyTypeObject FieldView_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_cffi_backend.__FieldView",
+    sizeof(FieldViewObj),
+    0,
+    (destructor)fv_dealloc,                     /* tp_dealloc */
+    0,                                          /* tp_print */
+    0,                                          /* tp_getattr */
+    0,                                          /* tp_setattr */
+    0,                                          /* tp_compare */
+    0,                                          /* tp_repr */
+    0,                                          /* tp_as_number */
+    0,                                          /* tp_as_sequence */
+    0,                                          /* tp_as_mapping */
+    0,                                          /* tp_hash */
+    0,                                          /* tp_call */
+    0,                                          /* tp_str */
+    PyObject_GenericGetAttr,                    /* tp_getattro */
+    0,                                          /* tp_setattro */
+    &fv_as_buffer,                              /* tp_as_buffer */
+    (Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC |
+        FIELDVIEW_TPFLAGS),                     /* tp_flags */
+    0,                                          /* tp_doc */
+    (traverseproc)fv_traverse,                  /* tp_traverse */
+    (inquiry)fv_clear,                          /* tp_clear */
+};
+
+static PyObject *fieldview_new(char *data, Py_ssize_t length,
+                               Py_ssize_t stride, Py_ssize_t itemsize,
+                               char format, PyObject *keepalive)
+{
+    /* returns a memoryview */
+    PyObject *res;
+    FieldViewObj *ob = PyObject_GC_New(FieldViewObj, &FieldView_Type);
+    if (ob == NULL)
+        return NULL;
+    ob->fv_data = data;
+    ob->fv_shape[0] = length;
+    ob->fv_strides[0] = stride;
+    ob->fv_itemsize = itemsize;
+    ob->fv_format[0] = format;
+    ob->fv_format[1] = 0;
+    ob->fv_keepalive = keepalive; Py_INCREF(keepalive);
+    PyObject_GC_Track(ob);
+
+    res = PyMemoryView_FromObject((PyObject *)ob);
+    Py_DECREF(ob);
+    return res;
+}
@@ -70,8 +70,12 @@ static void restore_errno_only(void)
 /* Seems that CPython 3.5.1 made our job harder.  Did not find out how
    to do that without these hacks.  We can't use PyThreadState_GET(),
    because that calls PyThreadState_Get() which fails an assert if the
-   result is NULL. */
-#if PY_MAJOR_VERSION >= 3 && !defined(_Py_atomic_load_relaxed)
+   result is NULL.  CPython 3.5.2 added _PyThreadState_UncheckedGet()
+   for that purpose; and from 3.7 the hack below would silently read a
+   variable of our own that is always NULL. */
+#if PY_VERSION_HEX >= 0x03050200
+   /* use _PyThreadState_UncheckedGet() */
+#elif PY_MAJOR_VERSION >= 3 && !defined(_Py_atomic_load_relaxed)
                              /* this was abruptly un-defined in 3.5.1 */
 void *volatile _PyThreadState_Current;
    /* XXX simple volatile access is assumed atomic */
@@ -80,7 +84,11 @@ void *volatile _PyThreadState_Current;
 
 static PyThreadState *get_current_ts(void)
 {
-#if defined(_Py_atomic_load_relaxed)
+#if PY_VERSION_HEX >= 0x030D0000
+    return PyThreadState_GetUnchecked();
+#elif PY_VERSION_HEX >= 0x03050200
+    return _PyThreadState_UncheckedGet();
+#elif defined(_Py_atomic_load_relaxed)
     return (PyThreadState*)_Py_atomic_load_relaxed(&_PyThreadState_Current);
 #else
     return _PyThreadState_Current;
@@ -132,5 +140,19 @@ static PyGILState_STATE gil_ensure(void)
 
 static void gil_release(PyGILState_STATE oldstate)
 {
-    PyGILState_Release(oldstate);
+    /* Called at the end of a callback.  Replacement for
+       PyGILState_Release().  The common case is that the thread state
+       stays alive: then we only need to undo what gil_ensure() did.
+    */
+    PyThreadState *ts = get_current_ts();
+
+    if (ts != NULL && ts->gilstate_counter > 1 &&
+            ts == PyGILState_GetThisThreadState()) {
+        ts->gilstate_counter--;
+        if (oldstate == PyGILState_UNLOCKED)
+            PyEval_SaveThread();
+    }
+    else {
+        PyGILState_Release(oldstate);
+    }
 }
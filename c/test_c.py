@@ -1045,6 +1045,76 @@ def test_call_function_23_bis():
     res = f(b"foo")
     assert res == 1000 * ord(b'f')
 
+def test_call_function_24():
+    # the exchange buffer of this function is too large to be on the stack
+    BInt = new_primitive_type("int")
+    BArray200 = new_array_type(new_pointer_type(BInt), 200)
+    BStruct = new_struct_type("struct foo")
+    BStructP = new_pointer_type(BStruct)
+    complete_struct_or_union(BStruct, [('a', BArray200, -1)])
+    BFunc24 = new_function_type((BStruct, BInt), BInt, False)
+    f = cast(BFunc24, _testfunc(24))
+    p1 = newp(BStructP, {'a': list(range(200))})
+    for i in range(100):
+        assert f(p1[0], i) == i * (i - 1) // 2
+    assert f(p1[0], 200) == 199 * 200 // 2
+
+def test_call_function_repeatedly():
+    # small exchange buffers are on the stack; check that nothing is
+    # left over from one call to the next
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    for i in range(1000):
+        assert f(i, 2 * i) == 3 * i
+    BChar = new_primitive_type("char")
+    BCharP = new_pointer_type(BChar)
+    BFunc23 = new_function_type((BCharP,), BInt, False)
+    f = cast(BFunc23, _testfunc(23))
+    for i in range(1, 128):
+        assert f(bytechr(i)) == 1000 * i
+
+def test_call_function_argument_conversions():
+    # the arguments and results are converted by functions specialized
+    # for each type; check them with callbacks, which are also callable
+    for typename, minvalue, maxvalue in [
+            ("int8_t", -2**7, 2**7-1),
+            ("int16_t", -2**15, 2**15-1),
+            ("int32_t", -2**31, 2**31-1),
+            ("int64_t", -2**63, 2**63-1),
+            ("uint8_t", 0, 2**8-1),
+            ("uint16_t", 0, 2**16-1),
+            ("uint32_t", 0, 2**32-1),
+            ("uint64_t", 0, 2**64-1)]:
+        BItem = new_primitive_type(typename)
+        BFunc = new_function_type((BItem,), BItem, False)
+        f = callback(BFunc, lambda x: x)
+        assert f(minvalue) == minvalue
+        assert f(maxvalue) == maxvalue
+        assert f(cast(BItem, 42)) == 42
+        e = py.test.raises(OverflowError, f, maxvalue + 1)
+        if sizeof(BItem) < 8:
+            assert str(e.value) == "integer %d does not fit '%s'" % (
+                maxvalue + 1, typename)
+        py.test.raises(OverflowError, f, minvalue - 1)
+        py.test.raises(TypeError, f, 1.5)
+        py.test.raises(TypeError, f, "foo")
+    for typename in ["float", "double"]:
+        BItem = new_primitive_type(typename)
+        BFunc = new_function_type((BItem,), BItem, False)
+        f = callback(BFunc, lambda x: x * 2)
+        assert f(1.25) == 2.5
+        assert f(3) == 6.0
+        py.test.raises(TypeError, f, "foo")
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BFunc = new_function_type((BIntP,), BInt, False)
+    f = callback(BFunc, lambda p: p[0] + p[1])
+    assert f(newp(new_array_type(BIntP, None), [40, 2])) == 42
+    assert f([5, 6]) == 11
+    py.test.raises(TypeError, f, newp(new_pointer_type(BIntP)))
+
 def test_cannot_pass_struct_with_array_of_length_0():
     BInt = new_primitive_type("int")
     BArray0 = new_array_type(new_pointer_type(BInt), 0)
@@ -1071,6 +1141,42 @@ def test_call_function_9():
     BSShort = new_primitive_type("short")
     assert f(3, cast(BSChar, -3), cast(BUChar, 200), cast(BSShort, -5)) == 192
 
+def test_call_function_9_varargs_cache():
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFunc9 = new_function_type((BInt,), BInt, True)    # vararg
+    f = cast(BFunc9, _testfunc(9))
+    set_varargs_cache_size(2)
+    try:
+        assert varargs_cache_info() == {'hits': 0, 'misses': 0,
+                                        'maxsize': 2, 'currsize': 0}
+        for i in range(5):
+            assert f(2, cast(BInt, 40 + i), cast(BInt, 2)) == 42 + i
+        assert varargs_cache_info() == {'hits': 4, 'misses': 1,
+                                        'maxsize': 2, 'currsize': 1}
+        assert f(1, cast(BLong, 42)) == 42
+        assert f(0) == 0
+        assert varargs_cache_info()['currsize'] == 2
+        assert varargs_cache_info()['misses'] == 3
+        # the entry for (int, int) was dropped
+        assert f(2, cast(BInt, 40), cast(BInt, 2)) == 42
+        assert varargs_cache_info() == {'hits': 4, 'misses': 4,
+                                        'maxsize': 2, 'currsize': 2}
+        assert f(0) == 0
+        assert varargs_cache_info()['hits'] == 5
+        # the short promoted to int shares the (int, int) entry
+        BSShort = new_primitive_type("short")
+        assert f(2, cast(BSShort, -5), cast(BInt, 6)) == 1
+        assert varargs_cache_info()['hits'] == 6
+        # disabling the cache
+        set_varargs_cache_size(0)
+        assert f(1, cast(BInt, 42)) == 42
+        assert varargs_cache_info() == {'hits': 0, 'misses': 1,
+                                        'maxsize': 0, 'currsize': 0}
+        py.test.raises(ValueError, set_varargs_cache_size, -1)
+    finally:
+        set_varargs_cache_size(32)
+
 def test_cannot_call_with_a_autocompleted_struct():
     BSChar = new_primitive_type("signed char")
     BDouble = new_primitive_type("double")
@@ -1148,6 +1254,30 @@ def test_write_variable():
     ll.write_variable(BVoidP, "stderr", stderr)
     assert ll.read_variable(BVoidP, "stderr") == stderr
 
+def test_load_variable_descr():
+    ## FIXME: this test assumes glibc specific behavior, it's not compliant with C standard
+    ## https://bugs.pypy.org/issue1643
+    if not sys.platform.startswith("linux"):
+        py.test.skip("untested")
+    BVoidP = new_pointer_type(new_void_type())
+    ll = find_and_load_library('c')
+    descr = ll.load_variable_descr(BVoidP, "stderr")
+    class Lib(object):
+        pass
+    Lib.stderr = descr
+    assert Lib.stderr is descr
+    lib = Lib()
+    stderr = lib.stderr
+    assert stderr == ll.read_variable(BVoidP, "stderr")
+    lib.stderr = cast(BVoidP, 0)
+    assert not ll.read_variable(BVoidP, "stderr")
+    assert not lib.stderr
+    lib.stderr = stderr
+    assert lib.stderr == stderr
+    py.test.raises(AttributeError, delattr, lib, "stderr")
+    py.test.raises(KeyError, ll.load_variable_descr,
+                   BVoidP, "xxx_this_variable_does_not_exist")
+
 def test_callback():
     BInt = new_primitive_type("int")
     def make_callback():
@@ -1299,6 +1429,105 @@ def test_callback_return_type():
         assert f(max - 1) == max
         assert f(max) == 42
 
+def test_callback_many_arguments():
+    BChar = new_primitive_type("char")
+    BSChar = new_primitive_type("signed char")
+    BUShort = new_primitive_type("unsigned short")
+    BInt = new_primitive_type("int")
+    BUInt = new_primitive_type("unsigned int")
+    BLong = new_primitive_type("long")
+    BULong = new_primitive_type("unsigned long")
+    BFloat = new_primitive_type("float")
+    BDouble = new_primitive_type("double")
+    BIntP = new_pointer_type(BInt)
+    types = [BChar, BSChar, BUShort, BInt, BUInt, BLong, BULong,
+             BFloat, BDouble, BIntP]
+    p = newp(BIntP, 42)
+    values = [b'X', -5, 65535, -7, 4000000000, -sys.maxsize - 1,
+              sys.maxsize * 2 + 1, 1.5, -2.25, p]
+    for n in [0, 1, 10, 16, 17, 30]:
+        args = [types[i % 10] for i in range(n)]
+        expected = [values[i % 10] for i in range(n)]
+        seen = []
+        def cb(*args):
+            seen.append(args)
+            return len(args)
+        BFunc = new_function_type(tuple(args), BInt, False)
+        f = callback(BFunc, cb)
+        assert f(*expected) == n
+        assert seen == [tuple(expected)]
+
+def test_callback_with_gil_held():
+    # a callback invoked from C code that already holds the GIL, like
+    # the functions of a PyDLL in ctypes; this used to deadlock
+    ctypes = py.test.importorskip("ctypes")
+    BInt = new_primitive_type("int")
+    BFunc = new_function_type((BInt,), BInt, False)
+    f = callback(BFunc, lambda n: n + 1)
+    addr = int(cast(new_primitive_type("intptr_t"), f))
+    g = ctypes.PYFUNCTYPE(ctypes.c_int, ctypes.c_int)(addr)
+    assert g(41) == 42
+    assert [g(i) for i in range(100)] == list(range(1, 101))
+
+def test_compare_callback():
+    BChar = new_primitive_type("char")
+    BInt = new_primitive_type("int")
+    BUInt = new_primitive_type("unsigned int")
+    BLongLong = new_primitive_type("long long")
+    BDouble = new_primitive_type("double")
+    BVoidP = new_pointer_type(new_void_type())
+    BFunc = new_function_type((BVoidP, BVoidP), BInt, False)
+    for BItem, a, b in [(BChar, b'\x05', b'\xf0'),
+                        (BInt, -5, 3),
+                        (BUInt, 5, 4000000000),
+                        (BLongLong, -2**62, 2**62),
+                        (BDouble, -1.5, 2.25)]:
+        BItemP = new_pointer_type(BItem)
+        pa = newp(BItemP, a)
+        pb = newp(BItemP, b)
+        f = compare_callback(BFunc, BItem)
+        assert repr(f) == "<cdata 'int(*)(void *, void *)' comparing %r>" % (
+            BItem.cname,)
+        assert (f(pa, pb), f(pb, pa), f(pa, pa)) == (-1, 1, 0)
+        f = compare_callback(BFunc, BItem, None, True)
+        assert (f(pa, pb), f(pb, pa), f(pa, pa)) == (1, -1, 0)
+    #
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('c', BChar, -1),
+                                       ('x', BDouble, -1),
+                                       ('bits', BInt, 3),
+                                       ('s', BInt, -1)])
+    BStructP = new_pointer_type(BStruct)
+    BFunc2 = new_function_type((BStructP, BStructP), BInt, False)
+    pa = newp(BStructP, [b'a', 7.5, 0, 1])
+    pb = newp(BStructP, [b'b', -1.0, 0, 1])
+    f = compare_callback(BFunc2, BStruct, 'x')
+    assert repr(f) == ("<cdata 'int(*)(struct foo *, struct foo *)' "
+                       "comparing 'struct foo.x'>")
+    assert (f(pa, pb), f(pb, pa), f(pa, pa)) == (1, -1, 0)
+    f = compare_callback(BFunc2, BStruct, 'c', True)
+    assert repr(f).endswith("comparing 'struct foo.c, reversed'>")
+    assert (f(pa, pb), f(pb, pa)) == (1, -1)
+    assert compare_callback(BFunc2, BStruct, 's')(pa, pb) == 0
+    #
+    py.test.raises(KeyError, compare_callback, BFunc2, BStruct, 'zz')
+    e = py.test.raises(TypeError, compare_callback, BFunc2, BStruct, 'bits')
+    assert str(e.value) == ("field 'bits' of 'struct foo' is a bitfield "
+                            "or an array of unknown length")
+    e = py.test.raises(TypeError, compare_callback, BFunc, BStruct)
+    assert str(e.value) == "cannot compare values of type 'struct foo'"
+    e = py.test.raises(TypeError, compare_callback, BFunc, BVoidP)
+    assert str(e.value) == "cannot compare values of type 'void *'"
+    e = py.test.raises(TypeError, compare_callback, BFunc, BInt, 'x')
+    assert str(e.value) == "expected a struct or union ctype, got 'int'"
+    for BBadFunc in [new_function_type((BVoidP,), BInt, False),
+                     new_function_type((BVoidP, BVoidP), BLongLong, False),
+                     new_function_type((BVoidP, BInt), BInt, False),
+                     new_function_type((BVoidP, BVoidP), BInt, True)]:
+        e = py.test.raises(TypeError, compare_callback, BBadFunc, BInt)
+        assert str(e.value).startswith("a comparison function must have "
+                                       "the type 'int(*)(T1 *, T2 *)', not ")
+
 def test_a_lot_of_callbacks():
     BIGNUM = 10000
     if 'PY_DOT_PY' in globals(): BIGNUM = 100   # tests on py.py
@@ -2959,6 +3188,52 @@ def test_setslice_array():
     c[1:3] = d
     assert list(c) == [0, 40, 50, 30, 0]
 
+def test_setslice_buffer():
+    import array
+    BIntP = new_pointer_type(new_primitive_type("int"))
+    BIntArray = new_array_type(BIntP, None)
+    c = newp(BIntArray, 5)
+    c[1:4] = array.array('i', [10, 20, 30])
+    assert list(c) == [0, 10, 20, 30, 0]
+    c[0:2] = memoryview(array.array('i', [-5, -6, -7]))[1:]
+    assert list(c) == [-6, -7, 20, 30, 0]
+    # items of another kind or size are converted one by one
+    c[3:5] = array.array('h', [40, 50])
+    assert list(c) == [-6, -7, 20, 40, 50]
+    def setslice(x):
+        c[1:3] = x
+    py.test.raises(TypeError, setslice, array.array('f', [1.0, 2.0]))
+    e = py.test.raises(ValueError, setslice, array.array('i', [1, 2, 3]))
+    assert str(e.value) == "need 2 values to unpack, got 3"
+    e = py.test.raises(ValueError, setslice, array.array('i', [1]))
+    assert str(e.value) == "need 2 values to unpack, got 1"
+    assert list(c) == [-6, -7, 20, 40, 50]
+
+def test_newp_from_buffer_of_other_type():
+    import array
+    BInt = new_primitive_type("int")
+    BIntA = new_array_type(new_pointer_type(BInt), None)
+    p = newp(BIntA, array.array('h', [5, -6, 7]))
+    assert list(p) == [5, -6, 7]
+    p = newp(new_array_type(new_pointer_type(BInt), 4), array.array('b', [8]))
+    assert list(p) == [8, 0, 0, 0]
+    py.test.raises(TypeError, newp, BIntA, array.array('f', [5.5]))
+    BUChar = new_primitive_type("unsigned char")
+    BUCharA = new_array_type(new_pointer_type(BUChar), None)
+    p = newp(BUCharA, array.array('B', [1, 255]))
+    assert list(p) == [1, 255]
+    p = newp(BUCharA, bytearray(b"AB"))
+    assert list(p) == [65, 66]
+    p = newp(BUCharA, array.array('i', [3, 4, 5]))
+    assert list(p) == [3, 4, 5]
+    py.test.raises(OverflowError, newp, BUCharA, array.array('i', [256]))
+    # bytes are still null-terminated
+    p = newp(BUCharA, b"AB")
+    assert list(p) == [65, 66, 0]
+    BChar = new_primitive_type("char")
+    BCharA = new_array_type(new_pointer_type(BChar), None)
+    py.test.raises(TypeError, newp, BCharA, array.array('i', [3]))
+
 def test_cdata_name_module_doc():
     p = new_primitive_type("signed char")
     x = cast(p, 17)
@@ -3337,6 +3612,55 @@ def test_from_buffer():
     cast(p, c)[1] += 500
     assert list(a) == [10000, 20500, 30000]
 
+def test_from_buffer_typed():
+    import array
+    a = array.array('H', [10000, 20000, 30000])
+    BUShort = new_primitive_type("unsigned short")
+    BUShortP = new_pointer_type(BUShort)
+    BUShortA = new_array_type(BUShortP, None)
+    c = from_buffer(BUShortA, a)
+    assert typeof(c) is BUShortA
+    assert len(c) == 3
+    assert repr(c) == ("<cdata 'unsigned short[]' buffer len 3 "
+                       "from 'array.array' object>")
+    assert list(c) == [10000, 20000, 30000]
+    c[1] += 500
+    assert list(a) == [10000, 20500, 30000]
+    #
+    BUShortA2 = new_array_type(BUShortP, 2)
+    c = from_buffer(BUShortA2, a)
+    assert typeof(c) is BUShortA2
+    assert len(c) == 2
+    assert list(c) == [10000, 20500]
+    BUShortA4 = new_array_type(BUShortP, 4)
+    e = py.test.raises(ValueError, from_buffer, BUShortA4, a)
+    assert str(e.value) == ("buffer is too small (6 bytes) for "
+                            "'unsigned short[4]' (8 bytes)")
+    #
+    BInt = new_primitive_type("int")
+    BIntA = new_array_type(new_pointer_type(BInt), None)
+    e = py.test.raises(ValueError, from_buffer, BIntA, a)
+    assert str(e.value) == ("buffer size (6 bytes) is not a multiple of "
+                            "the size of 'int' (4 bytes)")
+    b = bytearray(9)
+    e = py.test.raises(ValueError, from_buffer, BIntA, memoryview(b)[1:5])
+    assert str(e.value) == ("buffer is not aligned for 'int[]' (the address "
+                            "must be a multiple of 4)")
+    #
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a1', BInt, -1),
+                                       ('a2', BUShort, -1)])
+    BStructA = new_array_type(new_pointer_type(BStruct), None)
+    a = array.array('i', [1, 2, 3, 4])
+    c = from_buffer(BStructA, a)
+    assert len(c) == 2
+    assert c[1].a1 == 3
+    c[1].a1 = -5
+    assert list(a) == [1, 2, -5, 4]
+    #
+    py.test.raises(TypeError, from_buffer, BUShortP, a)
+    py.test.raises(TypeError, from_buffer, BUShort, a)
+
 def test_from_buffer_not_str_unicode():
     BChar = new_primitive_type("char")
     BCharP = new_pointer_type(BChar)
@@ -3620,6 +3944,82 @@ def test_unpack():
     py.test.raises(ValueError, unpack, p0, -1)
     py.test.raises(ValueError, unpack, p, -1)
 
+def test_unpack_kind():
+    import array
+    for typename, samples in [
+            ("uint8_t",  [0, 2**8-1]),
+            ("uint16_t", [0, 2**16-1]),
+            ("uint32_t", [0, 2**32-1]),
+            ("uint64_t", [0, 2**64-1]),
+            ("int8_t",  [-2**7, 2**7-1]),
+            ("int16_t", [-2**15, 2**15-1]),
+            ("int32_t", [-2**31, 2**31-1]),
+            ("int64_t", [-2**63, 2**63-1]),
+            ("float", [0.0, 10.5]),
+            ("double", [12.34, 56.78]),
+            ]:
+        BItem = new_primitive_type(typename)
+        BArray = new_array_type(new_pointer_type(BItem), 10)
+        p = newp(BArray, samples)
+        result = unpack(p, len(samples), "array")
+        assert type(result) is array.array
+        assert result.itemsize == sizeof(BItem)
+        assert result.tolist() == samples
+        assert unpack(p, len(samples), kind="list") == samples
+        if sys.version_info >= (3,):
+            result = unpack(p, len(samples), "memoryview")
+            assert type(result) is memoryview
+            assert result.itemsize == sizeof(BItem)
+            assert result.tolist() == samples
+    assert unpack(p, 0, "array").tolist() == []
+    #
+    BBool = new_primitive_type("_Bool")
+    p = newp(new_array_type(new_pointer_type(BBool), None), [True, False])
+    py.test.raises(TypeError, unpack, p, 2, "array")
+    if sys.version_info >= (3,):
+        assert unpack(p, 2, "memoryview").tolist() == [True, False]
+    BChar = new_primitive_type("char")
+    p = newp(new_array_type(new_pointer_type(BChar), None), b"abc")
+    e = py.test.raises(TypeError, unpack, p, 3, "array")
+    assert str(e.value) == ("cannot unpack items of type 'char' "
+                            "with kind='array'")
+    py.test.raises(ValueError, unpack, p, 3, "tuple")
+
+def test_newp_from_buffer_of_same_type():
+    import array
+    BDouble = new_primitive_type("double")
+    BDoubleA = new_array_type(new_pointer_type(BDouble), None)
+    a = array.array('d', [1.5, 2.5, -3.25])
+    p = newp(BDoubleA, a)
+    assert len(p) == 3
+    assert list(p) == [1.5, 2.5, -3.25]
+    p = newp(new_array_type(new_pointer_type(BDouble), 5), a)
+    assert list(p) == [1.5, 2.5, -3.25, 0.0, 0.0]
+    py.test.raises(IndexError, newp,
+                   new_array_type(new_pointer_type(BDouble), 2), a)
+    p = newp(BDoubleA, memoryview(a)[1:])
+    assert list(p) == [2.5, -3.25]
+    #
+    BInt = new_primitive_type("int")
+    BIntA = new_array_type(new_pointer_type(BInt), None)
+    p = newp(BIntA, array.array('i', [5, -6]))
+    assert list(p) == [5, -6]
+    # if the item kind or size don't match, the items are converted
+    # one by one
+    py.test.raises(TypeError, newp, BIntA, array.array('f', [5.0]))
+    assert list(newp(BIntA, array.array('h', [5]))) == [5]
+    assert list(newp(BDoubleA, array.array('f', [5.5]))) == [5.5]
+    if sys.version_info >= (3,):
+        # 0-dimensional buffers, like numpy scalars, are not arrays
+        m0 = memoryview(array.array('i', [5])).cast('B').cast('i', shape=[])
+        py.test.raises(TypeError, newp, BIntA, m0)
+    #
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', new_array_type(
+                                        new_pointer_type(BInt), 3), -1)])
+    s = newp(new_pointer_type(BStruct), [array.array('i', [7, 8])])
+    assert list(s.a) == [7, 8, 0]
+
 def test_cdata_dir():
     BInt = new_primitive_type("int")
     p = cast(BInt, 42)
@@ -3639,3 +4039,267 @@ def test_cdata_dir():
     check_dir(pp, [])
     check_dir(pp[0], ['a1', 'a2'])
     check_dir(pp[0][0], ['a1', 'a2'])
+
+def test_call_many():
+    import array
+    BInt = new_primitive_type("int")
+    BLong = new_primitive_type("long")
+    BFloat = new_primitive_type("float")
+    BDouble = new_primitive_type("double")
+    BIntArray = new_array_type(new_pointer_type(BInt), None)
+    BLongArray = new_array_type(new_pointer_type(BLong), None)
+    BFunc1 = new_function_type((BInt, BLong), BLong, False)
+    f = cast(BFunc1, _testfunc(1))
+    a1 = newp(BIntArray, [1, 2, 3, -4])
+    a2 = newp(BLongArray, [10, 20, 30, 40])
+    res = call_many(f, a1, a2)
+    assert typeof(res) is BLongArray
+    assert list(res) == [11, 22, 33, 36]
+    # buffers are accepted too, if they have the right kind of items
+    res = call_many(f, array.array('i', [5, 6]), array.array('l', [7, 8]))
+    assert list(res) == [12, 14]
+    res = call_many(f, a1, array.array('l', [100, 200, 300, 400]))
+    assert list(res) == [101, 202, 303, 396]
+    e = py.test.raises(TypeError, call_many, f, a1,
+                       array.array('d', [1.0, 2.0, 3.0, 4.0]))
+    assert str(e.value) == ("argument 2: buffer of items of format 'd' and "
+                            "size %d does not match 'long'" % (
+                                array.array('d').itemsize,))
+    py.test.raises(TypeError, call_many, f, a1, b"abcdefgh")
+    e = py.test.raises(TypeError, call_many, f, a2, a2)
+    assert str(e.value) == ("argument 1: expected an array of 'int', "
+                            "got cdata 'long[]'")
+    e = py.test.raises(ValueError, call_many, f, a1, newp(BLongArray, 3))
+    assert str(e.value) == ("argument 2 has length 3, but the previous "
+                            "ones have length 4")
+    e = py.test.raises(TypeError, call_many, f, a1)
+    assert str(e.value) == "'long(*)(int, long)' expects 2 arguments, got 1"
+    py.test.raises(TypeError, call_many, 42, a1, a2)
+    res = call_many(f, newp(BIntArray, 0), newp(BLongArray, 0))
+    assert len(res) == 0
+    #
+    BFunc3 = new_function_type((BFloat, BDouble), BDouble, False)
+    f = cast(BFunc3, _testfunc(3))
+    res = call_many(f, array.array('f', [1.5, 2.5]),
+                       newp(new_array_type(new_pointer_type(BDouble), None),
+                            [0.25, 0.5]))
+    assert list(res) == [1.75, 3.0]
+
+def test_call_many_void_and_structs():
+    BVoid = new_void_type()
+    BInt = new_primitive_type("int")
+    BChar = new_primitive_type("char")
+    BCharP = new_pointer_type(BChar)
+    BFunc23 = new_function_type((BCharP,), BInt, False)
+    f = cast(BFunc23, _testfunc(23))
+    strings = [newp(new_array_type(BCharP, None), s) for s in [b"A", b"B"]]
+    args = newp(new_array_type(new_pointer_type(BCharP), None),
+                strings + [cast(BCharP, 0)])
+    res = call_many(f, args)
+    assert list(res) == [1000 * ord('A'), 1000 * ord('B'), -42]
+    #
+    BFunc = new_function_type((BCharP,), BVoid, False)
+    f = cast(BFunc, _testfunc(23))
+    assert call_many(f, args) is None
+    #
+    BArray10 = new_array_type(new_pointer_type(BInt), 10)
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', BArray10, -1)])
+    BStructArray = new_array_type(new_pointer_type(BStruct), None)
+    BFunc22 = new_function_type((BStruct, BStruct), BStruct, False)
+    f = cast(BFunc22, _testfunc(22))
+    p1 = newp(BStructArray, [{'a': list(range(10))}, {'a': [5] * 10}])
+    p2 = newp(BStructArray, [{'a': [1] * 10}, {'a': list(range(10))}])
+    res = call_many(f, p1, p2)
+    assert typeof(res) is BStructArray
+    assert list(res[0].a) == [i - 1 for i in range(10)]
+    assert list(res[1].a) == [5 - i for i in range(10)]
+    #
+    BFunc9 = new_function_type((BInt,), BInt, True)    # vararg
+    f = cast(BFunc9, _testfunc(9))
+    py.test.raises(NotImplementedError, call_many, f,
+                   newp(new_array_type(new_pointer_type(BInt), None), 1))
+
+def test_field_view():
+    import gc
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BDouble = new_primitive_type("double")
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('c', BChar, -1),
+                                       ('price', BDouble, -1),
+                                       ('qty', BShort, -1),
+                                       ('bits', BShort, 3)])
+    BStructP = new_pointer_type(BStruct)
+    BStructArray = new_array_type(BStructP, None)
+    p = newp(BStructArray, [{'c': b'x', 'price': 1.5, 'qty': 3},
+                            {'c': b'y', 'price': -2.25, 'qty': 4},
+                            {'c': b'z', 'price': 8.0, 'qty': -5}])
+    v = field_view(p, "price")
+    assert type(v) is memoryview
+    assert v.format == 'd' and v.itemsize == sizeof(BDouble)
+    assert len(v) == 3
+    assert v.strides == (sizeof(BStruct),)
+    if sys.version_info >= (3,):
+        assert v.tolist() == [1.5, -2.25, 8.0]
+        assert field_view(p, "qty").tolist() == [3, 4, -5]
+        assert field_view(p, "c").tolist() == [b'x', b'y', b'z']
+        assert field_view(p, "price", 2).tolist() == [1.5, -2.25]
+        v[1] = 100.5
+        assert p[1].price == 100.5
+        #
+        q = field_view(cast(BStructP, p), "qty", length=3)
+        del p
+        for i in range(3):
+            gc.collect()
+        assert q.tolist() == [3, 4, -5]
+    p = newp(BStructArray, 1)
+    assert len(field_view(p, "price", 1)) == 1
+    e = py.test.raises(IndexError, field_view, p, "price", 2)
+    assert str(e.value) == ("length too large for cdata 'struct foo[]' "
+                            "(expected 2 <= 1)")
+    py.test.raises(KeyError, field_view, p, "foobar")
+    py.test.raises(TypeError, field_view, p, "bits")
+    py.test.raises(TypeError, field_view, cast(BStructP, p), "qty")
+    py.test.raises(TypeError, field_view, newp(BStructP), "qty")
+    py.test.raises(TypeError, field_view,
+                   newp(new_array_type(new_pointer_type(BShort), 2)), "qty")
+    BArray = new_array_type(new_pointer_type(BShort), 2)
+    BStruct2 = new_struct_type("struct bar")
+    complete_struct_or_union(BStruct2, [('a', BArray, -1)])
+    p = newp(new_array_type(new_pointer_type(BStruct2), 2))
+    e = py.test.raises(TypeError, field_view, p, "a")
+    assert str(e.value) == "cannot make a view of field 'a' of type 'short[2]'"
+
+def test_unpack_records():
+    import collections
+    BChar = new_primitive_type("char")
+    BShort = new_primitive_type("short")
+    BInt = new_primitive_type("int")
+    BDouble = new_primitive_type("double")
+    BIntP = new_pointer_type(BInt)
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('c', BChar, -1),
+                                       ('price', BDouble, -1),
+                                       ('qty', BShort, -1),
+                                       ('bits', BInt, 3),
+                                       ('ptr', BIntP, -1)])
+    BStructP = new_pointer_type(BStruct)
+    BStructArray = new_array_type(BStructP, None)
+    n = newp(BIntP, 42)
+    p = newp(BStructArray, [(b'x', 1.5, 3, -2, n),
+                            (b'y', -2.25, 4, 3),
+                            (b'z', 8.0, -5, 0)])
+    assert unpack_struct(p[0]) == (b'x', 1.5, 3, -2, n)
+    assert unpack_struct(p + 1) == (b'y', -2.25, 4, 3, cast(BIntP, 0))
+    assert unpack_struct(p[2], "dict") == {'c': b'z', 'price': 8.0,
+                                           'qty': -5, 'bits': 0,
+                                           'ptr': cast(BIntP, 0)}
+    recs = unpack_records(p)
+    assert recs == [unpack_struct(p[i]) for i in range(3)]
+    assert type(recs[0]) is tuple
+    assert unpack_records(cast(BStructP, p), 2, "dict") == [
+        unpack_struct(p[i], "dict") for i in range(2)]
+    assert unpack_records(p, kind="tuple", length=0) == []
+    Rec = collections.namedtuple('Rec', 'c price qty bits ptr')
+    recs = unpack_records(p, 3, Rec)
+    assert type(recs[1]) is Rec
+    assert recs[1].qty == 4 and recs[2].price == 8.0
+    assert unpack_struct(cast(BStructP, p), Rec) == recs[0]
+    #
+    pack_records(p, [(b'a', 0.5), {'qty': 7, 'bits': 1}])
+    assert unpack_struct(p[0]) == (b'a', 0.5, 3, -2, n)
+    assert unpack_struct(p[1]) == (b'y', -2.25, 7, 1, cast(BIntP, 0))
+    pack_records(p + 2, [p[0]])
+    assert unpack_struct(p[2]) == unpack_struct(p[0])
+    pack_records(p, [])
+    #
+    py.test.raises(ValueError, pack_records, p, [(b'a', 1.0, 2, 0, n, 6)])
+    py.test.raises(KeyError, pack_records, p, [{'qty': 5, 'foobar': 6}])
+    py.test.raises(TypeError, pack_records, p, [42])
+    py.test.raises(TypeError, pack_records, p, 42)
+    py.test.raises(IndexError, pack_records, p, [()] * 4)
+    py.test.raises(TypeError, unpack_records, cast(BStructP, p))
+    e = py.test.raises(IndexError, unpack_records, p, 4)
+    assert str(e.value) == ("length too large for cdata 'struct foo[]' "
+                            "(expected 4 <= 3)")
+    py.test.raises(TypeError, unpack_records, newp(BIntP))
+    py.test.raises(TypeError, unpack_struct, p)
+    py.test.raises(TypeError, unpack_struct, p[0], "list")
+    py.test.raises(TypeError, unpack_struct, p[0], list)
+    e = py.test.raises(ValueError, unpack_struct, p[0],
+                       collections.namedtuple('Rec2', 'c price'))
+    assert str(e.value) == "'Rec2' has 2 fields, but 'struct foo' has 5"
+    e = py.test.raises(RuntimeError, unpack_struct, cast(BStructP, 0))
+    assert str(e.value) == ("cannot use unpack_struct() on "
+                            "<cdata 'struct foo *' NULL>")
+    BOpaque = new_struct_type("struct opaque")
+    py.test.raises(TypeError, unpack_struct, cast(new_pointer_type(BOpaque),
+                                                  p))
+
+def test_unpack_records_union_and_nested():
+    BInt = new_primitive_type("int")
+    BUChar = new_primitive_type("unsigned char")
+    BUnion = new_union_type("union u")
+    complete_struct_or_union(BUnion, [('i', BInt, -1), ('c', BUChar, -1)])
+    BStruct = new_struct_type("struct bar")
+    complete_struct_or_union(BStruct, [('u', BUnion, -1), ('k', BInt, -1)])
+    BStructP = new_pointer_type(BStruct)
+    p = newp(new_array_type(BStructP, 2), [({'c': 200}, 5), ({'i': 1}, 6)])
+    recs = unpack_records(p)
+    assert [rec[1] for rec in recs] == [5, 6]
+    assert typeof(recs[0][0]) is BUnion
+    assert unpack_struct(recs[0][0], "dict")['c'] == 200
+    assert unpack_struct(recs[1][0]) == (1, 1 if sys.byteorder == 'little'
+                                            else 0)
+    py.test.raises(ValueError, pack_records, p, [((1, 2), 3)])
+    pack_records(p, [({'i': 7},)])
+    assert p[0].u.i == 7 and p[0].k == 5
+
+def test_cdata_freelist():
+    BInt = new_primitive_type("int")
+    BIntP = new_pointer_type(BInt)
+    BChar = new_primitive_type("char")
+    BCharP = new_pointer_type(BChar)
+    BStruct = new_struct_type("struct foo")
+    complete_struct_or_union(BStruct, [('a', BInt, -1)])
+    BStructP = new_pointer_type(BStruct)
+    set_cdata_freelist_size(4)
+    try:
+        assert cdata_freelist_info() == {'hits': 0, 'misses': 0,
+                                         'maxsize': 4, 'currsize': 0}
+        x = cast(BInt, 42)
+        assert cdata_freelist_info()['misses'] == 1
+        del x
+        assert cdata_freelist_info()['currsize'] == 1
+        x = cast(BInt, 43)
+        assert int(x) == 43
+        assert cdata_freelist_info() == {'hits': 1, 'misses': 1,
+                                         'maxsize': 4, 'currsize': 0}
+        # the reused memory is cleared by newp()
+        p = newp(BIntP, 1234)
+        del p
+        p = newp(BIntP)
+        assert p[0] == 0
+        p = newp(BCharP, b'X')
+        assert p[0] == b'X'
+        s = newp(BStructP, [5])
+        assert s.a == 5
+        p1 = cast(BIntP, s)      # new_simple_cdata()
+        assert p1[0] == 5
+        del p, s, p1, x
+        assert 0 < cdata_freelist_info()['currsize'] <= 4 * 16
+        # each list is capped
+        lst = [cast(BInt, i) for i in range(10)]
+        del lst
+        assert cdata_freelist_info()['currsize'] <= 4 * 16
+        # disabling the free lists
+        set_cdata_freelist_size(0)
+        x = cast(BInt, 42)
+        del x
+        x = cast(BInt, 42)
+        assert cdata_freelist_info() == {'hits': 0, 'misses': 2,
+                                         'maxsize': 0, 'currsize': 0}
+        py.test.raises(ValueError, set_cdata_freelist_size, -1)
+    finally:
+        set_cdata_freelist_size(256)
@@ -1,4 +1,13 @@
 #define _CFFI_
+/* We use the limited API (see recompiler.py).  On CPython 3.10 or
+   later, ask for a version of it that includes METH_FASTCALL. */
+#ifdef Py_LIMITED_API
+# include <patchlevel.h>
+# if PY_VERSION_HEX >= 0x030A0000 && !defined(PYPY_VERSION)
+#  undef Py_LIMITED_API
+#  define Py_LIMITED_API  0x030A0000
+# endif
+#endif
 #include <Python.h>
 #ifdef __cplusplus
 extern "C" {
@@ -57,6 +66,16 @@ extern "C" {
 # define _CFFI_UNUSED_FN  /* nothing */
 #endif
 
+/* _CFFI_SHARDED is defined if the module is made of several C files;
+   the one that is not the main file also defines _CFFI_SHARD.  Then
+   the functions and tables used by several files are not 'static', but
+   they are still hidden from outside the module if possible. */
+#if defined(__GNUC__) && !defined(_WIN32)
+# define _CFFI_HIDDEN  __attribute__((visibility("hidden")))
+#else
+# define _CFFI_HIDDEN  /* nothing */
+#endif
+
 #ifdef __cplusplus
 # ifndef _Bool
 #  define _Bool bool   /* semi-hackish: C++ has no _Bool; bool is builtin */
@@ -66,6 +85,9 @@ extern "C" {
 /**********  CPython-specific section  **********/
 #ifndef PYPY_VERSION
 
+#if PY_VERSION_HEX >= 0x03070000 && defined(METH_FASTCALL)
+# define _CFFI_USE_FASTCALL
+#endif
 
 #if PY_MAJOR_VERSION >= 3
 # define PyInt_FromLong PyLong_FromLong
@@ -159,12 +181,19 @@ extern "C" {
 
 typedef struct _ctypedescr CTypeDescrObject;
 
+#if !defined(_CFFI_SHARDED)
 static void *_cffi_exports[_CFFI_NUM_EXPORTS];
+#elif !defined(_CFFI_SHARD)
+_CFFI_HIDDEN void *_cffi_exports[_CFFI_NUM_EXPORTS];
+#else
+extern _CFFI_HIDDEN void *_cffi_exports[_CFFI_NUM_EXPORTS];
+#endif
 
 #define _cffi_type(index)   (                           \
     assert((((uintptr_t)_cffi_types[index]) & 1) == 0), \
     (CTypeDescrObject *)_cffi_types[index])
 
+#ifndef _CFFI_SHARD
 static PyObject *_cffi_init(const char *module_name, Py_ssize_t version,
                             const struct _cffi_type_context_s *ctx)
 {
@@ -195,6 +224,20 @@ static PyObject *_cffi_init(const char *module_name, Py_ssize_t version,
     Py_XDECREF(module);
     return NULL;
 }
+#endif
+
+#ifdef _CFFI_USE_FASTCALL
+_CFFI_UNUSED_FN
+static int _cffi_check_nargs(const char *name, Py_ssize_t nargs,
+                             Py_ssize_t expected)
+{
+    if (nargs == expected)
+        return 1;
+    PyErr_Format(PyExc_TypeError, "%s expected %zd arguments, got %zd",
+                 name, expected, nargs);
+    return 0;
+}
+#endif
 
 /**********  end CPython-specific section  **********/
 #else
@@ -203,6 +246,12 @@ static void (*_cffi_call_python_org)(struct _cffi_externpy_s *, char *);
 # define _cffi_call_python  _cffi_call_python_org
 #endif
 
+#ifndef _CFFI_USE_FASTCALL
+/* the functions with several arguments use METH_VARARGS instead */
+# undef _CFFI_OP_CPYTHON_BLTN_F
+# define _CFFI_OP_CPYTHON_BLTN_F  _CFFI_OP_CPYTHON_BLTN_V
+#endif
+
 
 #define _cffi_array_len(array)   (sizeof(array) / sizeof((array)[0]))
 
@@ -14,6 +14,8 @@ except NameError:
     # Python 3.x
     basestring = str
 
+_unspecified = object()
+
 
 class FFIError(Exception):
     pass
@@ -94,15 +96,22 @@ class FFI(object):
             self.NULL = self.cast(self.BVoidP, 0)
             self.CData, self.CType = backend._get_types()
 
-    def cdef(self, csource, override=False, packed=False):
+    def cdef(self, csource, override=False, packed=False, cache_dir=None,
+             fast_parser=True):
         """Parse the given C source.  This registers all declared functions,
         types, and global variables.  The functions and global variables can
         then be accessed via either 'ffi.dlopen()' or 'ffi.verify()'.
         The types can be used in 'ffi.new()' and other functions.
         If 'packed' is specified as True, all structs declared inside this
         cdef are packed, i.e. laid out without any field alignment at all.
+        If 'cache_dir' is given, the result of parsing is stored in this
+        directory and reloaded from there the next time the same cdef()
+        is done, without parsing the C source again.
+        If 'fast_parser' is False, the whole C source is parsed with
+        pycparser, instead of only what the built-in parser gives up on.
         """
-        self._cdef(csource, override=override, packed=packed)
+        self._cdef(csource, override=override, packed=packed,
+                   cache_dir=cache_dir, fast_parser=fast_parser)
 
     def embedding_api(self, csource, packed=False):
         self._cdef(csource, packed=packed, dllexport=True)
@@ -127,16 +136,28 @@ class FFI(object):
                 for tp in finishlist:
                     tp.finish_backend_type(self, finishlist)
 
-    def dlopen(self, name, flags=0):
+    def dlopen(self, name, flags=0, preload=False):
         """Load and return a dynamic library identified by 'name'.
         The standard C library can be loaded by passing None.
         Note that functions and types declared by 'ffi.cdef()' are not
         linked to a particular library, just like C headers; in the
         library we only look for the actual (untyped) symbols.
+        With 'preload=True', all the symbols are looked up immediately,
+        and OSError is raised if any of them is missing.
         """
         assert isinstance(name, basestring) or name is None
         with self._lock:
             lib, function_cache = _make_ffi_library(self, name, flags)
+        if preload:
+            # before the lib is recorded: if this fails, the lib is not
+            # referenced any more and the library is closed
+            missing = lib.__preload__()['missing']
+            if missing:
+                if name is None:
+                    name = '<None>'
+                raise OSError("cannot preload library '%s': symbols not "
+                              "found: %s" % (name, ', '.join(missing)))
+        with self._lock:
             self._function_caches.append(function_cache)
             self._libraries.append(lib)
         return lib
@@ -299,7 +320,7 @@ class FFI(object):
         """
         return self._backend.string(cdata, maxlen)
 
-    def unpack(self, cdata, length):
+    def unpack(self, cdata, length, kind=None):
         """Unpack an array of C data of the given length, 
         returning a Python string/unicode/list.
 
@@ -313,8 +334,58 @@ class FFI(object):
         If 'cdata' is a pointer to anything else, returns a list of
         'length' items.  This is a faster equivalent to:
         [cdata[i] for i in range(length)]
+
+        For integers, floats and doubles, 'kind' can be 'array' or
+        'memoryview' to return instead an array.array or a memoryview
+        of the proper format, containing a copy of the data made with
+        one memcpy().
+        """
+        if kind is None:
+            return self._backend.unpack(cdata, length)
+        return self._backend.unpack(cdata, length, kind)
+
+    def call_many(self, fn, *columns):
+        """Call the C function 'fn' once for every row of arguments,
+        and return a new array with all the results (or None if 'fn'
+        returns void).
+
+        There must be one column per argument of 'fn'; each column is a
+        cdata array of items of exactly the argument type, or a Python
+        buffer object (like an array.array) whose items have the same
+        kind and size as the argument type, which must then be a
+        primitive type.  All columns must have the same length.  This is
+        a faster equivalent to:
+        ffi.new("RESULT[]", [fn(*row) for row in zip(*columns)])
         """
-        return self._backend.unpack(cdata, length)
+        return self._backend.call_many(fn, *columns)
+
+    def varargs_cache_info(self):
+        """Return a dict with statistics about the cache of the libffi
+        descriptions built for calls to variadic functions: 'hits',
+        'misses', 'maxsize' and 'currsize'.
+        """
+        return self._backend.varargs_cache_info()
+
+    def set_varargs_cache_size(self, maxsize):
+        """Empty the cache of the libffi descriptions built for calls
+        to variadic functions, and set its maximum size (0 disables it).
+        This also resets the statistics.
+        """
+        self._backend.set_varargs_cache_size(maxsize)
+
+    def cdata_freelist_info(self):
+        """Return a dict with statistics about the free lists used to
+        allocate small cdata objects: 'hits', 'misses', 'maxsize' (per
+        size of object) and 'currsize' (the total number of objects kept).
+        """
+        return self._backend.cdata_freelist_info()
+
+    def set_cdata_freelist_size(self, maxsize):
+        """Release the memory kept in the free lists used to allocate
+        small cdata objects, and set how many objects each of them can
+        keep (0 disables them).  This also resets the statistics.
+        """
+        self._backend.set_cdata_freelist_size(maxsize)
 
     def buffer(self, cdata, size=-1):
         """Return a read-write buffer object that references the raw C data
@@ -329,15 +400,58 @@ class FFI(object):
         """
         return self._backend.buffer(cdata, size)
 
-    def from_buffer(self, python_buffer):
-        """Return a <cdata 'char[]'> that points to the data of the
-        given Python object, which must support the buffer interface.
-        Note that this is not meant to be used on the built-in types
-        str or unicode (you can build 'char[]' arrays explicitly)
-        but only on objects containing large quantities of raw data
-        in some other format, like 'array.array' or numpy arrays.
+    def field_view(self, cdata, fieldname, length=-1):
+        """Return a memoryview over one field of every item of an array
+        of structs, without copying: view[i] reads or writes
+        cdata[i].fieldname.  The field must be a primitive type (not a
+        bitfield).  'length' is the number of structs, which is needed
+        if 'cdata' is a pointer.
+        """
+        return self._backend.field_view(cdata, fieldname, length)
+
+    def unpack_struct(self, cdata, kind="tuple"):
+        """Return the values of all the fields of a struct or union, or
+        of the struct or union that 'cdata' points to, as a tuple in
+        the order of declaration.  Each value is what 'cdata.fieldname'
+        would return.  'kind' can be 'tuple', 'dict', or a subclass of
+        tuple like a namedtuple class, which is filled without calling
+        its __new__().
         """
-        return self._backend.from_buffer(self.BCharA, python_buffer)
+        return self._backend.unpack_struct(cdata, kind)
+
+    def unpack_records(self, cdata, length=-1, kind="tuple"):
+        """Return a list with the values of all the fields of every item
+        of an array of structs or unions, like
+        ffi.unpack_struct(cdata[i], kind) for each i, but in a single
+        loop.  'length' is the number of items, which is needed if
+        'cdata' is a pointer.
+        """
+        return self._backend.unpack_records(cdata, length, kind)
+
+    def pack_records(self, cdata, records):
+        """Write the sequence 'records' into the array of structs or
+        unions 'cdata': this is equivalent to 'cdata[i] = records[i]'
+        for each i, but in a single loop.  Each record is typically a
+        tuple or a dict.
+        """
+        self._backend.pack_records(cdata, records)
+
+    def from_buffer(self, cdecl, python_buffer=_unspecified):
+        """Return a cdata array that points to the data of the given
+        Python object, which must support the buffer interface.  The
+        optional 'cdecl' is the array type, by default 'char[]'.  For an
+        open array type like 'int[]', the length is computed from the
+        size of the buffer; for a type like 'int[5]', the buffer must be
+        at least as large.  Note that this is not meant to be used on
+        the built-in types str or unicode (you can build 'char[]' arrays
+        explicitly) but only on objects containing large quantities of
+        raw data in some other format, like 'array.array' or numpy arrays.
+        """
+        if python_buffer is _unspecified:
+            cdecl, python_buffer = self.BCharA, cdecl
+        elif isinstance(cdecl, basestring):
+            cdecl = self._typeof(cdecl)
+        return self._backend.from_buffer(cdecl, python_buffer)
 
     def memmove(self, dest, src, n):
         """ffi.memmove(dest, src, n) copies n bytes of memory from src to dest.
@@ -355,14 +469,34 @@ class FFI(object):
         """
         return self._backend.memmove(dest, src, n)
 
-    def callback(self, cdecl, python_callable=None, error=None, onerror=None):
+    def callback(self, cdecl, python_callable=None, error=None, onerror=None,
+                 compare=None, field=None, reverse=False):
         """Return a callback object or a decorator making such a
         callback object.  'cdecl' must name a C function pointer type.
         The callback invokes the specified 'python_callable' (which may
         be provided either directly or via a decorator).  Important: the
         callback object must be manually kept alive for as long as the
         callback may be invoked from the C level.
+
+        Alternatively, with 'compare=ctype', return a native comparison
+        function of type 'int(*)(T1 *, T2 *)' like the ones expected by
+        qsort().  It compares the two items of type 'ctype', or their
+        'field', without calling Python.  'reverse=True' sorts in
+        descending order.
         """
+        if compare is not None:
+            if (python_callable is not None or error is not None or
+                    onerror is not None):
+                raise TypeError("'compare' cannot be combined with "
+                                "'python_callable', 'error' or 'onerror'")
+            if isinstance(cdecl, basestring):
+                cdecl = self._typeof(cdecl, consider_function_as_funcptr=True)
+            if isinstance(compare, basestring):
+                compare = self._typeof(compare)
+            return self._backend.compare_callback(cdecl, compare, field,
+                                                  reverse)
+        if field is not None or reverse:
+            raise TypeError("'field' and 'reverse' require 'compare'")
         def callback_decorator_wrap(python_callable):
             if not callable(python_callable):
                 raise TypeError("the 'python_callable' argument "
@@ -652,7 +786,7 @@ class FFI(object):
         recompile(self, module_name, source,
                   c_file=filename, call_c_compiler=False, **kwds)
 
-    def compile(self, tmpdir='.', verbose=0, target=None):
+    def compile(self, tmpdir='.', verbose=0, target=None, cache_dir=None):
         """The 'target' argument gives the final file name of the
         compiled DLL.  Use '*' to force distutils' choice, suitable for
         regular CPython C API modules.  Use a file name ending in '.*'
@@ -661,6 +795,11 @@ class FFI(object):
 
         The default is '*' when building a non-embedded C API extension,
         and (module_name + '.*') when building an embedded library.
+
+        If 'cache_dir' is given (or the environment variable
+        CFFI_BUILD_CACHE_DIR is set), the compiled DLL is also stored
+        there, and is reused instead of compiling again if the sources,
+        the compiler, the options and the Python version are the same.
         """
         from .recompiler import recompile
         #
@@ -669,7 +808,7 @@ class FFI(object):
         module_name, source, source_extension, kwds = self._assigned_source
         return recompile(self, module_name, source, tmpdir=tmpdir,
                          target=target, source_extension=source_extension,
-                         compiler_verbose=verbose, **kwds)
+                         compiler_verbose=verbose, cache_dir=cache_dir, **kwds)
 
     def init_once(self, func, tag):
         # Read _init_once_cache[tag], which is either (False, lock) if
@@ -782,6 +921,14 @@ def _make_ffi_library(ffi, libname, flags):
         key = 'variable ' + name
         tp, _ = ffi._parser._declarations[key]
         BType = ffi._get_cached_btype(tp)
+        if hasattr(backendlib, 'load_variable_descr'):
+            # a descriptor implemented in C, which remembers the address
+            try:
+                descr = backendlib.load_variable_descr(BType, name)
+            except KeyError as e:
+                raise AttributeError('%s: %s' % (name, e))
+            setattr(FFILibrary, name, descr)
+            return
         read_variable = backendlib.read_variable
         write_variable = backendlib.write_variable
         setattr(FFILibrary, name, property(
@@ -832,10 +979,39 @@ def _make_ffi_library(ffi, libname, flags):
                     raise AttributeError(name)
             accessors[name](name)
     #
+    def preload():
+        import time
+        clock = getattr(time, 'perf_counter', time.time)
+        categories = {accessor_function: 'functions',
+                      accessor_variable: 'variables'}
+        report = {'missing': []}
+        with ffi._lock:
+            update_accessors()
+            items = list(accessors.items())
+            for category in ['functions', 'constants', 'variables']:
+                count = 0
+                t0 = clock()
+                for name, accessor in items:
+                    if categories.get(accessor, 'constants') != category:
+                        continue
+                    if (name not in library.__dict__ and
+                            name not in FFILibrary.__dict__):
+                        try:
+                            accessor(name)
+                        except (AttributeError, NotImplementedError):
+                            report['missing'].append(name)
+                            continue
+                    count += 1
+                report[category] = (count, clock() - t0)
+        report['missing'].sort()
+        return report
+    #
     class FFILibrary(object):
         def __getattr__(self, name):
             make_accessor(name)
             return getattr(self, name)
+        def __preload__(self):
+            return preload()
         def __setattr__(self, name, value):
             try:
                 property = getattr(self.__class__, name)
@@ -4,7 +4,8 @@ try:
     from . import _pycparser as pycparser
 except ImportError:
     import pycparser
-import weakref, re, sys
+import weakref, re, sys, os, hashlib, pickle
+from io import BytesIO
 
 try:
     if sys.version_info < (3,):
@@ -30,7 +31,9 @@ _r_stdcall1 = re.compile(r"\b(__stdcall|WINAPI)\b")
 _r_stdcall2 = re.compile(r"[(]\s*(__stdcall|WINAPI)\b")
 _r_cdecl = re.compile(r"\b__cdecl\b")
 _r_extern_python = re.compile(r'\bextern\s*"'
-                              r'(Python|Python\s*\+\s*C|C\s*\+\s*Python)"\s*.')
+                              r'(Python|Python\s*\+\s*C|C\s*\+\s*Python|'
+                              r'Python\s+batch\s*\(\s*(\d+)\s*'
+                              r'(?:,\s*(\d+)\s*)?\))"\s*.')
 _r_star_const_space = re.compile(       # matches "* const "
     r"[*]\s*((const|volatile|restrict)\b\s*)+")
 
@@ -40,6 +43,30 @@ def _get_parser():
         _parser_cache = pycparser.CParser()
     return _parser_cache
 
+def _parse_with_typedef_names(csource, typenames):
+    # Parse 'csource' with pycparser, knowing that all names in the dict
+    # 'typenames' are typedefs.  This pokes into the internals of
+    # CParser: we do what CParser.parse() does, but we start with these
+    # names already in the outermost scope, instead of parsing a line
+    # 'typedef int NAME;' for each of them.  Returns None if the
+    # internals of this version of pycparser are not the expected ones.
+    parser = _get_parser()
+    try:
+        clex = parser.clex
+        yacc_parser = parser.cparser
+        parser._scope_stack
+        parser._last_yielded_token
+    except AttributeError:
+        return None
+    clex.filename = ''
+    clex.reset_lineno()
+    parser._scope_stack = [typenames]
+    parser._last_yielded_token = None
+    try:
+        return yacc_parser.parse(input=csource, lexer=clex, debug=0)
+    finally:
+        parser._scope_stack = [dict()]
+
 def _workaround_for_old_pycparser(csource):
     # Workaround for a pycparser issue (fixed between pycparser 2.10 and
     # 2.14): "char*const***" gives us a wrong syntax tree, the same as
@@ -95,6 +122,12 @@ def _preprocess_extern_python(csource):
     #     void __cffi_extern_python_plus_c_start;
     #     int foo(int);
     #     void __cffi_extern_python_stop;
+    #
+    # input: `extern "Python batch(100, 20)" void foo(int *, size_t);`
+    # output:
+    #     void __cffi_extern_python_batch_100_20_start;
+    #     void foo(int *, size_t);
+    #     void __cffi_extern_python_stop;
     parts = []
     while True:
         match = _r_extern_python.search(csource)
@@ -105,7 +138,15 @@ def _preprocess_extern_python(csource):
         #print ''.join(parts)+csource
         #print '=>'
         parts.append(csource[:match.start()])
-        if 'C' in match.group(1):
+        if match.group(2) is not None:
+            max_items = int(match.group(2))
+            max_delay = int(match.group(3) or '0')
+            if max_items <= 0:
+                raise api.CDefError("'extern \"Python batch(%d)\"': the "
+                                    "batch size must be positive" % max_items)
+            parts.append('void __cffi_extern_python_batch_%d_%d_start; ' % (
+                max_items, max_delay))
+        elif 'C' in match.group(1):
             parts.append('void __cffi_extern_python_plus_c_start; ')
         else:
             parts.append('void __cffi_extern_python_start; ')
@@ -223,6 +264,406 @@ def _common_type_names(csource):
     return words_used
 
 
+_r_fast_token = re.compile(r"([A-Za-z_]\w*)|([0-9]\w*)|(\n)|(\S)")
+_r_fast_int = re.compile(r"[1-9][0-9]*$|0[0-7]*$|0[xX][0-9a-fA-F]+$")
+_FAST_QUALIFIERS = ('const', 'volatile', 'restrict')
+_FAST_PRIMITIVE_WORDS = ('void', 'char', 'short', 'int', 'long', 'float',
+                         'double', 'signed', 'unsigned', '_Bool')
+_C_KEYWORDS = set('''auto break case char const continue default do double
+    else enum extern float for goto if inline int long offsetof register
+    restrict return short signed sizeof static struct switch typedef union
+    unsigned void volatile while _Bool _Complex _Noreturn _Thread_local
+    _Static_assert _Alignas _Alignof _Atomic __int128 _Pragma'''.split())
+
+
+# the fields of the pycparser nodes that _FastParser builds; if the
+# installed pycparser has different ones, _FastParser is not used
+_FAST_NODE_FIELDS = {
+    'FileAST': ('ext',),
+    'Decl': ('name', 'quals', 'storage', 'funcspec', 'type', 'init',
+             'bitsize'),
+    'Typedef': ('name', 'quals', 'storage', 'type'),
+    'Typename': ('name', 'quals', 'type'),
+    'TypeDecl': ('declname', 'quals', 'type'),
+    'PtrDecl': ('quals', 'type'),
+    'ArrayDecl': ('type', 'dim', 'dim_quals'),
+    'FuncDecl': ('args', 'type'),
+    'ParamList': ('params',),
+    'IdentifierType': ('names',),
+    'Struct': ('name', 'decls'),
+    'Union': ('name', 'decls'),
+    'Enum': ('name', 'values'),
+    'EnumeratorList': ('enumerators',),
+    'Enumerator': ('name', 'value'),
+    'UnaryOp': ('op', 'expr'),
+    'Constant': ('type', 'value'),
+    'ID': ('name',),
+}
+_fast_parser_usable = None
+
+def _check_fast_parser_usable():
+    global _fast_parser_usable
+    if _fast_parser_usable is None:
+        c_ast = pycparser.c_ast
+        usable = True
+        for name, fields in _FAST_NODE_FIELDS.items():
+            slots = getattr(getattr(c_ast, name, None), '__slots__', ())
+            slots = tuple([slot for slot in slots
+                           if slot not in ('coord', '__weakref__')])
+            if slots != fields:
+                usable = False
+                break
+        _fast_parser_usable = usable
+    return _fast_parser_usable
+
+
+class _FastParserGiveUp(Exception):
+    pass
+
+
+class _FastParser(object):
+    """A hand-written parser for the most common subset of what can
+    appear in cdef(): function prototypes, global variables, typedefs,
+    structs, unions and enums made of simple types, possibly with
+    pointers, arrays and function pointers.  It builds the same AST as
+    pycparser would, much faster.  For anything else, parse() returns
+    None and the caller must use pycparser.
+    """
+
+    def __init__(self, typenames):
+        self.typenames = typenames   # {name: True} for the known typedefs
+        self.scope = {}              # names declared in the source so far
+
+    def parse(self, csource):
+        try:
+            self.tokens = self._tokenize(csource)
+            self.pos = 0
+            ext = []
+            while self.tokens[self.pos][0] is not None:
+                ext.extend(self._parse_declaration())
+            return pycparser.c_ast.FileAST(ext=ext)
+        except _FastParserGiveUp:
+            return None
+
+    def _tokenize(self, csource):
+        Coord = pycparser.plyparser.Coord
+        tokens = []
+        coord = Coord('', 1)
+        for match in _r_fast_token.finditer(csource):
+            name, number, newline, op = match.groups()
+            if newline:
+                coord = Coord('', coord.line + 1)
+            elif name:
+                tokens.append((name, 'id', coord))
+            elif number:
+                if not _r_fast_int.match(number):
+                    raise _FastParserGiveUp
+                tokens.append((number, 'int', coord))
+            else:
+                if op not in ';,*()[]{}=-:':
+                    raise _FastParserGiveUp
+                tokens.append((op, 'op', coord))
+        tokens.append((None, None, coord))
+        return tokens
+
+    def _next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _peek(self):
+        return self.tokens[self.pos][0]
+
+    def _expect(self, value):
+        if self._next()[0] != value:
+            raise _FastParserGiveUp
+
+    def _is_typedef_name(self, name):
+        try:
+            return self.scope[name]
+        except KeyError:
+            return self.typenames.get(name, False)
+
+    def _parse_name(self, token):
+        # a name that is declared: it cannot be a keyword or a typedef
+        name, kind, coord = token
+        if kind != 'id' or name in _C_KEYWORDS or self._is_typedef_name(name):
+            raise _FastParserGiveUp
+        return name
+
+    def _parse_declaration(self):
+        c_ast = pycparser.c_ast
+        storage = []
+        if self._peek() in ('typedef', 'extern', 'static'):
+            storage.append(self._next()[0])
+        quals, type = self._parse_specifiers()
+        if self._peek() == ';':
+            self._next()
+            if storage or not isinstance(type, (c_ast.Struct, c_ast.Union,
+                                                c_ast.Enum)):
+                raise _FastParserGiveUp
+            return [c_ast.Decl(name=None, quals=quals, storage=storage,
+                               funcspec=[], type=type, init=None,
+                               bitsize=None, coord=type.coord)]
+        result = []
+        while True:
+            node, name = self._parse_declarator(quals, type)
+            coord = node.coord
+            if name is None:
+                raise _FastParserGiveUp
+            if storage == ['typedef']:
+                if self.scope.get(name, True) is False:
+                    raise _FastParserGiveUp
+                self.scope[name] = True
+                result.append(c_ast.Typedef(name=name, quals=quals,
+                                            storage=storage, type=node,
+                                            coord=coord))
+            else:
+                init = None
+                if self._peek() == '=':
+                    self._next()
+                    init = self._parse_expression(allow_id=False)
+                self.scope[name] = False
+                result.append(c_ast.Decl(name=name, quals=quals,
+                                         storage=storage, funcspec=[],
+                                         type=node, init=init, bitsize=None,
+                                         coord=coord))
+            token = self._next()[0]
+            if token == ';':
+                return result
+            if token != ',':
+                raise _FastParserGiveUp
+
+    def _parse_specifiers(self):
+        c_ast = pycparser.c_ast
+        quals = []
+        names = []
+        type = None
+        coord = self.tokens[self.pos][2]
+        while True:
+            token, kind, tcoord = self.tokens[self.pos]
+            if token in _FAST_QUALIFIERS:
+                if token in quals:
+                    raise _FastParserGiveUp
+                quals.append(token)
+            elif type is not None:
+                break
+            elif token in _FAST_PRIMITIVE_WORDS:
+                if names and self._is_typedef_name(names[0]):
+                    raise _FastParserGiveUp
+                names.append(token)
+            elif token in ('struct', 'union', 'enum'):
+                if names:
+                    raise _FastParserGiveUp
+                type = self._parse_struct_union_enum()
+                continue
+            elif (kind == 'id' and token not in _C_KEYWORDS and
+                      self._is_typedef_name(token)):
+                if names:
+                    raise _FastParserGiveUp
+                names.append(token)
+            else:
+                break
+            self.pos += 1
+        if type is None:
+            if not names:
+                raise _FastParserGiveUp
+            type = c_ast.IdentifierType(names=names, coord=coord)
+        return quals, type
+
+    def _parse_struct_union_enum(self):
+        c_ast = pycparser.c_ast
+        # the coords are the same as pycparser's: the name if any, or
+        # else the '{' for structs and unions and the keyword for enums
+        kind, _, coord = self._next()
+        name = None
+        if self.tokens[self.pos][1] == 'id':
+            name, _, coord = self._next()
+            if name in _C_KEYWORDS:
+                raise _FastParserGiveUp
+        elif kind != 'enum':
+            coord = self.tokens[self.pos][2]
+        if self._peek() != '{':
+            if name is None:
+                raise _FastParserGiveUp
+            if kind == 'enum':
+                return c_ast.Enum(name=name, values=None, coord=coord)
+            if kind == 'struct':
+                return c_ast.Struct(name=name, decls=None, coord=coord)
+            return c_ast.Union(name=name, decls=None, coord=coord)
+        self._next()
+        if kind == 'enum':
+            values = self._parse_enumerators()
+            return c_ast.Enum(name=name, values=values, coord=coord)
+        decls = []
+        while self._peek() != '}':
+            decls.extend(self._parse_fields())
+        self._next()
+        if not decls:
+            raise _FastParserGiveUp
+        if kind == 'struct':
+            return c_ast.Struct(name=name, decls=decls, coord=coord)
+        return c_ast.Union(name=name, decls=decls, coord=coord)
+
+    def _parse_fields(self):
+        c_ast = pycparser.c_ast
+        quals, type = self._parse_specifiers()
+        if (self._peek() == ';' and not quals and
+                isinstance(type, c_ast.IdentifierType) and
+                type.names == ['__dotdotdot__']):
+            self._next()     # "...;" in a partial struct
+            return [c_ast.Decl(name=None, quals=[], storage=[], funcspec=[],
+                               type=type, init=None, bitsize=None,
+                               coord=type.coord)]
+        result = []
+        while True:
+            node, name = self._parse_declarator(quals, type)
+            coord = node.coord
+            if name is None:
+                raise _FastParserGiveUp
+            bitsize = None
+            if self._peek() == ':':
+                self._next()
+                bitsize = self._parse_expression(allow_id=False)
+            result.append(c_ast.Decl(name=name, quals=quals, storage=[],
+                                     funcspec=[], type=node, init=None,
+                                     bitsize=bitsize, coord=coord))
+            token = self._next()[0]
+            if token == ';':
+                return result
+            if token != ',':
+                raise _FastParserGiveUp
+
+    def _parse_enumerators(self):
+        c_ast = pycparser.c_ast
+        enumerators = []
+        coord = self.tokens[self.pos][2]
+        while True:
+            token = self._next()
+            name = self._parse_name(token)
+            value = None
+            if self._peek() == '=':
+                self._next()
+                value = self._parse_expression(allow_id=True)
+            self.scope[name] = False
+            enumerators.append(c_ast.Enumerator(name=name, value=value,
+                                                coord=token[2]))
+            token = self._next()[0]
+            if token == ',' and self._peek() == '}':
+                token = self._next()[0]
+            if token == '}':
+                return c_ast.EnumeratorList(enumerators=enumerators,
+                                            coord=coord)
+            if token != ',':
+                raise _FastParserGiveUp
+
+    def _parse_expression(self, allow_id):
+        # only "NUMBER", "-NUMBER", and "NAME" if 'allow_id'
+        c_ast = pycparser.c_ast
+        token, kind, coord = self._next()
+        if token == '-':
+            operand = self._parse_expression(False)
+            return c_ast.UnaryOp(op='-', expr=operand, coord=operand.coord)
+        if kind == 'int':
+            return c_ast.Constant(type='int', value=token, coord=coord)
+        if allow_id and kind == 'id' and token not in _C_KEYWORDS:
+            if self._is_typedef_name(token):
+                raise _FastParserGiveUp
+            return c_ast.ID(name=token, coord=coord)
+        raise _FastParserGiveUp
+
+    def _parse_declarator(self, quals, type, abstract=False):
+        # Supports "* ... NAME [N]..." and "* ... NAME(params)" and
+        # "* ... (* NAME)(params)", where NAME is optional if 'abstract'.
+        c_ast = pycparser.c_ast
+        pointers = []
+        while self._peek() == '*':
+            coord = self._next()[2]
+            ptrquals = []
+            while self._peek() in _FAST_QUALIFIERS:
+                ptrquals.append(self._next()[0])
+            pointers.append((ptrquals, coord))
+        funcptr = None
+        if self._peek() == '(':
+            self._next()
+            coord = self.tokens[self.pos][2]
+            self._expect('*')
+            funcptrquals = []
+            while self._peek() in _FAST_QUALIFIERS:
+                funcptrquals.append(self._next()[0])
+            funcptr = (funcptrquals, coord)
+        name = None
+        coord = None     # like pycparser, no coord for unnamed parameters
+        if self.tokens[self.pos][1] == 'id':
+            coord = self.tokens[self.pos][2]
+            name = self._parse_name(self._next())
+        elif not abstract:
+            raise _FastParserGiveUp
+        node = c_ast.TypeDecl(declname=name, quals=quals, type=type,
+                              coord=coord)
+        for ptrquals, ptrcoord in pointers:
+            node = c_ast.PtrDecl(quals=ptrquals, type=node, coord=ptrcoord)
+        if funcptr is not None:
+            self._expect(')')
+            if self._peek() != '(':
+                raise _FastParserGiveUp
+        if self._peek() == '(':
+            self._next()
+            if name is None and funcptr is None:
+                raise _FastParserGiveUp
+            if funcptr is not None:
+                node = c_ast.FuncDecl(args=self._parse_parameters(),
+                                      type=node, coord=funcptr[1])
+                node = c_ast.PtrDecl(quals=funcptr[0], type=node,
+                                     coord=funcptr[1])
+            else:
+                node = c_ast.FuncDecl(args=self._parse_parameters(),
+                                      type=node, coord=coord)
+        else:
+            dims = []
+            while self._peek() == '[':
+                if coord is None:
+                    coord = self._next()[2]
+                else:
+                    self._next()
+                if self._peek() == ']':
+                    dims.append(None)
+                else:
+                    dims.append(self._parse_expression(allow_id=True))
+                self._expect(']')
+            for dim in reversed(dims):
+                node = c_ast.ArrayDecl(type=node, dim=dim, dim_quals=[],
+                                       coord=coord)
+        if self._peek() in ('(', '['):
+            raise _FastParserGiveUp
+        return node, name
+
+    def _parse_parameters(self):
+        Coord = pycparser.plyparser.Coord
+        c_ast = pycparser.c_ast
+        if self._peek() == ')':
+            self._next()
+            return None
+        params = []
+        while True:
+            quals, type = self._parse_specifiers()
+            node, name = self._parse_declarator(quals, type, abstract=True)
+            if name is None:
+                params.append(c_ast.Typename(name=None, quals=quals,
+                                             type=node, coord=Coord('', 0)))
+            else:
+                params.append(c_ast.Decl(name=name, quals=quals, storage=[],
+                                         funcspec=[], type=node, init=None,
+                                         bitsize=None, coord=node.coord))
+            token = self._next()[0]
+            if token == ')':
+                return c_ast.ParamList(params=params,
+                                       coord=params[0].coord)
+            if token != ',':
+                raise _FastParserGiveUp
+
+
+
 class Parser(object):
 
     def __init__(self):
@@ -234,30 +675,40 @@ class Parser(object):
         self._int_constants = {}
         self._recomplete = []
         self._uses_new_feature = None
+        self._typedef_names = {}    # {name: True} for the typedefs so far
+        self._extern_python_batches = {}  # {name: (max_items, max_delay,
+                                          #         dllexport)}
 
     def _parse(self, csource):
         csource, macros = _preprocess(csource)
-        # XXX: for more efficiency we would need to poke into the
-        # internals of CParser...  the following registers the
-        # typedefs, because their presence or absence influences the
-        # parsing itself (but what they are typedef'ed to plays no role)
-        ctn = _common_type_names(csource)
-        typenames = []
-        for name in sorted(self._declarations):
-            if name.startswith('typedef '):
-                name = name[8:]
-                typenames.append(name)
-                ctn.discard(name)
-        typenames += sorted(ctn)
+        # The typedefs must be registered, because their presence or
+        # absence influences the parsing itself (but what they are
+        # typedef'ed to plays no role).  We give the names directly to
+        # pycparser, so that the cost of parsing does not grow with the
+        # number of typedefs already declared.
+        typenames = self._typedef_names.copy()
+        for name in _common_type_names(csource):
+            typenames[name] = True
+        #
+        csource = 'typedef int __dotdotdot__;\n' + csource
+        # most sources can be parsed without pycparser
+        if (self._options.get('fast_parser', True) and
+                _check_fast_parser_usable()):
+            ast = _FastParser(typenames).parse(csource)
+            if ast is not None:
+                return ast, macros, csource
         #
-        csourcelines = ['typedef int %s;' % typename for typename in typenames]
-        csourcelines.append('typedef int __dotdotdot__;')
-        csourcelines.append(csource)
-        csource = '\n'.join(csourcelines)
         if lock is not None:
             lock.acquire()     # pycparser is not thread-safe...
         try:
-            ast = _get_parser().parse(csource)
+            ast = _parse_with_typedef_names(csource, typenames)
+            if ast is None:
+                # fall-back: declare the typedefs with 'typedef int X;'
+                csourcelines = ['typedef int %s;' % typename
+                                for typename in sorted(typenames)]
+                csourcelines.append(csource)
+                csource = '\n'.join(csourcelines)
+                ast = _get_parser().parse(csource)
         except pycparser.c_parser.ParseError as e:
             self.convert_pycparser_error(e, csource)
         finally:
@@ -290,13 +741,18 @@ class Parser(object):
             msg = 'parse error\n%s' % (msg,)
         raise api.CDefError(msg)
 
-    def parse(self, csource, override=False, packed=False, dllexport=False):
+    def parse(self, csource, override=False, packed=False, dllexport=False,
+              cache_dir=None, fast_parser=True):
         prev_options = self._options
         try:
             self._options = {'override': override,
                              'packed': packed,
-                             'dllexport': dllexport}
-            self._internal_parse(csource)
+                             'dllexport': dllexport,
+                             'fast_parser': fast_parser}
+            if cache_dir is None:
+                self._internal_parse(csource)
+            else:
+                CdefCache(self, cache_dir).parse(csource)
         finally:
             self._options = prev_options
 
@@ -384,7 +840,11 @@ class Parser(object):
 
     def _declare_function(self, tp, quals, decl):
         tp = self._get_type_pointer(tp, quals)
-        if self._options.get('dllexport'):
+        if self._inside_extern_python.startswith(
+                '__cffi_extern_python_batch_'):
+            tag = 'extern_python_batch '
+            self._declare_extern_python_batch(tp, decl.name)
+        elif self._options.get('dllexport'):
             tag = 'dllexport_python '
         elif self._inside_extern_python == '__cffi_extern_python_start':
             tag = 'extern_python '
@@ -394,6 +854,22 @@ class Parser(object):
             tag = 'function '
         self._declare(tag + decl.name, tp)
 
+    def _declare_extern_python_batch(self, tp, name):
+        # 'extern "Python batch(N, D)" void f(T *items, size_t count);'
+        if (not isinstance(tp.result, model.VoidType) or
+                len(tp.args) != 2 or tp.ellipsis or
+                not isinstance(tp.args[0], model.PointerType) or
+                isinstance(tp.args[0].totype, (model.VoidType,
+                                               model.ArrayType,
+                                               model.RawFunctionType)) or
+                not tp.args[1].is_integer_type()):
+            raise api.CDefError(
+                "'extern \"Python batch\"' function %s() must have the "
+                "type 'void(T *items, size_t count)'" % (name,))
+        max_items, max_delay = self._inside_extern_python.split('_')[-3:-1]
+        self._extern_python_batches[name] = (
+            int(max_items), int(max_delay), bool(self._options.get('dllexport')))
+
     def _parse_decl(self, decl):
         node = decl.type
         if isinstance(node, pycparser.c_ast.FuncDecl):
@@ -466,6 +942,8 @@ class Parser(object):
                     "try cdef(xx, override=True))" % (name,))
         assert '__dotdotdot__' not in name.split()
         self._declarations[name] = (obj, quals)
+        if name.startswith('typedef '):
+            self._typedef_names[name[8:]] = True
         if included:
             self._included_declarations.add(obj)
 
@@ -847,3 +1325,176 @@ class Parser(object):
                 ' '.join(typenames[:-1]), decl.name)
 
         return result
+
+
+def _reachable_by_identity(declarations):
+    # Return the list of the struct/union/enum types reachable from the
+    # given declarations, in an order that only depends on them.
+    result = []
+    seen = set()
+    def walk(tp):
+        if isinstance(tp, tuple):
+            for x in tp:
+                walk(x)
+        elif isinstance(tp, model.BaseType):
+            for name, value in tp._get_items():
+                walk(value)
+        elif isinstance(tp, model.BaseTypeByIdentity):
+            if id(tp) not in seen:
+                seen.add(id(tp))
+                result.append(tp)
+                walk(getattr(tp, 'fldtypes', None) or ())
+    for name in sorted(declarations):
+        walk(declarations[name][0])
+    return result
+
+
+class CdefCache(object):
+    """On-disk cache of the result of Parser.parse().
+
+    The key of an entry is a hash of the C source, of the options and of
+    the declarations already known by the parser.  The entry contains the
+    declarations and the integer constants that parsing added, pickled
+    with references to the objects that existed before, and the changes
+    done to these objects (e.g. an opaque struct that gets its fields).
+    """
+
+    def __init__(self, parser, cache_dir):
+        self.parser = parser
+        self.cache_dir = cache_dir
+        self.old_objects = _reachable_by_identity(parser._declarations)
+
+    def _compute_key(self, csource):
+        from . import __version__
+        parser = self.parser
+        parts = [__version__, sys.version_info[:2], pycparser.__version__,
+                 sorted(parser._options.items()), csource,
+                 parser._anonymous_counter,
+                 parser._uses_new_feature is None,
+                 sorted(parser._int_constants.items())]
+        for name in sorted(parser._declarations):
+            obj, quals = parser._declarations[name]
+            if isinstance(obj, model.BaseTypeByIdentity):
+                obj = (type(obj).__name__, obj._get_c_name())
+            parts.append((name, obj, quals))
+        for tp in self.old_objects:
+            parts.append((type(tp).__name__, tp._get_c_name(),
+                          getattr(tp, 'fldnames', None) is None,
+                          getattr(tp, 'partial', False)))
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def _persistent_ids(self, old_declarations):
+        from .commontypes import _CACHE
+        ids = {}
+        for key, (tp, quals) in _CACHE.items():
+            ids[id(tp)] = ('common', key)
+        for name, (obj, quals) in old_declarations.items():
+            ids[id(obj)] = ('decl', name)
+        for i, tp in enumerate(self.old_objects):
+            ids[id(tp)] = ('old', i)
+        return ids
+
+    def _resolve_persistent_id(self, pid):
+        kind, key = pid
+        if kind == 'common':
+            from .commontypes import resolve_common_type
+            return resolve_common_type(self.parser, key)[0]
+        if kind == 'decl':
+            return self.parser._declarations[key][0]
+        return self.old_objects[key]
+
+    def parse(self, csource):
+        parser = self.parser
+        filename = os.path.join(self.cache_dir,
+                                'cdef-%s.pickle' % self._compute_key(csource))
+        try:
+            with open(filename, 'rb') as f:
+                data = f.read()
+        except IOError:
+            pass
+        else:
+            try:
+                entry = self._load(data)
+            except Exception:
+                pass      # corrupted or outdated entry: parse again
+            else:
+                self._apply(entry)
+                return
+        #
+        old_declarations = parser._declarations.copy()
+        old_int_constants = parser._int_constants.copy()
+        old_batches = parser._extern_python_batches.copy()
+        old_dicts = [tp.__dict__.copy() for tp in self.old_objects]
+        old_recomplete = len(parser._recomplete)
+        #
+        parser._internal_parse(csource)
+        #
+        declarations = []
+        for name, (obj, quals) in parser._declarations.items():
+            prev = old_declarations.get(name)
+            if prev is None or prev[0] is not obj or prev[1] != quals:
+                declarations.append((name, obj, quals))
+        int_constants = [(key, value)
+                         for key, value in parser._int_constants.items()
+                         if key not in old_int_constants]
+        batches = [(key, value)
+                   for key, value in parser._extern_python_batches.items()
+                   if old_batches.get(key) != value]
+        changes = []
+        for i, tp in enumerate(self.old_objects):
+            d = dict([(key, value) for key, value in tp.__dict__.items()
+                      if key != 'completed' and
+                         (key not in old_dicts[i] or
+                          old_dicts[i][key] is not value)])
+            if d:
+                changes.append((i, d))
+        recomplete = [self.old_objects.index(tp)
+                      for tp in parser._recomplete[old_recomplete:]]
+        entry = (declarations, int_constants, changes, recomplete,
+                 parser._anonymous_counter, parser._uses_new_feature, batches)
+        self._store(filename, entry, self._persistent_ids(old_declarations))
+
+    def _store(self, filename, entry, ids):
+        f = BytesIO()
+        pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: ids.get(id(obj))
+        try:
+            pickler.dump(entry)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        # write to a temporary file and rename it, in case several
+        # processes fill the cache at the same time
+        tmpname = '%s.%d.tmp' % (filename, os.getpid())
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            with open(tmpname, 'wb') as g:
+                g.write(f.getvalue())
+            os.rename(tmpname, filename)
+        except (IOError, OSError):
+            pass     # the cache is only an optimization
+
+    def _load(self, data):
+        unpickler = pickle.Unpickler(BytesIO(data))
+        unpickler.persistent_load = self._resolve_persistent_id
+        return unpickler.load()
+
+    def _apply(self, entry):
+        (declarations, int_constants, changes, recomplete,
+         anonymous_counter, uses_new_feature, batches) = entry
+        parser = self.parser
+        for name, obj, quals in declarations:
+            parser._declarations[name] = (obj, quals)
+            if name.startswith('typedef '):
+                parser._typedef_names[name[8:]] = True
+        parser._int_constants.update(int_constants)
+        parser._extern_python_batches.update(batches)
+        for i, d in changes:
+            self.old_objects[i].__dict__.update(d)
+        for i in recomplete:
+            tp = self.old_objects[i]
+            if tp.completed:    # must be re-completed, as in Parser
+                tp.completed = 0
+                parser._recomplete.append(tp)
+        parser._anonymous_counter = anonymous_counter
+        parser._uses_new_feature = uses_new_feature
@@ -1,4 +1,5 @@
 import sys, os
+from .lock import allocate_lock
 
 
 class VerificationError(Exception):
@@ -14,6 +15,8 @@ class VerificationMissing(Exception):
 LIST_OF_FILE_NAMES = ['sources', 'include_dirs', 'library_dirs',
                       'extra_objects', 'depends']
 
+DEFAULT_BUILD_CACHE_SIZE = 256 * 1024 * 1024     # bytes
+
 def get_extension(srcfilename, modname, sources=(), **kwds):
     from distutils.core import Extension
     allsources = [srcfilename]
@@ -21,12 +24,18 @@ def get_extension(srcfilename, modname, sources=(), **kwds):
         allsources.append(os.path.normpath(src))
     return Extension(name=modname, sources=allsources, **kwds)
 
-def compile(tmpdir, ext, compiler_verbose=0):
-    """Compile a C extension module using distutils."""
+def compile(tmpdir, ext, compiler_verbose=0, cache_dir=None,
+            cache_size=DEFAULT_BUILD_CACHE_SIZE, shards=1):
+    """Compile a C extension module using distutils.  If 'cache_dir' is
+    given, a module compiled earlier from the same sources with the same
+    compiler and options is copied from there instead of compiled again.
+    If 'shards' > 1, the C files are compiled concurrently.
+    """
 
     saved_environ = os.environ.copy()
     try:
-        outputfilename = _build(tmpdir, ext, compiler_verbose)
+        outputfilename = _build(tmpdir, ext, compiler_verbose,
+                                cache_dir, cache_size, shards)
         outputfilename = os.path.abspath(outputfilename)
     finally:
         # workaround for a distutils bugs where some env vars can
@@ -36,7 +45,8 @@ def compile(tmpdir, ext, compiler_verbose=0):
                 os.environ[key] = value
     return outputfilename
 
-def _build(tmpdir, ext, compiler_verbose=0):
+def _build(tmpdir, ext, compiler_verbose=0, cache_dir=None,
+           cache_size=DEFAULT_BUILD_CACHE_SIZE, shards=1):
     # XXX compact but horrible :-(
     from distutils.core import Distribution
     import distutils.errors, distutils.log
@@ -52,9 +62,24 @@ def _build(tmpdir, ext, compiler_verbose=0):
         old_level = distutils.log.set_threshold(0) or 0
         try:
             distutils.log.set_verbosity(compiler_verbose)
-            dist.run_command('build_ext')
             cmd_obj = dist.get_command_obj('build_ext')
+            if shards > 1:
+                _compile_sources_concurrently(cmd_obj)
+            key = None
+            if cache_dir is not None:
+                cmd_obj.ensure_finalized()
+                soname = cmd_obj.get_ext_fullpath(ext.name)
+                key = _build_cache_key(ext, options, soname, cmd_obj,
+                                       tmpdir)
+                if key is not None and _build_cache_fetch(cache_dir, key,
+                                                          soname):
+                    distutils.log.info("%s: reused from the build cache %s"
+                                       % (soname, cache_dir))
+                    return soname
+            dist.run_command('build_ext')
             [soname] = cmd_obj.get_outputs()
+            if key is not None:
+                _build_cache_store(cache_dir, key, soname, cache_size)
         finally:
             distutils.log.set_threshold(old_level)
     except (distutils.errors.CompileError,
@@ -63,6 +88,221 @@ def _build(tmpdir, ext, compiler_verbose=0):
     #
     return soname
 
+def _compile_sources_concurrently(cmd_obj):
+    build_extensions = cmd_obj.build_extensions
+    def build_extensions_concurrently():
+        use_concurrent_compile(cmd_obj.compiler)
+        build_extensions()
+    cmd_obj.build_extensions = build_extensions_concurrently
+
+def use_concurrent_compile(compiler):
+    """Make the distutils 'compiler' compile the C files of an extension
+    concurrently, instead of one after the other.  This is useful for
+    modules split in several C files with set_source(..., shards=N).
+    All the compilers patched this way share the same pool of threads,
+    with one thread per CPU, even if several extensions are themselves
+    built concurrently (see setuptools_ext)."""
+    from distutils.ccompiler import CCompiler
+    import types
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+    except ImportError:
+        return
+    if type(compiler).compile is not CCompiler.compile:
+        return     # e.g. MSVCCompiler, which has its own compile()
+    if 'compile' in compiler.__dict__:
+        return     # already done
+    compiler.compile = types.MethodType(_concurrent_compile, compiler)
+
+_compile_executor = None
+_compile_executor_lock = allocate_lock()
+
+def _get_compile_executor():
+    global _compile_executor
+    from concurrent.futures import ThreadPoolExecutor
+    import multiprocessing
+    with _compile_executor_lock:
+        if _compile_executor is None:
+            _compile_executor = ThreadPoolExecutor(
+                multiprocessing.cpu_count())
+        return _compile_executor
+
+def _concurrent_compile(self, sources, *args, **kwds):
+    # calls the regular CCompiler.compile() once per C file, from the
+    # threads of the shared pool; the calling thread only waits
+    from distutils.ccompiler import CCompiler
+    def compile_one(source):
+        return CCompiler.compile(self, [source], *args, **kwds)
+    executor = _get_compile_executor()
+    objects = []
+    # list(): wait for all, and raise the first error in order
+    for objs in list(executor.map(compile_one, sources)):
+        objects.extend(objs)
+    return objects
+
+# ____________________________________________________________
+# The build cache: compiled modules stored under a hash of everything
+# that goes into the compilation.  The headers are taken into account by
+# hashing the output of the preprocessor; if the compiler cannot
+# preprocess, only the headers listed in 'depends' are.
+
+_BUILD_CACHE_ENVIRON = ('CC', 'CXX', 'CPP', 'CFLAGS', 'CPPFLAGS', 'LDFLAGS',
+                        'LDSHARED', 'AR', 'ARFLAGS', 'ARCHFLAGS')
+_BUILD_CACHE_CONFIG_VARS = ('CC', 'CXX', 'CFLAGS', 'CCSHARED', 'LDSHARED',
+                            'OPT', 'SOABI', 'EXT_SUFFIX', 'SO')
+
+def _build_cache_key(ext, options, soname, cmd_obj, tmpdir):
+    import hashlib
+    from distutils import sysconfig
+    from distutils.spawn import find_executable
+    from . import __version__
+    parts = [__version__, sys.version, sys.platform,
+             os.path.basename(soname), sorted(options.items()),
+             sysconfig.get_config_vars(*_BUILD_CACHE_CONFIG_VARS),
+             [os.environ.get(key) for key in _BUILD_CACHE_ENVIRON]]
+    # the compiler itself: a new version would produce different code
+    cc = os.environ.get('CC') or sysconfig.get_config_var('CC') or 'cc'
+    cc = find_executable(cc.split()[0]) if cc.split() else None
+    if cc is not None:
+        st = os.stat(cc)
+        parts.append((cc, st.st_size, st.st_mtime))
+    for name, value in sorted(ext.__dict__.items()):
+        parts.append((name, value))
+        if name in ('sources', 'depends', 'extra_objects'):
+            for filename in value:
+                try:
+                    with open(filename, 'rb') as f:
+                        parts.append(hashlib.sha1(f.read()).hexdigest())
+                except IOError:
+                    return None     # let distutils report the error
+    # the headers found in 'include_dirs' and the libraries found in
+    # 'library_dirs', which may change without anything above changing
+    compiler = _build_cache_compiler(cmd_obj)
+    for filename in ext.sources:
+        digest = _build_cache_preprocess(compiler, ext, filename, tmpdir)
+        if digest is None:
+            if ext.include_dirs and not ext.depends:
+                return None     # the headers would be ignored: don't cache
+            break
+        parts.append(digest)
+    library_dirs = list(ext.library_dirs) + list(cmd_obj.library_dirs or ())
+    for lib in ext.libraries:
+        filename = compiler.find_library_file(library_dirs, lib)
+        if filename is not None:
+            with open(filename, 'rb') as f:
+                parts.append((filename, hashlib.sha1(f.read()).hexdigest()))
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+def _build_cache_compiler(cmd_obj):
+    # a compiler configured like the one build_ext.run() will create
+    from distutils.ccompiler import new_compiler
+    from distutils.sysconfig import customize_compiler
+    compiler = new_compiler(compiler=cmd_obj.compiler, force=True)
+    customize_compiler(compiler)
+    if cmd_obj.include_dirs is not None:
+        compiler.set_include_dirs(cmd_obj.include_dirs)
+    for name, value in cmd_obj.define or ():
+        compiler.define_macro(name, value)
+    for macro in cmd_obj.undef or ():
+        compiler.undefine_macro(macro)
+    return compiler
+
+def _build_cache_preprocess(compiler, ext, filename, tmpdir):
+    """Return a hash of the preprocessed 'filename', or None if the
+    compiler cannot preprocess it (e.g. MSVCCompiler)."""
+    import hashlib, tempfile
+    import distutils.errors
+    macros = ext.define_macros + [(undef,) for undef in ext.undef_macros]
+    # a unique file: several threads may compile in the same 'tmpdir'
+    fd, outputname = tempfile.mkstemp(suffix='.i', prefix='_cffi_build_cache_',
+                                      dir=tmpdir)
+    try:
+        os.close(fd)
+        compiler.preprocess(filename, outputname, macros=macros,
+                            include_dirs=ext.include_dirs,
+                            extra_postargs=ext.extra_compile_args)
+        with open(outputname, 'rb') as f:
+            data = f.read()
+        if not data:
+            return None    # nothing was written (e.g. MSVCCompiler)
+        return hashlib.sha1(data).hexdigest()
+    except (distutils.errors.CCompilerError, IOError, OSError):
+        return None
+    finally:
+        try:
+            os.unlink(outputname)
+        except OSError:
+            pass
+
+def _build_cache_filename(cache_dir, key, soname):
+    return os.path.join(cache_dir, 'build-%s%s' % (
+        key, os.path.splitext(soname)[1]))
+
+def _build_cache_fetch(cache_dir, key, soname):
+    import shutil
+    filename = _build_cache_filename(cache_dir, key, soname)
+    if not os.path.isfile(filename):
+        return False
+    # copy to a temporary file and rename it, instead of overwriting
+    # in-place a module that might be currently loaded
+    dirname = os.path.dirname(soname)
+    tmpname = '%s.%d.tmp' % (soname, os.getpid())
+    try:
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        shutil.copyfile(filename, tmpname)
+        shutil.copymode(filename, tmpname)
+        if sys.platform == 'win32' and os.path.exists(soname):
+            os.unlink(soname)
+        os.rename(tmpname, soname)
+        os.utime(filename, None)   # most recently used, for the eviction
+    except (IOError, OSError):
+        return False
+    return True
+
+def _build_cache_store(cache_dir, key, soname, cache_size):
+    import shutil
+    filename = _build_cache_filename(cache_dir, key, soname)
+    # copy to a temporary file and rename it, in case several processes
+    # fill the cache at the same time
+    tmpname = '%s.%d.tmp' % (filename, os.getpid())
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        shutil.copyfile(soname, tmpname)
+        shutil.copymode(soname, tmpname)
+        os.rename(tmpname, filename)
+    except (IOError, OSError):
+        return     # the cache is only an optimization
+    if cache_size is not None:
+        _build_cache_evict(cache_dir, cache_size)
+
+def _build_cache_evict(cache_dir, cache_size):
+    """Remove the least recently used entries until the total size of
+    the build cache is not more than 'cache_size' bytes."""
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if name.startswith('build-') and not name.endswith('.tmp'):
+            filename = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, filename))
+            total += st.st_size
+    entries.sort()
+    for mtime, size, filename in entries:
+        if total <= cache_size:
+            break
+        try:
+            os.unlink(filename)
+        except OSError:
+            continue
+        total -= size
+
+# ____________________________________________________________
+
 try:
     from os.path import samefile
 except ImportError:
@@ -29,6 +29,7 @@ typedef void *_cffi_opcode_t;
 #define _CFFI_OP_DLOPEN_CONST   37
 #define _CFFI_OP_GLOBAL_VAR_F   39
 #define _CFFI_OP_EXTERN_PYTHON  41
+#define _CFFI_OP_CPYTHON_BLTN_F 43   // fastcall (i.e. an array of args)
 
 #define _CFFI_PRIM_VOID          0
 #define _CFFI_PRIM_BOOL          1
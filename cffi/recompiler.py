@@ -1,9 +1,10 @@
-import os, sys, io
+import os, sys, io, zlib
 from . import ffiplatform, model
 from .cffi_opcode import *
 
 VERSION = "0x2601"
 VERSION_EMBEDDED = "0x2701"
+VERSION_FASTCALL = "0x2801"
 
 
 class GlobalExpr:
@@ -22,6 +23,17 @@ class GlobalExpr:
         return "b'%s%s',%d" % (self.type_op.as_python_bytes(), self.name,
                                self.check_value)
 
+    def as_compact_bytes(self):
+        result = '%s%s\\x00' % (self.type_op.as_python_bytes(), self.name)
+        if self.type_op.op in (OP_CONSTANT_INT, OP_ENUM):
+            # one byte 'neg' (true if the value is <= 0), followed by
+            # the value as 8 bytes in two's complement
+            value = self.check_value & 0xFFFFFFFFFFFFFFFF
+            result += '\\x%02X%s%s' % (self.check_value <= 0,
+                                      format_four_bytes(value >> 32),
+                                      format_four_bytes(value))
+        return result
+
 class FieldExpr:
     def __init__(self, name, field_offset, field_size, fbitsize, field_type_op):
         self.name = name
@@ -50,6 +62,9 @@ class FieldExpr:
                               size_expr,
                               self.name)
 
+    def as_field_compact_bytes(self):
+        return self.as_field_python_expr()[2:-1] + '\\x00'
+
 class StructUnionExpr:
     def __init__(self, name, type_index, flags, size, alignment, comment,
                  first_field_index, c_fields):
@@ -79,6 +94,16 @@ class StructUnionExpr:
             self.name,
             ','.join(fields_expr))
 
+    def as_compact_bytes(self):
+        flags = eval(self.flags, G_FLAGS)
+        return '%s%s%s\\x00%s%s' % (
+            format_four_bytes(self.type_index),
+            format_four_bytes(flags),
+            self.name,
+            format_four_bytes(len(self.c_fields)),
+            ''.join([c_field.as_field_compact_bytes()
+                     for c_field in self.c_fields]))
+
 class EnumExpr:
     def __init__(self, name, type_index, size, signed, allenums):
         self.name = name
@@ -93,15 +118,21 @@ class EnumExpr:
                                  self.size, self.signed, self.allenums))
 
     def as_python_expr(self):
+        return "b'%s'" % (self._as_bytes(),)
+
+    def as_compact_bytes(self):
+        return self._as_bytes() + '\\x00'
+
+    def _as_bytes(self):
         prim_index = {
             (1, 0): PRIM_UINT8,  (1, 1):  PRIM_INT8,
             (2, 0): PRIM_UINT16, (2, 1):  PRIM_INT16,
             (4, 0): PRIM_UINT32, (4, 1):  PRIM_INT32,
             (8, 0): PRIM_UINT64, (8, 1):  PRIM_INT64,
             }[self.size, self.signed]
-        return "b'%s%s%s\\x00%s'" % (format_four_bytes(self.type_index),
-                                     format_four_bytes(prim_index),
-                                     self.name, self.allenums)
+        return '%s%s%s\\x00%s' % (format_four_bytes(self.type_index),
+                                  format_four_bytes(prim_index),
+                                  self.name, self.allenums)
 
 class TypenameExpr:
     def __init__(self, name, type_index):
@@ -114,17 +145,37 @@ class TypenameExpr:
     def as_python_expr(self):
         return "b'%s%s'" % (format_four_bytes(self.type_index), self.name)
 
+    def as_compact_bytes(self):
+        return '%s%s\\x00' % (format_four_bytes(self.type_index), self.name)
+
 
 # ____________________________________________________________
 
 
 class Recompiler:
     _num_externpy = 0
+    _batch_clock_written = False
+    _num_fastcall = 0
+    _shards = None
 
-    def __init__(self, ffi, module_name, target_is_python=False):
+    def __init__(self, ffi, module_name, target_is_python=False, shards=1,
+                 preload=False, compact_tables=False):
         self.ffi = ffi
         self.module_name = module_name
         self.target_is_python = target_is_python
+        self.compact_tables = compact_tables
+        if preload not in (False, True, 'thread'):
+            raise ffiplatform.VerificationError(
+                "'preload' must be False, True or 'thread', not %r"
+                % (preload,))
+        self.preload = preload
+        if shards > 1:
+            # the function wrappers go to 'shards - 1' extra C files, and
+            # the main C file only contains their prototypes
+            if ffi._embedding is not None:
+                raise ffiplatform.VerificationError(
+                    "'shards' is not supported together with embedding")
+            self._shards = [[] for i in range(shards - 1)]
 
     def collect_type_table(self):
         self._typesdict = {}
@@ -272,17 +323,32 @@ class Recompiler:
         g.close()
         return lines
 
-    def write_c_source_to_f(self, f, preamble):
-        self._f = f
+    def _write_c_include(self):
         prnt = self._prnt
         if self.ffi._embedding is None:
             prnt('#define Py_LIMITED_API')
+        if self._shards is not None:
+            prnt('#define _CFFI_SHARDED')
         #
         # first the '#include' (actually done by inlining the file's content)
         lines = self._rel_readlines('_cffi_include.h')
         i = lines.index('#include "parse_c_type.h"\n')
         lines[i:i+1] = self._rel_readlines('parse_c_type.h')
         prnt(''.join(lines))
+
+    def _write_c_preamble(self, preamble):
+        prnt = self._prnt
+        prnt('/************************************************************/')
+        prnt()
+        prnt(preamble)
+        prnt()
+        prnt('/************************************************************/')
+        prnt()
+
+    def write_c_source_to_f(self, f, preamble):
+        self._f = f
+        prnt = self._prnt
+        self._write_c_include()
         #
         # if we have ffi._embedding != None, we give it here as a macro
         # and include an extra file
@@ -308,15 +374,13 @@ class Recompiler:
             version = VERSION
         #
         # then paste the C source given by the user, verbatim.
-        prnt('/************************************************************/')
-        prnt()
-        prnt(preamble)
-        prnt()
-        prnt('/************************************************************/')
-        prnt()
+        self._write_c_preamble(preamble)
         #
         # the declaration of '_cffi_types'
-        prnt('static void *_cffi_types[] = {')
+        if self._shards is None:
+            prnt('static void *_cffi_types[] = {')
+        else:
+            prnt('_CFFI_HIDDEN void *_cffi_types[] = {')
         typeindex2type = dict([(i, tp) for (tp, i) in self._typesdict.items()])
         for i, op in enumerate(self.cffi_types):
             comment = ''
@@ -386,10 +450,24 @@ class Recompiler:
         flags = 0
         if self._num_externpy:
             flags |= 1     # set to mean that we use extern "Python"
+        if self.preload:
+            flags |= 2     # call lib.__preload__() when importing
+            if self.preload == 'thread':
+                flags |= 4     # ...in a background thread
         prnt('  %d,  /* flags */' % flags)
         prnt('};')
         prnt()
         #
+        # the version tag: modules that use METH_FASTCALL need a
+        # more recent _cffi_backend
+        if self._num_fastcall:
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('#  define _CFFI_MODULE_VERSION  %s' % (VERSION_FASTCALL,))
+            prnt('#else')
+            prnt('#  define _CFFI_MODULE_VERSION  %s' % (version,))
+            prnt('#endif')
+            version = '_CFFI_MODULE_VERSION'
+        #
         # the init function
         prnt('#ifdef PYPY_VERSION')
         prnt('PyMODINIT_FUNC')
@@ -430,6 +508,19 @@ class Recompiler:
         prnt('}')
         prnt('#endif')
 
+    def write_c_shard_to_f(self, f, preamble, index):
+        # the extra C file number 'index', with some of the function
+        # wrappers; it needs the same '#include' and user C source
+        self._f = f
+        prnt = self._prnt
+        prnt('#define _CFFI_SHARD')
+        self._write_c_include()
+        self._write_c_preamble(preamble)
+        prnt('extern _CFFI_HIDDEN void *_cffi_types[];')
+        prnt()
+        for code in self._shards[index]:
+            prnt(code)
+
     def _to_py(self, x):
         if isinstance(x, str):
             return "b'%s'" % (x,)
@@ -472,14 +563,17 @@ class Recompiler:
         # the '_types' keyword argument
         self.cffi_types = tuple(self.cffi_types)    # don't change any more
         types_lst = [op.as_python_bytes() for op in self.cffi_types]
-        prnt('    _types = %s,' % (self._to_py(''.join(types_lst)),))
         typeindex2type = dict([(i, tp) for (tp, i) in self._typesdict.items()])
-        #
-        # the keyword arguments from ALL_STEPS
-        for step_name in self.ALL_STEPS:
-            lst = self._lsts[step_name]
-            if len(lst) > 0 and step_name != "field":
-                prnt('    _%ss = %s,' % (step_name, self._to_py(lst)))
+        if self.compact_tables:
+            self._write_compact_tables(types_lst)
+        else:
+            prnt('    _types = %s,' % (self._to_py(''.join(types_lst)),))
+            #
+            # the keyword arguments from ALL_STEPS
+            for step_name in self.ALL_STEPS:
+                lst = self._lsts[step_name]
+                if len(lst) > 0 and step_name != "field":
+                    prnt('    _%ss = %s,' % (step_name, self._to_py(lst)))
         #
         # the '_includes' keyword argument
         if num_includes > 0:
@@ -489,6 +583,22 @@ class Recompiler:
         # the footer
         prnt(')')
 
+    def _write_compact_tables(self, types_lst):
+        # the '_tables' keyword argument: a single string, with one
+        # section for the types and one section for each of ALL_STEPS
+        # except "field" (the fields are stored inside the struct_unions).
+        # Each section starts with its number of entries as 4 bytes.
+        # The C side is ffiobj_init() in c/cdlopen.c.
+        prnt = self._prnt
+        sections = [format_four_bytes(len(types_lst)) + ''.join(types_lst)]
+        for step_name in self.ALL_STEPS:
+            if step_name != "field":
+                lst = self._lsts[step_name]
+                sections.append(format_four_bytes(len(lst)) +
+                                ''.join([x.as_compact_bytes() for x in lst]))
+        prnt('    _tables = (%s),' % ('\n               '.join(
+            ["b'%s'" % (section,) for section in sections]),))
+
     # ----------
 
     def _gettypenum(self, type):
@@ -622,6 +732,42 @@ class Recompiler:
             # constant function pointer (no CPython wrapper)
             self._generate_cpy_constant_decl(tp, name)
             return
+        if self._shards is not None:
+            self._generate_cpy_function_in_shard(tp, name)
+            return
+        self._write_cpy_function(tp, name)
+
+    def _generate_cpy_function_in_shard(self, tp, name):
+        # write the functions into a string, and put it in one of the
+        # shards.  The shard depends only on the name, so that adding or
+        # removing a function does not change the other shards.
+        f = self._f
+        self._f = NativeIO()
+        try:
+            self._write_cpy_function(tp, name)
+            code = self._f.getvalue()
+        finally:
+            self._f = f
+        lines = code.splitlines()
+        for i, line in enumerate(lines):
+            if line.startswith('static '):
+                lines[i] = '_CFFI_HIDDEN ' + line[len('static '):]
+        index = zlib.crc32(name.encode('utf-8')) & 0xffffffff
+        self._shards[index % len(self._shards)].append('\n'.join(lines))
+        #
+        # in the main file, write only the prototypes: the function
+        # bodies are between a line '{' and a line '}'
+        in_body = False
+        for line in lines:
+            if in_body:
+                in_body = (line != '}')
+            elif line == '{':
+                self._prnt(';')
+                in_body = True
+            else:
+                self._prnt(line)
+
+    def _write_cpy_function(self, tp, name):
         prnt = self._prnt
         numargs = len(tp.args)
         if numargs == 0:
@@ -657,8 +803,18 @@ class Recompiler:
         #
         prnt('#ifndef PYPY_VERSION')        # ------------------------------
         #
+        if numargs > 1:
+            # with several arguments, use METH_FASTCALL if available,
+            # to avoid building a tuple
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('static PyObject *')
+            prnt('_cffi_f_%s(PyObject *self, PyObject *const *args, '
+                 'Py_ssize_t nargs)' % (name,))
+            prnt('#else')
         prnt('static PyObject *')
         prnt('_cffi_f_%s(PyObject *self, PyObject *%s)' % (name, argname))
+        if numargs > 1:
+            prnt('#endif')
         prnt('{')
         #
         context = 'argument of %s' % name
@@ -686,10 +842,19 @@ class Recompiler:
             for i in rng:
                 prnt('  PyObject *arg%d;' % i)
             prnt()
+            prnt('#ifdef _CFFI_USE_FASTCALL')
+            prnt('  if (!_cffi_check_nargs("%s", nargs, %d))' % (
+                name, len(rng)))
+            prnt('    return NULL;')
+            for i in rng:
+                prnt('  arg%d = args[%d];' % (i, i))
+            prnt('#else')
             prnt('  if (!PyArg_UnpackTuple(args, "%s", %d, %d, %s))' % (
                 name, len(rng), len(rng),
                 ', '.join(['&arg%d' % i for i in rng])))
             prnt('    return NULL;')
+            prnt('#endif')
+            self._num_fastcall += 1
         prnt()
         #
         for i, type in enumerate(tp.args):
@@ -776,7 +941,8 @@ class Recompiler:
         elif numargs == 1:
             meth_kind = OP_CPYTHON_BLTN_O   # 'METH_O'
         else:
-            meth_kind = OP_CPYTHON_BLTN_V   # 'METH_VARARGS'
+            # 'METH_FASTCALL', or 'METH_VARARGS' if not available
+            meth_kind = OP_CPYTHON_BLTN_F
         self._lsts["global"].append(
             GlobalExpr(name, '_cffi_f_%s' % name,
                        CffiOp(meth_kind, type_index),
@@ -1147,9 +1313,10 @@ class Recompiler:
         self._do_collect_type(tp)
     _generate_cpy_dllexport_python_collecttype = \
       _generate_cpy_extern_python_plus_c_collecttype = \
+      _generate_cpy_extern_python_batch_collecttype = \
       _generate_cpy_extern_python_collecttype
 
-    def _extern_python_decl(self, tp, name, tag_and_space):
+    def _extern_python_decl(self, tp, name, tag_and_space, batch=None):
         prnt = self._prnt
         if isinstance(tp.result, model.VoidType):
             size_of_result = '0'
@@ -1201,6 +1368,83 @@ class Recompiler:
         prnt('}')
         prnt()
         self._num_externpy += 1
+        if batch is not None:
+            self._extern_python_batch_helpers(tp, name, tag_and_space, *batch)
+
+    def _write_batch_clock(self):
+        # a monotonic clock in milliseconds, for the 'max_delay' of
+        # the helpers of 'extern "Python batch(max_items, max_delay)"'
+        if self._batch_clock_written:
+            return
+        self._batch_clock_written = True
+        prnt = self._prnt
+        prnt('#ifdef _WIN32')
+        prnt('#  include <windows.h>')
+        prnt('_CFFI_UNUSED_FN')
+        prnt('static unsigned long _cffi_batch_clock(void)')
+        prnt('{')
+        prnt('  return (unsigned long)GetTickCount();')
+        prnt('}')
+        prnt('#else')
+        prnt('#  include <time.h>')
+        prnt('_CFFI_UNUSED_FN')
+        prnt('static unsigned long _cffi_batch_clock(void)')
+        prnt('{')
+        prnt('  struct timespec t;')
+        prnt('  clock_gettime(CLOCK_MONOTONIC, &t);')
+        prnt('  return (unsigned long)t.tv_sec * 1000UL + '
+             '(unsigned long)(t.tv_nsec / 1000000);')
+        prnt('}')
+        prnt('#endif')
+        prnt()
+
+    def _extern_python_batch_helpers(self, tp, name, tag_and_space,
+                                     max_items, max_delay):
+        # 'name_push(item)' queues one item, and calls the function
+        # 'name(items, count)' once 'max_items' are queued, or once the
+        # first queued item is 'max_delay' milliseconds old; and
+        # 'name_flush()' calls it with the items queued so far.
+        prnt = self._prnt
+        if max_delay > 0:
+            self._write_batch_clock()
+        context = 'item of %s' % name
+        itemtype = tp.args[0].totype
+        queue = '_cffi_batch__%s' % name
+        prnt('static struct {')
+        prnt('  %s;' % tp.args[1].get_c_name(' count', context))
+        if max_delay > 0:
+            prnt('  unsigned long start;')
+        prnt('  %s;' % itemtype.get_c_name(' items[%d]' % max_items, context))
+        prnt('} %s;' % queue)
+        prnt()
+        if tag_and_space == 'static ':
+            prnt('_CFFI_UNUSED_FN')
+        prnt('%svoid %s_flush(void)' % (tag_and_space, name))
+        prnt('{')
+        prnt('  %s = %s.count;' % (tp.args[1].get_c_name(' n', context),
+                                   queue))
+        prnt('  if (n > 0) {')
+        prnt('    %s.count = 0;' % queue)
+        prnt('    %s(%s.items, n);' % (name, queue))
+        prnt('  }')
+        prnt('}')
+        prnt()
+        if tag_and_space == 'static ':
+            prnt('_CFFI_UNUSED_FN')
+        prnt('%svoid %s_push(%s)' % (tag_and_space, name,
+                                     itemtype.get_c_name(' item', context)))
+        prnt('{')
+        prnt('  %s.items[%s.count++] = item;' % (queue, queue))
+        prnt('  if (%s.count >= %d)' % (queue, max_items))
+        prnt('    %s_flush();' % name)
+        if max_delay > 0:
+            prnt('  else if (%s.count == 1)' % queue)
+            prnt('    %s.start = _cffi_batch_clock();' % queue)
+            prnt('  else if (_cffi_batch_clock() - %s.start >= %dUL)' % (
+                queue, max_delay))
+            prnt('    %s_flush();' % name)
+        prnt('}')
+        prnt()
 
     def _generate_cpy_extern_python_decl(self, tp, name):
         self._extern_python_decl(tp, name, 'static ')
@@ -1211,6 +1455,16 @@ class Recompiler:
     def _generate_cpy_extern_python_plus_c_decl(self, tp, name):
         self._extern_python_decl(tp, name, '')
 
+    def _generate_cpy_extern_python_batch_decl(self, tp, name):
+        max_items, max_delay, dllexport = (
+            self.ffi._parser._extern_python_batches[name])
+        if dllexport:
+            tag_and_space = 'CFFI_DLLEXPORT '
+        else:
+            tag_and_space = 'static '
+        self._extern_python_decl(tp, name, tag_and_space,
+                                 batch=(max_items, max_delay))
+
     def _generate_cpy_extern_python_ctx(self, tp, name):
         if self.target_is_python:
             raise ffiplatform.VerificationError(
@@ -1224,6 +1478,7 @@ class Recompiler:
 
     _generate_cpy_dllexport_python_ctx = \
       _generate_cpy_extern_python_plus_c_ctx = \
+      _generate_cpy_extern_python_batch_ctx = \
       _generate_cpy_extern_python_ctx
 
     def _string_literal(self, s):
@@ -1322,16 +1577,27 @@ else:
                 s = s.encode('ascii')
             super(NativeIO, self).write(s)
 
-def _make_c_or_py_source(ffi, module_name, preamble, target_file, verbose):
+def _make_c_or_py_source(ffi, module_name, preamble, target_file, verbose,
+                         shard_files=(), preload=False, compact_tables=False):
     if verbose:
         print("generating %s" % (target_file,))
     recompiler = Recompiler(ffi, module_name,
-                            target_is_python=(preamble is None))
+                            target_is_python=(preamble is None),
+                            shards=len(shard_files) + 1, preload=preload,
+                            compact_tables=compact_tables)
     recompiler.collect_type_table()
     recompiler.collect_step_tables()
     f = NativeIO()
     recompiler.write_source_to_f(f, preamble)
-    output = f.getvalue()
+    updated = _write_if_changed(target_file, f.getvalue(), verbose)
+    for i, shard_file in enumerate(shard_files):
+        f = NativeIO()
+        recompiler.write_c_shard_to_f(f, preamble, i)
+        if _write_if_changed(shard_file, f.getvalue(), False):
+            updated = True
+    return updated
+
+def _write_if_changed(target_file, output, verbose):
     try:
         with open(target_file, 'r') as f1:
             if f1.read(len(output) + 1) != output:
@@ -1350,14 +1616,24 @@ def _make_c_or_py_source(ffi, module_name, preamble, target_file, verbose):
             os.rename(tmp_file, target_file)
         return True
 
-def make_c_source(ffi, module_name, preamble, target_c_file, verbose=False):
+def make_c_source(ffi, module_name, preamble, target_c_file, verbose=False,
+                  shards=1, preload=False):
     assert preamble is not None
     return _make_c_or_py_source(ffi, module_name, preamble, target_c_file,
-                                verbose)
-
-def make_py_source(ffi, module_name, target_py_file, verbose=False):
+                                verbose, shard_file_names(target_c_file,
+                                                          shards),
+                                preload)
+
+def shard_file_names(c_file, shards):
+    """Return the names of the extra C files written next to 'c_file'
+    if the module is split in 'shards' C files."""
+    base, ext = os.path.splitext(c_file)
+    return ['%s_shard%d%s' % (base, i, ext) for i in range(1, shards)]
+
+def make_py_source(ffi, module_name, target_py_file, verbose=False,
+                   compact_tables=False):
     return _make_c_or_py_source(ffi, module_name, None, target_py_file,
-                                verbose)
+                                verbose, compact_tables=compact_tables)
 
 def _modname_to_file(outputdir, modname, extension):
     parts = modname.split('.')
@@ -1422,7 +1698,9 @@ def _patch_for_target(patchlist, target):
 
 def recompile(ffi, module_name, preamble, tmpdir='.', call_c_compiler=True,
               c_file=None, source_extension='.c', extradir=None,
-              compiler_verbose=1, target=None, **kwds):
+              compiler_verbose=1, target=None, cache_dir=None,
+              cache_size=ffiplatform.DEFAULT_BUILD_CACHE_SIZE, shards=1,
+              preload=False, compact_tables=False, **kwds):
     if not isinstance(module_name, str):
         module_name = module_name.encode('ascii')
     if ffi._windows_unicode:
@@ -1446,9 +1724,13 @@ def recompile(ffi, module_name, preamble, tmpdir='.', call_c_compiler=True,
             else:
                 target = '*'
         #
+        if shards > 1:
+            kwds['sources'] = (shard_file_names(ext_c_file, shards) +
+                               list(kwds.get('sources', ())))
         ext = ffiplatform.get_extension(ext_c_file, module_name, **kwds)
         updated = make_c_source(ffi, module_name, preamble, c_file,
-                                verbose=compiler_verbose)
+                                verbose=compiler_verbose, shards=shards,
+                                preload=preload)
         if call_c_compiler:
             patchlist = []
             cwd = os.getcwd()
@@ -1457,8 +1739,15 @@ def recompile(ffi, module_name, preamble, tmpdir='.', call_c_compiler=True,
                     _patch_for_embedding(patchlist)
                 if target != '*':
                     _patch_for_target(patchlist, target)
+                if cache_dir is None:
+                    cache_dir = os.environ.get('CFFI_BUILD_CACHE_DIR')
+                if cache_dir is not None:
+                    cache_dir = os.path.abspath(cache_dir)
                 os.chdir(tmpdir)
-                outputfilename = ffiplatform.compile('.', ext, compiler_verbose)
+                outputfilename = ffiplatform.compile('.', ext,
+                                                     compiler_verbose,
+                                                     cache_dir, cache_size,
+                                                     shards)
             finally:
                 os.chdir(cwd)
                 _unpatch_meths(patchlist)
@@ -1469,7 +1758,8 @@ def recompile(ffi, module_name, preamble, tmpdir='.', call_c_compiler=True,
         if c_file is None:
             c_file, _ = _modname_to_file(tmpdir, module_name, '.py')
         updated = make_py_source(ffi, module_name, c_file,
-                                 verbose=compiler_verbose)
+                                 verbose=compiler_verbose,
+                                 compact_tables=compact_tables)
         if call_c_compiler:
             return c_file
         else:
@@ -65,18 +65,45 @@ def add_cffi_module(dist, mod_spec):
         ffi._apply_windows_unicode(kwds)
 
     if source is None:
-        _add_py_module(dist, ffi, module_name)
+        _add_py_module(dist, ffi, module_name, kwds)
     else:
         _add_c_module(dist, ffi, module_name, source, source_extension, kwds)
 
 
+def _is_stock_build_ext(cls):
+    # the build_ext classes that are known to build the extensions
+    # correctly from several threads; a custom subclass might e.g.
+    # change 'self.compiler' in build_extension()
+    from distutils.command.build_ext import build_ext
+    if cls is build_ext:
+        return True
+    try:
+        from setuptools.command.build_ext import build_ext
+    except ImportError:
+        return False
+    return cls is build_ext
+
+def _has_setuptools_library(extensions):
+    # setuptools' build_extension() changes 'self.compiler' for these
+    try:
+        from setuptools.extension import Library
+    except ImportError:
+        return False
+    for ext in extensions:
+        if isinstance(ext, Library):
+            return True
+    return False
+
+
 def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
     from distutils.core import Extension
     from distutils.command.build_ext import build_ext
     from distutils.dir_util import mkpath
     from distutils import log
-    from cffi import recompiler
+    from cffi import recompiler, ffiplatform
 
+    shards = kwds.pop('shards', 1)
+    preload = kwds.pop('preload', False)
     allsources = ['$PLACEHOLDER']
     allsources.extend(kwds.pop('sources', []))
     ext = Extension(name=module_name, sources=allsources, **kwds)
@@ -91,7 +118,8 @@ def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
         # add a method 'def pre_run(self, ext, ffi)'.
         if pre_run is not None:
             pre_run(ext, ffi)
-        updated = recompiler.make_c_source(ffi, module_name, source, c_file)
+        updated = recompiler.make_c_source(ffi, module_name, source, c_file,
+                                           shards=shards, preload=preload)
         if not updated:
             log.info("already up-to-date")
         return c_file
@@ -105,8 +133,27 @@ def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
         def run(self):
             if ext.sources[0] == '$PLACEHOLDER':
                 pre_run = getattr(self, 'pre_run', None)
-                ext.sources[0] = make_mod(self.build_temp, pre_run)
+                c_file = make_mod(self.build_temp, pre_run)
+                ext.sources[0:1] = ([c_file] +
+                                    recompiler.shard_file_names(c_file, shards))
             base_class.run(self)
+        def build_extensions(self):
+            # all the C sources have been generated by now.  Unless an
+            # explicit number of jobs was given (e.g. 'build_ext -j1'),
+            # compile the extensions concurrently; distutils supports it
+            # on Python >= 3.5 and otherwise ignores 'parallel'.  This
+            # is only done with the standard build_ext, not with a
+            # custom one given in 'cmdclass'.
+            if (getattr(self, 'parallel', 0) is None and
+                    _is_stock_build_ext(base_class) and
+                    not _has_setuptools_library(self.extensions)):
+                self.parallel = True     # meaning os.cpu_count() jobs
+            # the C files of the shards are compiled by a pool of threads
+            # shared with all the extensions, so that the total number
+            # of compiler processes stays at one per CPU
+            if shards > 1:
+                ffiplatform.use_concurrent_compile(self.compiler)
+            base_class.build_extensions(self)
     dist.cmdclass['build_ext'] = build_ext_make_mod
     # NB. multiple runs here will create multiple 'build_ext_make_mod'
     # classes.  Even in this case the 'build_ext' command should be
@@ -114,17 +161,20 @@ def _add_c_module(dist, ffi, module_name, source, source_extension, kwds):
     # called again.
 
 
-def _add_py_module(dist, ffi, module_name):
+def _add_py_module(dist, ffi, module_name, kwds):
     from distutils.dir_util import mkpath
     from distutils.command.build_py import build_py
     from distutils.command.build_ext import build_ext
     from distutils import log
     from cffi import recompiler
 
+    compact_tables = kwds.get('compact_tables', False)
+
     def generate_mod(py_file):
         log.info("generating cffi module %r" % py_file)
         mkpath(os.path.dirname(py_file))
-        updated = recompiler.make_py_source(ffi, module_name, py_file)
+        updated = recompiler.make_py_source(ffi, module_name, py_file,
+                                            compact_tables=compact_tables)
         if not updated:
             log.info("already up-to-date")
 
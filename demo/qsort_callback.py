@@ -0,0 +1,58 @@
+import sys, time, random
+import cffi
+
+# Measures the cost of calling a Python callback from C: sorts 1M ints
+# with the C library's qsort() and a Python comparison function.
+
+ffi = cffi.FFI()
+ffi.cdef("""
+    void qsort(void *base, size_t nmemb, size_t size,
+               int (*compar)(const void *, const void *));
+""")
+C = ffi.dlopen(None)
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+random.seed(42)
+data = ffi.new("int[]", [random.randrange(-2**31, 2**31) for i in range(N)])
+array = ffi.new("int[]", N)
+
+num_calls = [0]
+
+@ffi.callback("int(const void *, const void *)")
+def count_compare(a, b):
+    num_calls[0] += 1
+    a = ffi.cast("int *", a)[0]
+    b = ffi.cast("int *", b)[0]
+    return (a > b) - (a < b)
+
+@ffi.callback("int(const void *, const void *)")
+def compare(a, b):
+    a = ffi.cast("int *", a)[0]
+    b = ffi.cast("int *", b)[0]
+    return (a > b) - (a < b)
+
+@ffi.callback("int(const void *, const void *)")
+def empty_compare(a, b):
+    return 0
+
+# the same comparison, done natively without calling Python at all
+native_compare = ffi.callback("int(const void *, const void *)",
+                              compare="int")
+
+
+def sort(callback):
+    ffi.memmove(array, data, N * ffi.sizeof("int"))
+    start = time.time()
+    C.qsort(array, N, ffi.sizeof("int"), callback)
+    elapsed = time.time() - start
+    assert list(array) == sorted(data) or callback is empty_compare
+    return elapsed
+
+sort(count_compare)
+print("%d ints, %d calls to the comparison function" % (N, num_calls[0]))
+for name, callback in [("compare", compare),
+                       ("empty_compare", empty_compare),
+                       ("native_compare", native_compare)]:
+    seconds = min([sort(callback) for i in range(3)])
+    print("%-15s %6.3f seconds, %6.1f ns per call" % (
+        name, seconds, seconds * 1e9 / num_calls[0]))
@@ -57,6 +57,30 @@ class TestFFI(backend_tests.BackendTests,
         assert tb.tb_frame.f_code.co_name == 'cb'
         assert tb.tb_frame.f_locals['n'] == 234
 
+    def test_callback_compare(self):
+        if sys.platform == 'win32':
+            py.test.skip("needs qsort() from ffi.dlopen(None)")
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("""
+            struct point { int x, y; };
+            void qsort(void *base, size_t nmemb, size_t size,
+                       int (*compar)(const void *, const void *));
+        """)
+        C = ffi.dlopen(None)
+        cmp = ffi.callback("int(const void *, const void *)",
+                           compare="struct point", field="y", reverse=True)
+        assert repr(cmp).endswith(" comparing 'struct point.y, reversed'>")
+        points = ffi.new("struct point[]", [(1, 5), (2, -3), (3, 8), (4, 0)])
+        C.qsort(points, 4, ffi.sizeof("struct point"), cmp)
+        assert [p.x for p in points] == [3, 1, 4, 2]
+        cmp = ffi.callback("int(*)(double *, double *)", compare="double")
+        a = ffi.new("double[]", [2.5, -1.0, 7.25])
+        assert (cmp(a, a + 1), cmp(a, a + 2), cmp(a + 1, a + 1)) == (1, -1, 0)
+        py.test.raises(TypeError, ffi.callback, "int(*)(int *, int *)",
+                       lambda a, b: 0, compare="int")
+        py.test.raises(TypeError, ffi.callback, "int(*)(int *, int *)",
+                       reverse=True)
+
     def test_ffi_new_allocator_2(self):
         ffi = FFI(backend=self.Backend())
         seen = []
@@ -313,6 +337,48 @@ class TestBitfield:
         ffi.cast("unsigned short *", c)[1] += 500
         assert list(a) == [10000, 20500, 30000]
 
+    def test_from_buffer_typed(self):
+        import array
+        ffi = FFI()
+        ffi.cdef("struct rec { int x; short y; };")
+        a = array.array('i', [1, 2, 3, 4, 5, 6])
+        recs = ffi.from_buffer("struct rec[]", a)
+        assert ffi.typeof(recs) is ffi.typeof("struct rec[]")
+        assert len(recs) == 3
+        assert [r.x for r in recs] == [1, 3, 5]
+        recs[2].x = 42
+        assert list(a) == [1, 2, 3, 4, 42, 6]
+        py.test.raises(ValueError, ffi.from_buffer, "struct rec[4]", a)
+
+    def test_field_view(self):
+        ffi = FFI()
+        ffi.cdef("struct rec { int id; double price; };")
+        recs = ffi.new("struct rec[]", [(1, 2.5), (2, -1.0), (3, 4.25)])
+        v = ffi.field_view(recs, "price")
+        assert len(v) == 3
+        assert [v[i] for i in range(3)] == [2.5, -1.0, 4.25]
+        v[0] = 7.0
+        assert recs[0].price == 7.0
+        v = ffi.field_view(ffi.cast("struct rec *", recs), "id", 2)
+        assert [v[i] for i in range(2)] == [1, 2]
+
+    def test_unpack_records(self):
+        import collections
+        ffi = FFI()
+        ffi.cdef("struct rec { int id; double price; };")
+        recs = ffi.new("struct rec[]", [(1, 2.5), (2, -1.0), (3, 4.25)])
+        assert ffi.unpack_struct(recs[1]) == (2, -1.0)
+        assert ffi.unpack_struct(recs + 2, "dict") == {'id': 3,
+                                                       'price': 4.25}
+        assert ffi.unpack_records(recs) == [(1, 2.5), (2, -1.0), (3, 4.25)]
+        Rec = collections.namedtuple('Rec', 'id price')
+        lst = ffi.unpack_records(ffi.cast("struct rec *", recs), 2, Rec)
+        assert lst == [Rec(1, 2.5), Rec(2, -1.0)]
+        assert type(lst[0]) is Rec
+        ffi.pack_records(recs, [(10, 0.5), {'price': 9.0}])
+        assert recs[0].id == 10 and recs[0].price == 0.5
+        assert recs[1].id == 2 and recs[1].price == 9.0
+
     def test_memmove(self):
         ffi = FFI()
         p = ffi.new("short[]", [-1234, -2345, -3456, -4567, -5678])
@@ -254,6 +254,28 @@ class TestFunction(object):
         C.stdout = pout
         assert C.stdout == pout
 
+    def test_write_variable_twice(self):
+        if not sys.platform.startswith('linux'):
+            py.test.skip("probably no symbol 'stdout' in the lib")
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("""
+            void *stdout;
+            int nonexistent_variable;
+        """)
+        C = ffi.dlopen(None)
+        C2 = ffi.dlopen(None)
+        pout = C2.stdout
+        try:
+            C.stdout = ffi.NULL     # first access to C.stdout is a write
+            assert C.stdout == ffi.NULL
+            assert C2.stdout == ffi.NULL
+        finally:
+            C2.stdout = pout
+        assert C.stdout == pout
+        py.test.raises(AttributeError, delattr, C, "stdout")
+        if self.Backend is not CTypesBackend:
+            assert not hasattr(C, 'nonexistent_variable')
+
     def test_strchr(self):
         ffi = FFI(backend=self.Backend())
         ffi.cdef("""
@@ -352,6 +374,38 @@ class TestFunction(object):
         m = ffi.dlopen(lib_m)
         assert not hasattr(m, 'nonexistent')
 
+    def test_dlopen_preload(self):
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("""
+            double sin(double);
+            double cos(double);
+            int nonexistent2();
+            int nonexistent1();
+            #define FORTY_TWO 42
+        """)
+        e = py.test.raises(OSError, ffi.dlopen, lib_m, preload=True)
+        assert str(e.value) == ("cannot preload library '%s': symbols not "
+                                "found: nonexistent1, nonexistent2" % lib_m)
+        assert len(ffi._libraries) == 0     # not kept open
+        if sys.platform != 'win32':
+            e = py.test.raises(OSError, ffi.dlopen, None, preload=True)
+            assert str(e.value).startswith(
+                "cannot preload library '<None>': symbols not found: ")
+            assert len(ffi._libraries) == 0
+        m = ffi.dlopen(lib_m)
+        report = m.__preload__()
+        assert report['missing'] == ['nonexistent1', 'nonexistent2']
+        assert report['functions'][0] == 2
+        assert report['constants'][0] == 1
+        assert report['variables'][0] == 0
+        assert m.sin(1.23) == math.sin(1.23)
+        assert not hasattr(m, 'nonexistent1')
+        #
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("double sin(double);")
+        m = ffi.dlopen(lib_m, preload=True)
+        assert m.sin(1.23) == math.sin(1.23)
+
     def test_wraps_from_stdlib(self):
         import functools
         ffi = FFI(backend=self.Backend())
@@ -483,3 +537,46 @@ class TestFunction(object):
         """)
         m = ffi.dlopen(lib_m)
         assert dir(m) == ['MYE1', 'MYE2', 'MYFOO', 'myconst', 'myfunc', 'myvar']
+
+    def test_call_many(self):
+        if self.Backend is CTypesBackend:
+            py.test.skip("not with the ctypes backend")
+        import array
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("""
+            double pow(double x, double y);
+        """)
+        m = ffi.dlopen(lib_m)
+        xs = ffi.new("double[]", [1.5, 2.0, 3.0])
+        ys = array.array('d', [2.0, 3.0, 0.5])
+        res = ffi.call_many(m.pow, xs, ys)
+        assert ffi.typeof(res) is ffi.typeof("double[]")
+        assert list(res) == [2.25, 8.0, math.sqrt(3.0)]
+        py.test.raises(TypeError, ffi.call_many, m.pow, xs)
+        py.test.raises(ValueError, ffi.call_many, m.pow, xs, ys[:2])
+
+    def test_varargs_cache(self):
+        if self.Backend is CTypesBackend:
+            py.test.skip("not with the ctypes backend")
+        if sys.platform == 'win32':
+            py.test.skip("dlopen(None) cannot work on Windows")
+        ffi = FFI(backend=self.Backend())
+        ffi.cdef("""
+            int sprintf(char *buf, const char *format, ...);
+        """)
+        ffi.C = ffi.dlopen(None)
+        buf = ffi.new("char[]", 100)
+        ffi.set_varargs_cache_size(8)
+        try:
+            for i in range(3):
+                n = ffi.C.sprintf(buf, b"%d-%s", ffi.cast("int", i),
+                                  ffi.new("char[]", b"x"))
+                assert n == 3
+                assert ffi.string(buf) == ("%d-x" % i).encode("ascii")
+            assert ffi.varargs_cache_info() == {'hits': 2, 'misses': 1,
+                                                'maxsize': 8, 'currsize': 1}
+            ffi.C.sprintf(buf, b"%ld", ffi.cast("long", 42))
+            assert ffi.string(buf) == b"42"
+            assert ffi.varargs_cache_info()['currsize'] == 2
+        finally:
+            ffi.set_varargs_cache_size(32)
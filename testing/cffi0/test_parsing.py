@@ -433,3 +433,235 @@ def test_extern_python_group():
             ffi._parser._declarations['extern_python foobar'] !=
             ffi._parser._declarations['function bok'] ==
             ffi._parser._declarations['extern_python bzrrr'])
+
+def test_extern_python_batch():
+    ffi = FFI()
+    ffi.cdef("""
+        struct item { int key; };
+        extern "Python batch(100)" void foo(struct item *, size_t);
+        extern "Python batch( 8 , 250 )" {
+            void bar(const int *items, int count);
+        }
+        extern "Python" void baz(int *, size_t);
+    """)
+    assert sorted(ffi._parser._declarations) == [
+        'extern_python baz', 'extern_python_batch bar',
+        'extern_python_batch foo', 'struct item']
+    assert ffi._parser._extern_python_batches == {'foo': (100, 0, False),
+                                                  'bar': (8, 250, False)}
+    ffi.embedding_api("""
+        extern "Python batch(16, 5)" void exported(int *, size_t);
+    """)
+    assert ffi._parser._extern_python_batches['exported'] == (16, 5, True)
+    #
+    for bad in ['int f(int *, size_t);', 'void f(int *);',
+                'void f(int *, size_t, int);', 'void f(int, size_t);',
+                'void f(void *, size_t);', 'void f(int *, double);',
+                'void f(int *, size_t, ...);']:
+        e = py.test.raises(CDefError, FFI().cdef,
+                           'extern "Python batch(10)" %s' % bad)
+        assert str(e.value) == ("'extern \"Python batch\"' function f() must "
+                                "have the type 'void(T *items, size_t count)'")
+    e = py.test.raises(CDefError, FFI().cdef,
+                       'extern "Python batch(0)" void f(int *, size_t);')
+    assert str(e.value) == ("'extern \"Python batch(0)\"': the batch size "
+                            "must be positive")
+
+def _cdef_with_cache(cache_dir, sources, must_parse=True):
+    from cffi import cparser
+    ffi = FFI(backend=FakeBackend())
+    for csource in sources:
+        if must_parse:
+            ffi.cdef(csource, cache_dir=cache_dir)
+        else:
+            orig_get_parser = cparser._get_parser
+            cparser._get_parser = None    # crash if called
+            try:
+                ffi.cdef(csource, cache_dir=cache_dir)
+            finally:
+                cparser._get_parser = orig_get_parser
+    return ffi
+
+def test_cdef_cache():
+    from testing.udir import udir
+    cache_dir = str(udir.join('cdef_cache_1'))
+    sources = ["""
+        typedef struct foo_s foo_t;
+        typedef int myint_t;
+        #define FOO 42
+        enum e { AA, BB=FOO };
+        foo_t *make(myint_t);
+    """, """
+        struct foo_s { myint_t x; foo_t *next; int a[FOO]; };
+        typedef struct { double d; } bar_t;
+        int use(foo_t *, bar_t);
+    """]
+    ffi1 = _cdef_with_cache(cache_dir, sources)
+    ffi2 = _cdef_with_cache(cache_dir, sources, must_parse=False)
+    decl1 = ffi1._parser._declarations
+    decl2 = ffi2._parser._declarations
+    assert sorted(decl1) == sorted(decl2)
+    for name in decl1:
+        assert repr(decl1[name]) == repr(decl2[name])
+    assert ffi1._parser._int_constants == ffi2._parser._int_constants
+    # the struct was completed by the second cdef, and is still the same
+    # object as the one referenced by 'foo_t'
+    tp = decl2['struct foo_s'][0]
+    assert decl2['typedef foo_t'][0] is tp
+    assert tp.fldnames == ('x', 'next', 'a')
+    assert tp.fldtypes[1].totype is tp
+    assert tp.fldtypes[2].length == 42
+    # 'myint_t' is the same object as the result of parsing 'int'
+    assert decl2['typedef myint_t'][0] is ffi2._parser.parse_type('int')
+    # the cache entries depend on the previous declarations
+    py.test.raises(TypeError, _cdef_with_cache, cache_dir, sources[1:],
+                   must_parse=False)
+    ffi3 = _cdef_with_cache(cache_dir, [
+        "typedef long foo_t; typedef int myint_t;\n#define FOO 42\n"] +
+        sources[1:])
+    assert ffi3._parser._declarations['typedef foo_t'][0].name == 'long'
+
+def test_cdef_cache_options():
+    from testing.udir import udir
+    cache_dir = str(udir.join('cdef_cache_2'))
+    csource = "struct s { char c; int i; };"
+    _cdef_with_cache(cache_dir, [csource])
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef(csource, packed=True, cache_dir=cache_dir)
+    assert ffi._parser._declarations['struct s'][0].packed
+    ffi = _cdef_with_cache(cache_dir, [csource], must_parse=False)
+    assert not ffi._parser._declarations['struct s'][0].packed
+
+def test_previous_typedefs_not_reparsed():
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef("typedef int foo_t; typedef struct { foo_t x; } bar_t;")
+    ffi.cdef("foo_t f(bar_t *, uint32_t);")
+    # the typedefs 'foo_t' and 'bar_t' are known to pycparser without
+    # being added as 'typedef int foo_t;' lines to the source to parse
+    csource = ffi._parser._parse("bar_t g(foo_t);")[2]
+    assert 'foo_t;' not in csource and 'bar_t;' not in csource
+    tp = ffi._parser._declarations['function f'][0]
+    assert str(tp) == '<int(*)(bar_t *, uint32_t)>'
+    # redeclaring a typedef as something else is still an error
+    e = py.test.raises(CDefError, ffi.cdef, "int foo_t;")
+    assert 'foo_t' in str(e.value)
+
+_fast_parser_corpus = [
+    "int f(int, long *, char const *, unsigned long long x);",
+    "void g(void); int (*h)(short); static double *const p[5][6];",
+    "typedef struct { int a, *b; char c[10]; } foo_t; foo_t *f(foo_t);",
+    "struct s; struct s { struct s *next; int x : 3, y : 5; };",
+    "union u { signed char a; unsigned short b; };",
+    "enum e { AA, BB = 5, CC = -2, DD = BB, };",
+    "typedef enum { X1 } *ep_t; extern const int n; int arr[];",
+    "typedef int (*cb_t)(void *, int(*)(long)); cb_t cbs[4];",
+    "struct p { int a; ...; }; int q[...]; typedef ... opaque_t;",
+    "int v(int, ...); typedef int *const volatile *restrict r_t;",
+    "typedef uint32_t u32_t; u32_t\nx,\n\n*y(size_t);",
+    "int f(char *(*fn)(void));",
+    "int f(int g(int));",
+    "struct { int a; } s;",
+    "int\n*\n(\n*\nf\n)\n(\nint\n*\n,\nint\n(\n*\n)\n(\n)\n)\n;",
+    "int\n*\nconst\n*\ng\n[\n5\n]\n,\nh\n(\nint\n[\n]\n, long y\n)\n;",
+    "struct\n{\nint x; } a; enum\n{\nB\n};union\nq;",
+    "struct\nt\n{\nint\n*\nx\n:\n2\n;\n}\n;enum\n{\nA\n=\n-\n1\n}\n;",
+]
+
+_fast_parser_fallback = [
+    "int (*fp)(int)(int);",
+    "int *(p);",
+    "typedef int x_t; typedef int x_t;",
+    "struct e { };",
+    "char c = 'a';",
+    "int i = 10L;",
+    "int f(int, ...) __attribute__((x));",
+    "int f(int, int;",
+    "typedef int foo_t; int foo_t;",
+    "struct s { int x : 1 + 2; };",
+]
+
+def test_fast_parser_same_ast():
+    from cffi import cparser
+    for csource in _fast_parser_corpus:
+        csource, _ = cparser._preprocess(csource)
+        csource = 'typedef int __dotdotdot__;\n' + csource
+        typenames = dict.fromkeys(['uint32_t', 'size_t'], True)
+        ast1 = cparser._FastParser(typenames).parse(csource)
+        assert ast1 is not None
+        ast2 = cparser._parse_with_typedef_names(csource, typenames)
+        assert _show_ast(ast1) == _show_ast(ast2)
+
+def _show_ast(ast):
+    lines = []
+    def show(node, indent):
+        lines.append('%s%s %s %r' % (indent, node.__class__.__name__,
+                                     [getattr(node, a) for a in
+                                      node.attr_names],
+                                     node.coord and node.coord.line))
+        for _, child in node.children():
+            show(child, indent + '  ')
+    show(ast, '')
+    return lines
+
+def test_fast_parser_gives_up():
+    from cffi import cparser
+    for csource in _fast_parser_fallback:
+        csource = 'typedef int __dotdotdot__;\n' + csource
+        assert cparser._FastParser({}).parse(csource) is None
+
+def test_fast_parser_same_declarations(monkeypatch):
+    from cffi import cparser
+    decls = []
+    for fast in [True, False]:
+        if not fast:
+            monkeypatch.setattr(cparser._FastParser, 'parse',
+                                lambda self, csource: None)
+        ffi = FFI(backend=FakeBackend())
+        errors = []
+        for csource in _fast_parser_corpus:
+            try:
+                ffi.cdef(csource, override=True)
+            except (CDefError, FFIError) as e:
+                errors.append(str(e))
+            else:
+                errors.append(None)
+        decls.append(([(key, str(tp), quals, getattr(tp, 'fldnames', None),
+                        str(getattr(tp, 'fldtypes', None)))
+                       for key, (tp, quals) in
+                       sorted(ffi._parser._declarations.items())], errors))
+    assert decls[0] == decls[1]
+
+def test_fast_parser_does_not_use_pycparser(monkeypatch):
+    from cffi import cparser
+    def no_pycparser(*args):
+        raise AssertionError("pycparser should not be used")
+    monkeypatch.setattr(cparser, '_get_parser', no_pycparser)
+    monkeypatch.setattr(cparser, '_parse_with_typedef_names', no_pycparser)
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef("typedef struct { int x; ...; } foo_t; foo_t *f(foo_t, ...);")
+    assert str(ffi._parser._declarations['function f'][0]) == (
+        '<foo_t *(*)(foo_t, ...)>')
+
+def test_fast_parser_opt_out(monkeypatch):
+    from cffi import cparser
+    def no_fast_parser(self, csource):
+        raise AssertionError("_FastParser should not be used")
+    monkeypatch.setattr(cparser._FastParser, 'parse', no_fast_parser)
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef("int f(long);", fast_parser=False)
+    assert str(ffi._parser._declarations['function f'][0]) == (
+        '<int(*)(long)>')
+
+def test_fast_parser_different_pycparser(monkeypatch):
+    from cffi import cparser
+    c_ast = cparser.pycparser.c_ast
+    monkeypatch.setattr(cparser, '_fast_parser_usable', None)
+    monkeypatch.setattr(c_ast.TypeDecl, '__slots__',
+                        ('declname', 'quals', 'align', 'type', 'coord',
+                         '__weakref__'))
+    def no_fast_parser(self, csource):
+        raise AssertionError("_FastParser should not be used")
+    monkeypatch.setattr(cparser._FastParser, 'parse', no_fast_parser)
+    ffi = FFI(backend=FakeBackend())
+    ffi.cdef("int f(long);")
+    assert cparser._fast_parser_usable is False
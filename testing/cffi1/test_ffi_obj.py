@@ -132,6 +132,19 @@ def test_ffi_callback_decorator():
     assert deco(lambda x: x + "")(10) == -66
     assert deco(lambda x: x + 42)(10) == 52
 
+def test_ffi_callback_compare():
+    ffi = _cffi1_backend.FFI()
+    cmp = ffi.callback("int(short *, short *)", compare="short", reverse=True)
+    p = ffi.new("short[]", [-5, 10])
+    assert (cmp(p, p + 1), cmp(p + 1, p), cmp(p, p)) == (1, -1, 0)
+    cmp = ffi.callback("int(*)(void *, void *)", compare=ffi.typeof("short"))
+    assert cmp(p, p + 1) == -1
+    py.test.raises(TypeError, ffi.callback, "int(int *, int *)",
+                   lambda a, b: 0, compare="int")
+    py.test.raises(TypeError, ffi.callback, "int(int *, int *)", field="x")
+    py.test.raises(TypeError, ffi.callback, "int(int *, int *)",
+                   compare="long double")
+
 def test_ffi_callback_onerror():
     ffi = _cffi1_backend.FFI()
     seen = []
@@ -243,6 +256,20 @@ def test_ffi_from_buffer():
     ffi.cast("unsigned short *", c)[1] += 500
     assert list(a) == [10000, 20500, 30000]
 
+def test_ffi_from_buffer_typed():
+    import array
+    ffi = _cffi1_backend.FFI()
+    a = array.array('H', [10000, 20000, 30000])
+    c = ffi.from_buffer("unsigned short[]", a)
+    assert ffi.typeof(c) is ffi.typeof("unsigned short[]")
+    assert len(c) == 3
+    c[1] += 500
+    assert list(a) == [10000, 20500, 30000]
+    c = ffi.from_buffer(ffi.typeof("unsigned short[2]"), a)
+    assert list(c) == [10000, 20500]
+    py.test.raises(ValueError, ffi.from_buffer, "unsigned short[4]", a)
+    py.test.raises(TypeError, ffi.from_buffer, "unsigned short *", a)
+
 def test_memmove():
     ffi = _cffi1_backend.FFI()
     p = ffi.new("short[]", [-1234, -2345, -3456, -4567, -5678])
@@ -502,3 +529,26 @@ def test_unpack():
     assert ffi.unpack(p+1, 7) == b"bc\x00def\x00"
     p = ffi.new("int[]", [-123456789])
     assert ffi.unpack(p, 1) == [-123456789]
+
+def test_unpack_array():
+    import array
+    ffi = _cffi1_backend.FFI()
+    p = ffi.new("double[]", [1.5, -2.5])
+    a = ffi.unpack(p, 2, "array")
+    assert type(a) is array.array and a.typecode == 'd'
+    assert a.tolist() == [1.5, -2.5]
+    p = ffi.new("double[]", a)
+    assert list(p) == [1.5, -2.5]
+
+def test_cdata_freelist():
+    ffi = _cffi1_backend.FFI()
+    ffi.set_cdata_freelist_size(10)
+    try:
+        x = ffi.new("int *")
+        del x
+        x = ffi.new("int *", 42)
+        assert x[0] == 42
+        assert ffi.cdata_freelist_info() == {'hits': 1, 'misses': 1,
+                                             'maxsize': 10, 'currsize': 0}
+    finally:
+        ffi.set_cdata_freelist_size(256)
@@ -197,6 +197,39 @@ def test_no_such_function_or_global_var():
     assert str(e.value).startswith(
         "symbol 'no_such_globalvar' not found in library '")
 
+def test_dlopen_preload():
+    from re_python_pysrc import ffi
+    # note: 'strlen' may or may not be found from the handle of 'extmod'
+    e = py.test.raises(OSError, ffi.dlopen, extmod, preload=True)
+    assert str(e.value).startswith(
+        "cannot preload library '%s': symbols not found: no_such_function, "
+        % (extmod,))
+    assert str(e.value).endswith("no_such_globalvar")
+    lib = ffi.dlopen(extmod)
+    report = lib.__preload__()
+    missing = report['missing']
+    assert missing[0] == 'no_such_function'
+    assert missing[-1] == 'no_such_globalvar'
+    assert report['functions'][0] == 5 - len(missing)   # add42, add43, ...
+    assert report['variables'][0] == 1                  # globalvar42
+    assert lib.add42(-10) == 32
+    assert lib.globalvar42 == 1234
+    e = py.test.raises(ffi.error, getattr, lib, 'no_such_function')
+    assert str(e.value).startswith(
+        "symbol 'no_such_function' not found in library '")
+    # a closed library is an error, not a list of missing symbols
+    ffi.dlclose(lib)
+    e = py.test.raises(ffi.error, lib.__preload__)
+    assert "has been closed" in str(e.value)
+
+def test_dlopen_name_keyword():
+    from re_python_pysrc import ffi
+    lib = ffi.dlopen(name=extmod, flags=0)
+    assert lib.add42(-10) == 32
+    e = py.test.raises(OSError, ffi.dlopen, name="libnonexistent_xyz.so")
+    assert str(e.value).startswith(
+        "cannot load library 'libnonexistent_xyz.so': ")
+
 def test_check_version():
     import _cffi_backend
     e = py.test.raises(ImportError, _cffi_backend.FFI,
@@ -204,6 +237,64 @@ def test_check_version():
     assert str(e.value).startswith(
         "cffi out-of-line Python module 'foobar' has unknown version")
 
+def test_compact_tables():
+    ffi = FFI()
+    ffi.cdef("""
+    #define FOOBAR -42
+    #define BIGNEG -420000000000L
+    #define BIGPOS 0xFFFFFFFFFFFFFFFF
+    int add42(int);
+    int globalvar42;
+    struct foo_s;
+    typedef struct bar_s { int x; signed char a[]; } bar_t;
+    struct bits_s { int a:3, b:5; };
+    enum foo_e { AA, BB=-5, CC };
+    typedef enum foo_e foo_t;
+    """)
+    ffi.set_source('re_python_compact', None, compact_tables=True)
+    ffi.emit_python_code(str(tmpdir.join('re_python_compact.py')))
+    content = tmpdir.join('re_python_compact.py').read()
+    assert '_tables = ' in content
+    assert '_types = ' not in content and '_globals = ' not in content
+    #
+    from re_python_compact import ffi
+    assert ffi.integer_const('FOOBAR') == -42
+    assert ffi.integer_const('BIGNEG') == -420000000000
+    assert ffi.integer_const('BIGPOS') == 0xFFFFFFFFFFFFFFFF
+    assert ffi.integer_const('CC') == -4
+    assert ffi.string(ffi.cast("foo_t", -5)) == "BB"
+    p = ffi.new("bar_t *", [5, b"foobar"])
+    assert p.x == 5 and p.a[5] == ord('r')
+    p = ffi.new("struct bits_s *", [-2, 7])
+    assert (p.a, p.b) == (-2, 7)
+    py.test.raises(TypeError, ffi.new, "struct foo_s *")
+    lib = ffi.dlopen(extmod)
+    assert lib.add42(-10) == 32
+    assert lib.globalvar42 == 1234
+    assert lib.BB == -5
+
+def test_compact_tables_corrupted():
+    import _cffi_backend
+    ffi = FFI()
+    ffi.cdef("struct foo_s { int x; }; enum e { A }; typedef int t; int f(int);")
+    ffi.set_source('re_python_compact_2', None, compact_tables=True)
+    ffi.emit_python_code(str(tmpdir.join('re_python_compact_2.py')))
+    from re_python_compact_2 import ffi
+    tables = eval(tmpdir.join('re_python_compact_2.py').read().split(
+        '_tables = ')[1].split('),\n')[0] + ')')
+    assert _cffi_backend.FFI("ok", _version=0x2601, _tables=tables)
+    for i in range(len(tables) + 1):
+        if i == len(tables):
+            bad = tables + b'\x00'
+        else:
+            bad = tables[:i]
+        e = py.test.raises(ImportError, _cffi_backend.FFI, "foobar",
+                           _version=0x2601, _tables=bad)
+        assert str(e.value) == ("cffi out-of-line Python module 'foobar' "
+                                "has corrupted '_tables'")
+    py.test.raises(TypeError, _cffi_backend.FFI, "foobar", _version=0x2601,
+                   _tables=tables, _types=b'')
+
 def test_partial_enum():
     ffi = FFI()
     ffi.cdef("enum foo { A, B, ... };")
@@ -858,6 +858,41 @@ def test_unpack_args():
     assert str(e7.value) in ["foo2 expected 2 arguments, got 3",
                              "foo2() takes exactly 2 arguments (3 given)"]
 
+def test_function_with_many_args():
+    ffi = FFI()
+    ffi.cdef("long foo5(int, char, long, double, char *);")
+    lib = verify(ffi, "test_function_with_many_args", """
+    long foo5(int a, char b, long c, double d, char *e) {
+        return a + b + c + (long)d + e[0];
+    }
+    """)
+    for i in range(100):
+        assert lib.foo5(i, b'\x01', 10, 100.5, b'\x02') == i + 113
+    e1 = py.test.raises(TypeError, lib.foo5, 1, b'\x01', 10, 100.5)
+    assert str(e1.value) in ["foo5 expected 5 arguments, got 4",
+                             "foo5() takes exactly 5 arguments (4 given)"]
+    py.test.raises(TypeError, lib.foo5, 1, 2, 10, 100.5, b'\x02')
+    assert ffi.typeof(lib.foo5) == ffi.typeof(
+        "long(*)(int, char, long, double, char *)")
+
+def test_call_many_lib_function():
+    import array
+    ffi = FFI()
+    ffi.cdef("long foo2(int, long); void foo0(void);")
+    lib = verify(ffi, "test_call_many_lib_function", """
+    long foo2(int x, long y) { return x * y; }
+    void foo0(void) { }
+    """)
+    res = ffi.call_many(lib.foo2, ffi.new("int[]", [2, 3, 4]),
+                        array.array('l', [10, 20, 30]))
+    assert ffi.typeof(res) is ffi.typeof("long[]")
+    assert list(res) == [20, 60, 120]
+    res = ffi.call_many(ffi.addressof(lib, "foo2"), array.array('i', [5]),
+                        array.array('l', [6]))
+    assert list(res) == [30]
+    py.test.raises(TypeError, ffi.call_many, lib.foo0)
+    py.test.raises(TypeError, ffi.call_many, ffi.call_many)
+
 def test_address_of_function():
     ffi = FFI()
     ffi.cdef("long myfunc(long x);")
@@ -1790,6 +1825,70 @@ def test_extern_python_plus_c():
     assert lib.bar(100) == 6300
     assert lib.call_me(100) == -2100
 
+def test_extern_python_batch():
+    import time
+    ffi = FFI()
+    ffi.cdef("""
+        struct item { int key; double value; };
+        extern "Python batch(3)" void ingest(struct item *, size_t);
+        extern "Python batch(100, 1)" void slow(const int *, int);
+        void push_items(int n);
+        void push_ints(int n);
+        void flush_all(void);
+    """)
+    lib = verify(ffi, 'test_extern_python_batch', """
+        struct item { int key; double value; };
+        static void ingest_push(struct item);
+        static void ingest_flush(void);
+        static void slow_push(int);
+        static void slow_flush(void);
+
+        static void push_items(int n) {
+            int i;
+            for (i = 0; i < n; i++) {
+                struct item it = { i, i * 0.5 };
+                ingest_push(it);
+            }
+        }
+        static void push_ints(int n) {
+            int i;
+            for (i = 0; i < n; i++)
+                slow_push(i * 10);
+        }
+        static void flush_all(void) {
+            ingest_flush();
+            slow_flush();
+        }
+    """)
+    seen = []
+    @ffi.def_extern()
+    def ingest(items, count):
+        seen.append([(items[i].key, items[i].value) for i in range(count)])
+    @ffi.def_extern()
+    def slow(items, count):
+        assert ffi.typeof(items) is ffi.typeof("const int *")
+        seen.append(ffi.unpack(items, count))
+    #
+    lib.push_items(7)
+    assert seen == [[(0, 0.0), (1, 0.5), (2, 1.0)],
+                    [(3, 1.5), (4, 2.0), (5, 2.5)]]
+    del seen[:]
+    lib.push_ints(4)
+    assert seen == []
+    lib.flush_all()
+    assert seen == [[(6, 3.0)], [0, 10, 20, 30]]
+    lib.flush_all()
+    assert len(seen) == 2     # nothing more was queued
+    del seen[:]
+    # 'slow' is also called once the first queued item is 1ms old
+    lib.push_ints(1)
+    time.sleep(0.01)
+    lib.push_ints(2)
+    assert seen == [[0, 0]]
+    lib.push_ints(1)
+    lib.flush_all()
+    assert seen == [[0, 0], [10, 0]]
+
 def test_introspect_function():
     ffi = FFI()
     ffi.cdef("float f1(double);")
@@ -1918,3 +2017,151 @@ def test_bool_in_cpp():
     ffi.cdef("bool f(void);")
     lib = verify(ffi, "test_bool_in_cpp", "char f(void) { return 2; }")
     assert lib.f() == 1
+
+def test_shards():
+    impl = udir.join('test_shards_impl.c')
+    impl.write("""
+        struct s { int a; };
+        int add1(int x, long y) { return x + (int)y + 1; }
+        struct s get_s(struct s *p, double d) {
+            struct s r; r.a = p->a + (int)d; return r;
+        }
+        int the_global = 42;
+        void set_the_global(void) { the_global = 43; }
+        int varfunc(int n, ...) { return n; }
+    """)
+    ffi = FFI()
+    ffi.cdef("""struct s { int a; };
+        int add1(int, long);
+        struct s get_s(struct s *, double);
+        int the_global;
+        void set_the_global(void);
+        int varfunc(int, ...);
+        int twice(int);
+    """)
+    lib = verify(ffi, 'test_shards', """
+        struct s { int a; };
+        int add1(int, long);
+        struct s get_s(struct s *, double);
+        extern int the_global;
+        void set_the_global(void);
+        int varfunc(int, ...);
+        static inline int twice(int x) { return 2 * x; }
+    """, sources=[str(impl)], shards=3)
+    assert lib.add1(10, 20) == 31
+    assert lib.get_s(ffi.new("struct s *", [5]), 2.5).a == 7
+    assert lib.the_global == 42
+    lib.set_the_global()
+    assert lib.the_global == 43
+    assert lib.varfunc(3) == 3
+    assert lib.twice(21) == 42
+    assert ffi.addressof(lib, 'add1')(1, 2) == 4
+    # the function wrappers are in the two extra C files
+    ext = '.c' if os.environ.get('NO_CPP') else '.cpp'
+    main_file = udir.join('_CFFI_test_shards' + ext).read()
+    shard_files = [udir.join('_CFFI_test_shards_shard%d%s' % (i, ext)).read()
+                   for i in (1, 2)]
+    for name in ['add1', 'get_s', 'set_the_global', 'twice']:
+        proto = '_cffi_d_%s(' % name
+        assert main_file.count(proto) == 1      # only the prototype
+        assert [proto in shard for shard in shard_files].count(True) == 1
+
+def test_shards_stable():
+    ffi = FFI()
+    ffi.cdef("int f%d(int);" * 20 % tuple(range(20)))
+    c_file = str(udir.join('test_shards_stable.c'))
+    recompiler.make_c_source(ffi, 'test_shards_stable', '', c_file, shards=5)
+    shard_files = recompiler.shard_file_names(c_file, 5)
+    assert shard_files == [str(udir.join('test_shards_stable_shard%d.c' % i))
+                           for i in range(1, 5)]
+    old = [open(fn).read() for fn in shard_files]
+    assert all('_cffi_d_f' in text for text in old)
+    #
+    ffi.cdef("int g(int);")
+    recompiler.make_c_source(ffi, 'test_shards_stable', '', c_file, shards=5)
+    new = [open(fn).read() for fn in shard_files]
+    assert [a == b for a, b in zip(old, new)].count(False) == 1
+
+def test_preload():
+    ffi = FFI()
+    ffi.cdef("""
+        typedef struct { int a; } foo_t;
+        struct bar_s { foo_t f; long b; };
+        enum e1 { AA, BB };
+        int add1(int);
+        int sub1(int);
+        int myvar;
+        #define FORTY_TWO 42
+        #define WRONG 42
+    """)
+    lib = verify(ffi, 'test_preload', """
+        typedef struct { int a; } foo_t;
+        struct bar_s { foo_t f; long b; };
+        enum e1 { AA, BB };
+        static int add1(int x) { return x + 1; }
+        static int sub1(int x) { return x - 1; }
+        static int myvar = 5;
+        #define FORTY_TWO 42
+        #define WRONG 43
+    """)
+    report = lib.__preload__()
+    assert sorted(report) == ['constants', 'functions', 'missing', 'types',
+                              'variables']
+    assert report['missing'] == ['WRONG']
+    assert report['functions'][0] == 2
+    assert report['constants'][0] == 3      # 'WRONG' is not counted
+    assert report['variables'][0] == 1
+    assert report['types'][0] == 4      # foo_t, its struct, bar_s, e1
+    for key in ['constants', 'functions', 'types', 'variables']:
+        count, seconds = report[key]
+        assert seconds >= 0.0
+    # the preloaded attributes behave as usual
+    assert lib.add1(10) == 11
+    assert lib.sub1(10) == 9
+    assert lib.myvar == 5
+    lib.myvar = 6
+    assert lib.myvar == 6
+    assert lib.FORTY_TWO == 42 and lib.BB == 1
+    py.test.raises(ffi.error, getattr, lib, 'WRONG')
+    assert ffi.offsetof("struct bar_s", "b") == ffi.alignof("long")
+    assert ffi.sizeof("struct bar_s") == 2 * ffi.sizeof("long")
+    # calling it again is harmless
+    assert lib.__preload__()['functions'][0] == 2
+
+def test_preload_background():
+    ffi = FFI()
+    ffi.cdef("int add%d(int);" * 50 % tuple(range(50)))
+    lib = verify(ffi, 'test_preload_background', "".join([
+        "static int add%d(int x) { return x + %d; }\n" % (i, i)
+        for i in range(50)]))
+    thread = lib.__preload__(background=True)
+    assert lib.add7(10) == 17
+    thread.join()
+    assert lib.add49(1) == 50
+
+def test_preload_at_import():
+    for preload, flags in [(True, 2), ('thread', 6)]:
+        ffi = FFI()
+        ffi.cdef("int add1(int);\n#define WRONG 42")
+        name = 'test_preload_at_import_%d' % flags
+        lib = verify(ffi, name, """
+            static int add1(int x) { return x + 1; }
+            #define WRONG 43
+        """, preload=preload)
+        # errors are not reported at import time, but only if and when
+        # the attribute is accessed
+        assert lib.add1(41) == 42
+        py.test.raises(ffi.error, getattr, lib, 'WRONG')
+        c_file = str(udir.join('_CFFI_' + name + '.cpp'))
+        if not os.path.exists(c_file):
+            c_file = c_file[:-4] + '.c'
+        assert '  %d,  /* flags */' % flags in open(c_file).read()
+
+def test_preload_bad_value():
+    ffi = FFI()
+    e = py.test.raises(VerificationError, recompiler.make_c_source, ffi,
+                       'test_preload_bad_value', '',
+                       str(udir.join('test_preload_bad_value.c')),
+                       preload='yes')
+    assert str(e.value) == ("'preload' must be False, True or 'thread', "
+                            "not 'yes'")
@@ -249,6 +249,168 @@ class TestDist(object):
                                         'mymod.c': None},
                 'Release': '?'})
 
+    @chdir_to_tmp
+    def test_api_compile_build_cache(self):
+        cache_dir = str(self.udir.join('cache'))
+        ffi = cffi.FFI()
+        ffi.set_source("mod_name_in_package.mymod", "/*code would be here*/")
+        x = ffi.compile(cache_dir=cache_dir)
+        [entry] = os.listdir(cache_dir)
+        assert entry.startswith('build-')
+        with open(x, 'rb') as f:
+            data = f.read()
+        # from the cache: produces the .so, but doesn't compile the .o
+        ffi.compile('output', cache_dir=cache_dir)
+        sofile = self.check_produced_files({
+            'cache': '?',
+            'mod_name_in_package': '?',
+            'output': {'mod_name_in_package': {'mymod.SO': None,
+                                               'mymod.c': None}}})
+        with open(sofile, 'rb') as f:
+            assert f.read() == data
+        # a different source, or different options, are compiled again
+        ffi = cffi.FFI()
+        ffi.set_source("mod_name_in_package.mymod", "/*other code*/")
+        ffi.compile('output', cache_dir=cache_dir)
+        ffi = cffi.FFI()
+        ffi.set_source("mod_name_in_package.mymod", "/*code would be here*/",
+                       define_macros=[('FOO', '42')])
+        ffi.compile('output', cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 3
+        assert entry in os.listdir(cache_dir)
+
+    @chdir_to_tmp
+    def test_api_compile_build_cache_headers(self):
+        cache_dir = str(self.udir.join('cache'))
+        include_dir = str(self.udir.join('include'))
+        os.mkdir(include_dir)
+        def compile(header):
+            with open(os.path.join(include_dir, 'foo.h'), 'w') as f:
+                f.write(header)
+            ffi = cffi.FFI()
+            ffi.set_source("mod_name_in_package.mymod", '#include "foo.h"',
+                           include_dirs=[include_dir])
+            ffi.compile(cache_dir=cache_dir)
+        compile("#define FOO 42\n")
+        compile("#define FOO 42\n")
+        assert len(os.listdir(cache_dir)) == 1
+        # a change in a header file not listed in 'depends'
+        compile("static int foo(void) { return 42; }\n")
+        assert len(os.listdir(cache_dir)) == 2
+
+    @chdir_to_tmp
+    def test_build_cache_preprocess_threads(self):
+        import threading
+        from distutils.core import Distribution, Extension
+        from cffi import ffiplatform
+        tmpdir = str(self.udir)
+        sources = []
+        for i in range(8):
+            filename = os.path.join(tmpdir, 'src%d.c' % i)
+            with open(filename, 'w') as f:
+                f.write('int f%d(void) { return %d; }\n' % (i, i) * 50)
+            sources.append(filename)
+        ext = Extension('mymod', sources)
+        cmd_obj = Distribution({'ext_modules': [ext]}).get_command_obj(
+            'build_ext')
+        cmd_obj.ensure_finalized()
+        compiler = ffiplatform._build_cache_compiler(cmd_obj)
+        def digest(filename):
+            return ffiplatform._build_cache_preprocess(compiler, ext,
+                                                       filename, tmpdir)
+        expected = [digest(filename) for filename in sources]
+        assert None not in expected and len(set(expected)) == 8
+        results = {}
+        def run(i):
+            results[i] = [digest(sources[i]) for j in range(5)]
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(8):
+            assert results[i] == [expected[i]] * 5
+        # the temporary files are removed
+        assert sorted(os.listdir(tmpdir)) == sorted(
+            os.path.basename(filename) for filename in sources)
+
+    @chdir_to_tmp
+    def test_api_compile_build_cache_no_preprocessor(self, monkeypatch):
+        from cffi import ffiplatform
+        monkeypatch.setattr(ffiplatform, '_build_cache_preprocess',
+                            lambda *args: None)
+        cache_dir = str(self.udir.join('cache'))
+        ffi = cffi.FFI()
+        ffi.set_source("mod_name_in_package.mymod", "/*code would be here*/",
+                       include_dirs=[str(self.udir)])
+        ffi.compile(cache_dir=cache_dir)
+        assert not os.path.exists(cache_dir)
+        ffi = cffi.FFI()
+        ffi.set_source("mod_name_in_package.mymod", "/*code would be here*/",
+                       include_dirs=[str(self.udir)], depends=[__file__])
+        ffi.compile(cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 1
+
+    @chdir_to_tmp
+    def test_api_compile_no_shards_not_concurrent(self, monkeypatch):
+        from cffi import ffiplatform
+        def no_concurrent_compile(*args):
+            raise AssertionError("should not compile concurrently")
+        monkeypatch.setattr(ffiplatform, 'use_concurrent_compile',
+                            no_concurrent_compile)
+        self.udir.join('extra.c').write("int extra(void) { return 42; }\n")
+        ffi = cffi.FFI()
+        ffi.set_source("mod_name_in_package.mymod", "/*code would be here*/",
+                       sources=[str(self.udir.join('extra.c'))])
+        ffi.compile()
+
+    @from_outside
+    def test_concurrent_compile_shared_pool(self, monkeypatch):
+        import threading, time, multiprocessing
+        from distutils.ccompiler import CCompiler, new_compiler
+        from cffi import ffiplatform
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+        def fake_compile(self, sources, output_dir=None, **kwds):
+            assert len(sources) == 1
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            return [sources[0] + '.o']
+        monkeypatch.setattr(CCompiler, 'compile', fake_compile)
+        compilers = [new_compiler(), new_compiler()]
+        for compiler in compilers:
+            ffiplatform.use_concurrent_compile(compiler)
+        sources = ['f%d.c' % i for i in range(10)]
+        results = []
+        def build(compiler):
+            results.append(compiler.compile(sources))
+        # several extensions built concurrently, as with 'build_ext -j'
+        threads = [threading.Thread(target=build, args=(compilers[i % 2],))
+                   for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [[src + '.o' for src in sources]] * 8
+        assert 1 <= state['max'] <= multiprocessing.cpu_count()
+
+    @chdir_to_tmp
+    def test_build_cache_eviction(self):
+        from cffi import ffiplatform
+        cache_dir = str(self.udir)
+        for i in range(5):
+            filename = os.path.join(cache_dir, 'build-%d.so' % i)
+            with open(filename, 'wb') as f:
+                f.write(b'x' * 100)
+            os.utime(filename, (1000 + i, 1000 + i))
+        os.utime(os.path.join(cache_dir, 'build-1.so'), (2000, 2000))
+        ffiplatform._build_cache_evict(cache_dir, 250)
+        assert sorted(os.listdir(cache_dir)) == ['build-1.so', 'build-4.so']
+
     @chdir_to_tmp
     def test_api_distutils_extension_1(self):
         ffi = cffi.FFI()
@@ -415,3 +577,86 @@ class TestDist(object):
                                    'src1': {'pack3': {'__init__.py': None,
                                                       '_build.py': None,
                                                       'mymod.SO': None}}})
+
+    def _make_setuptools_api_many(self, custom_build_ext=False):
+        self._prepare_setuptools()
+        os.mkdir("src2")
+        os.mkdir(os.path.join("src2", "pack4"))
+        with open(os.path.join("src2", "pack4", "__init__.py"), "w") as f:
+            pass
+        for i in range(3):
+            with open(os.path.join("src2", "pack4", "_build%d.py" % i),
+                      "w") as f:
+                f.write("""if 1:
+                    import cffi
+                    ffi = cffi.FFI()
+                    ffi.set_source("pack4.mymod%d", "/*code would be here*/")
+                """ % i)
+        with open("setup.py", "w") as f:
+            f.write("""if 1:
+                from setuptools import setup
+                from distutils.command.build_ext import build_ext
+
+                def build_extensions(self, original=build_ext.build_extensions):
+                    for ext in self.extensions:
+                        assert ext.sources[0] != '$PLACEHOLDER'
+                    with open('parallel', 'w') as f:
+                        f.write(repr(self.parallel))
+                    original(self)
+
+                if %r:
+                    class TestBuildExt(build_ext):
+                        pass
+                    TestBuildExt.build_extensions = build_extensions
+                    cmdclass = {'build_ext': TestBuildExt}
+                else:
+                    # the standard build_ext, only recording 'parallel'
+                    build_ext.build_extensions = build_extensions
+                    cmdclass = {}
+
+                setup(name='example1',
+                      version='0.1',
+                      packages=['pack4'],
+                      package_dir={'': 'src2'},
+                      cffi_modules=["src2/pack4/_build%%d.py:ffi" %% i
+                                    for i in range(3)],
+                      cmdclass=cmdclass,
+                      )
+            """ % (custom_build_ext,))
+
+    @chdir_to_tmp
+    def test_setuptools_api_parallel(self):
+        self._make_setuptools_api_many()
+        self.run(["setup.py", "build_ext", "-i"])
+        with open('parallel') as f:
+            assert f.read() == 'True'
+        self.check_produced_files({'setup.py': None,
+                                   'build': '?',
+                                   'parallel': None,
+                                   'src2': {'pack4': {'__init__.py': None,
+                                                      '_build0.py': None,
+                                                      '_build1.py': None,
+                                                      '_build2.py': None,
+                                                      'mymod0.SO': None,
+                                                      'mymod1.SO': None,
+                                                      'mymod2.SO': None}}})
+
+    @chdir_to_tmp
+    def test_setuptools_api_explicit_jobs(self):
+        self._make_setuptools_api_many()
+        self.run(["setup.py", "build_ext", "-i", "-j1"])
+        with open('parallel') as f:
+            assert f.read() == '1'
+        self.run(["setup.py", "build_ext", "-i", "-f", "-j0"])
+        with open('parallel') as f:
+            assert f.read() == '0'
+
+    @chdir_to_tmp
+    def test_setuptools_api_custom_build_ext_not_parallel(self):
+        self._make_setuptools_api_many(custom_build_ext=True)
+        self.run(["setup.py", "build_ext", "-i"])
+        with open('parallel') as f:
+            assert f.read() == 'None'
+        self.run(["setup.py", "build_ext", "-i", "-f", "-j2"])
+        with open('parallel') as f:
+            assert f.read() == '2'
@@ -0,0 +1,18 @@
+#include <stdio.h>
+
+extern void add_batch_push(int);
+extern void add_batch_flush(void);
+extern int get_total(void);
+
+
+int main(void)
+{
+    int i;
+    for (i = 1; i <= 10; i++)
+        add_batch_push(i);
+    printf("pushed 10 items\n");
+    fflush(stdout);
+    add_batch_flush();
+    printf("total: %d\n", get_total());
+    return 0;
+}
@@ -0,0 +1,32 @@
+import cffi
+
+ffi = cffi.FFI()
+
+ffi.embedding_api("""
+    extern "Python batch(4)" void add_batch(int *values, size_t count);
+    int get_total(void);
+""")
+
+ffi.embedding_init_code(r"""
+    import sys
+    from _batch_cffi import ffi
+
+    total = [0]
+
+    @ffi.def_extern()
+    def add_batch(values, count):
+        values = ffi.unpack(values, count)
+        sys.stdout.write("adding %s\n" % (values,))
+        sys.stdout.flush()
+        total[0] += sum(values)
+
+    @ffi.def_extern()
+    def get_total():
+        return total[0]
+""")
+
+ffi.set_source("_batch_cffi", """
+""")
+
+fn = ffi.compile(verbose=True)
+print('FILENAME: %s' % (fn,))
@@ -10,6 +10,10 @@ static int remaining;
 
 
 extern int add1(int, int);
+#ifdef PTEST_HOLD_GIL
+extern int perf_gil_ensure(void);
+extern void perf_gil_release(int);
+#endif
 
 
 static double time_delta(struct timeval *stop, struct timeval *start)
@@ -24,8 +28,14 @@ static double measure(void)
     int result;
     struct timeval start, stop;
     double elapsed;
+#ifdef PTEST_HOLD_GIL
+    int gilstate;
+#endif
 
     add1(0, 0);   /* prepare off-line */
+#ifdef PTEST_HOLD_GIL
+    gilstate = perf_gil_ensure();
+#endif
 
     i = 0;
     iterations = 1000;
@@ -45,6 +55,9 @@ static double measure(void)
             break;
         iterations = iterations * 3 / 2;
     }
+#ifdef PTEST_HOLD_GIL
+    perf_gil_release(gilstate);
+#endif
 
     return elapsed / (double)iterations;
 }
@@ -52,7 +65,7 @@ static double measure(void)
 static void *start_routine(void *arg)
 {
     double t = measure();
-    printf("time per call: %.3g\n", t);
+    printf("time per call: %.3g (%.0f ns)\n", t, t * 1e9);
 
 #ifdef PTEST_USE_THREAD
     pthread_mutex_lock(&mutex1);
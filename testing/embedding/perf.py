@@ -15,6 +15,17 @@ ffi.embedding_init_code(r"""
 """)
 
 ffi.set_source("_perf_cffi", """
+    /* for perf-test.c with PTEST_HOLD_GIL: call add1() from a thread
+       that already holds the GIL, like a C program that calls several
+       Python functions in a row */
+    CFFI_DLLEXPORT int perf_gil_ensure(void)
+    {
+        return (int)PyGILState_Ensure();
+    }
+    CFFI_DLLEXPORT void perf_gil_release(int state)
+    {
+        PyGILState_Release((PyGILState_STATE)state);
+    }
 """)
 
 fn = ffi.compile(verbose=True)
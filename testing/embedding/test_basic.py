@@ -199,3 +199,13 @@ class TestBasic(EmbeddingTests):
                           "prepADD2\n"
                           "adding 100 and -5 and -20\n"
                           "got: 42 75\n")
+
+    def test_batch(self):
+        batch_cffi = self.prepare_module('batch')
+        self.compile('batch-test', [batch_cffi])
+        output = self.execute('batch-test')
+        assert output == ("adding [1, 2, 3, 4]\n"
+                          "adding [5, 6, 7, 8]\n"
+                          "pushed 10 items\n"
+                          "adding [9, 10]\n"
+                          "total: 55\n")
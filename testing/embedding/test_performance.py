@@ -7,46 +7,41 @@ if sys.platform == 'win32':
 
 
 class TestPerformance(EmbeddingTests):
-    def test_perf_single_threaded(self):
+    def run_perf_test(self, threads=0, hold_gil=False):
         perf_cffi = self.prepare_module('perf')
-        self.compile('perf-test', [perf_cffi], opt=True)
+        defines = {}
+        if threads:
+            defines['PTEST_USE_THREAD'] = str(threads)
+        if hold_gil:
+            defines['PTEST_HOLD_GIL'] = '1'
+        self.compile('perf-test', [perf_cffi], opt=True,
+                     threads=bool(threads), defines=defines)
         output = self.execute('perf-test')
+        lines = output.splitlines()
+        assert len(lines) == max(threads, 1)
+        for line in lines:
+            assert line.startswith('time per call: ')
         print('='*79)
         print(output.rstrip())
         print('='*79)
 
+    def test_perf_single_threaded(self):
+        self.run_perf_test()
+
+    def test_perf_single_threaded_holding_gil(self):
+        self.run_perf_test(hold_gil=True)
+
     def test_perf_in_1_thread(self):
-        perf_cffi = self.prepare_module('perf')
-        self.compile('perf-test', [perf_cffi], opt=True, threads=True,
-                     defines={'PTEST_USE_THREAD': '1'})
-        output = self.execute('perf-test')
-        print('='*79)
-        print(output.rstrip())
-        print('='*79)
+        self.run_perf_test(threads=1)
+
+    def test_perf_in_1_thread_holding_gil(self):
+        self.run_perf_test(threads=1, hold_gil=True)
 
     def test_perf_in_2_threads(self):
-        perf_cffi = self.prepare_module('perf')
-        self.compile('perf-test', [perf_cffi], opt=True, threads=True,
-                     defines={'PTEST_USE_THREAD': '2'})
-        output = self.execute('perf-test')
-        print('='*79)
-        print(output.rstrip())
-        print('='*79)
+        self.run_perf_test(threads=2)
 
     def test_perf_in_4_threads(self):
-        perf_cffi = self.prepare_module('perf')
-        self.compile('perf-test', [perf_cffi], opt=True, threads=True,
-                     defines={'PTEST_USE_THREAD': '4'})
-        output = self.execute('perf-test')
-        print('='*79)
-        print(output.rstrip())
-        print('='*79)
+        self.run_perf_test(threads=4)
 
     def test_perf_in_8_threads(self):
-        perf_cffi = self.prepare_module('perf')
-        self.compile('perf-test', [perf_cffi], opt=True, threads=True,
-                     defines={'PTEST_USE_THREAD': '8'})
-        output = self.execute('perf-test')
-        print('='*79)
-        print(output.rstrip())
-        print('='*79)
+        self.run_perf_test(threads=8)